@@ -0,0 +1,299 @@
+import argparse
+from collections import Counter
+import os
+import time
+
+import pandas as pd
+from rdflib import BNode, Literal, URIRef
+from rdflib.namespace import RDF, XSD
+
+from football_graph import FootballGraph, data_files
+
+
+# Reference implementation: a frozen copy of the row-by-row loaders of the
+# original football_graph.py, one safe_literal call per cell and one
+# rdf_graph.add per triple. Keep it as it is; the check below measures the
+# current loaders against it.
+def baseline_safe_literal(value, datatype):
+    """Safely create a Literal, converting floats to integers when necessary."""
+    if pd.isna(value):
+        return None
+    if datatype == XSD.integer:
+        try:
+            return Literal(int(float(value)), datatype=XSD.integer)
+        except ValueError:
+            return Literal(0, datatype=XSD.integer)  # Default to 0 if conversion fails
+    elif datatype == XSD.decimal:
+        try:
+            return Literal(float(value), datatype=XSD.decimal)
+        except ValueError:
+            return Literal(0.0, datatype=XSD.decimal)  # Default to 0.0 if conversion fails
+    else:
+        return Literal(value, datatype=datatype)
+
+
+def baseline_add_player_data(fg, file_path, file_type, league):
+    df = pd.read_csv(file_path)
+
+    for _, row in df.iterrows():
+        player_uri = URIRef(fg.FOOTBALL[row['Player'].replace(" ", "_")])
+        fg.rdf_graph.add((player_uri, RDF.type, fg.FOOTBALL.Player))
+
+        team_uri = URIRef(fg.FOOTBALL[row['Team'].replace(" ", "_")])
+        fg.rdf_graph.add((team_uri, RDF.type, fg.FOOTBALL.Team))
+        fg.rdf_graph.add((player_uri, fg.FOOTBALL.playsFor, team_uri))
+
+        country_uri = URIRef(fg.FOOTBALL[row['Country']])
+        fg.rdf_graph.add((country_uri, RDF.type, fg.FOOTBALL.Country))
+        fg.rdf_graph.add((player_uri, fg.FOOTBALL.nationality, country_uri))
+
+        league_uri = URIRef(fg.FOOTBALL[league])
+        fg.rdf_graph.add((league_uri, RDF.type, fg.FOOTBALL.League))
+
+        # Create a new PlayerStats instance for this player in this league
+        stats_uri = BNode()
+        fg.rdf_graph.add((stats_uri, RDF.type, fg.FOOTBALL.PlayerStats))
+        fg.rdf_graph.add((player_uri, fg.FOOTBALL.hasStats, stats_uri))
+        fg.rdf_graph.add((stats_uri, fg.FOOTBALL.inLeague, league_uri))
+        fg.rdf_graph.add((stats_uri, fg.FOOTBALL.inTeam, team_uri))
+        fg.rdf_graph.add((stats_uri, fg.FOOTBALL.inSeason, Literal("2023/24", datatype=XSD.string)))
+
+        # Add minutes and matches data if available
+        if 'Minutes' in df.columns:
+            minutes_literal = baseline_safe_literal(row['Minutes'], datatype=XSD.integer)
+            if minutes_literal:
+                fg.rdf_graph.add((stats_uri, fg.FOOTBALL.minutes, minutes_literal))
+        if 'Matches' in df.columns:
+            matches_literal = baseline_safe_literal(row['Matches'], datatype=XSD.integer)
+            if matches_literal:
+                fg.rdf_graph.add((stats_uri, fg.FOOTBALL.matches, matches_literal))
+
+        # Add specific stats based on file_type
+        if file_type == 'scoring':
+            if 'Shots per 90' in df.columns:
+                shots_per_90_literal = baseline_safe_literal(row['Shots per 90'], datatype=XSD.decimal)
+                if shots_per_90_literal:
+                    fg.rdf_graph.add((stats_uri, fg.FOOTBALL.shotsPerNinety, shots_per_90_literal))
+            if 'Shot Conversion Rate (%)' in df.columns:
+                shot_conversion_rate_literal = baseline_safe_literal(row['Shot Conversion Rate (%)'], datatype=XSD.decimal)
+                if shot_conversion_rate_literal:
+                    fg.rdf_graph.add((stats_uri, fg.FOOTBALL.shotConversionRate, shot_conversion_rate_literal))
+        elif file_type == 'goals':
+            if 'Goals' in df.columns:
+                goals_literal = baseline_safe_literal(row['Goals'], datatype=XSD.integer)
+                if goals_literal:
+                    fg.rdf_graph.add((stats_uri, fg.FOOTBALL.goals, goals_literal))
+            if 'Penalties' in df.columns:
+                penalties_literal = baseline_safe_literal(row['Penalties'], datatype=XSD.integer)
+                if penalties_literal:
+                    fg.rdf_graph.add((stats_uri, fg.FOOTBALL.penalties, penalties_literal))
+        elif file_type == 'chances':
+            if 'Chances Created' in df.columns:
+                chances_created_literal = baseline_safe_literal(row['Chances Created'], datatype=XSD.integer)
+                if chances_created_literal:
+                    fg.rdf_graph.add((stats_uri, fg.FOOTBALL.chancesCreated, chances_created_literal))
+            if 'Chances Created per 90' in df.columns:
+                chances_created_per_90_literal = baseline_safe_literal(row['Chances Created per 90'], datatype=XSD.decimal)
+                if chances_created_per_90_literal:
+                    fg.rdf_graph.add((stats_uri, fg.FOOTBALL.chancesCreatedPerNinety, chances_created_per_90_literal))
+        elif file_type == 'assists':
+            if 'Assists' in df.columns:
+                assists_literal = baseline_safe_literal(row['Assists'], datatype=XSD.integer)
+                if assists_literal:
+                    fg.rdf_graph.add((stats_uri, fg.FOOTBALL.assists, assists_literal))
+            if 'Secondary Assists' in df.columns:
+                secondary_assists_literal = baseline_safe_literal(row['Secondary Assists'], datatype=XSD.decimal)
+                if secondary_assists_literal:
+                    fg.rdf_graph.add((stats_uri, fg.FOOTBALL.secondaryAssists, secondary_assists_literal))
+
+
+def baseline_add_team_data(fg, file_path, data_type, league):
+    df = pd.read_csv(file_path)
+
+    for _, row in df.iterrows():
+        team_uri = URIRef(fg.FOOTBALL[row['Team'].replace(" ", "_")])
+        fg.rdf_graph.add((team_uri, RDF.type, fg.FOOTBALL.Team))
+
+        country_uri = URIRef(fg.FOOTBALL[row['Country']])
+        fg.rdf_graph.add((country_uri, RDF.type, fg.FOOTBALL.Country))
+        fg.rdf_graph.add((team_uri, fg.FOOTBALL.nationality, country_uri))
+
+        league_uri = URIRef(fg.FOOTBALL[league])
+        fg.rdf_graph.add((league_uri, RDF.type, fg.FOOTBALL.League))
+        fg.rdf_graph.add((team_uri, fg.FOOTBALL.inLeague, league_uri))
+
+        # Create a new TeamStats instance for this team
+        stats_uri = BNode()
+        fg.rdf_graph.add((stats_uri, RDF.type, fg.FOOTBALL.TeamStats))
+        fg.rdf_graph.add((team_uri, fg.FOOTBALL.hasTeamStats, stats_uri))
+
+        # Add matches played
+        matches_literal = baseline_safe_literal(row['Matches'], datatype=XSD.integer)
+        if matches_literal:
+            fg.rdf_graph.add((stats_uri, fg.FOOTBALL.gamesPlayed, matches_literal))
+
+        # Add specific stats based on data_type
+        if data_type == 'big_chance':
+            big_chances_literal = baseline_safe_literal(row['Big Chances'], datatype=XSD.integer)
+            goals_literal = baseline_safe_literal(row['Goals'], datatype=XSD.integer)
+            if big_chances_literal:
+                fg.rdf_graph.add((stats_uri, fg.FOOTBALL.bigChances, big_chances_literal))
+            if goals_literal:
+                fg.rdf_graph.add((stats_uri, fg.FOOTBALL.goalsFor, goals_literal))
+        elif data_type == 'goals_per_match':
+            goals_per_match_literal = baseline_safe_literal(row['Goals per Match'], datatype=XSD.decimal)
+            total_goals_literal = baseline_safe_literal(row['Total Goals Scored'], datatype=XSD.integer)
+            if goals_per_match_literal:
+                fg.rdf_graph.add((stats_uri, fg.FOOTBALL.goalsPerMatch, goals_per_match_literal))
+            if total_goals_literal:
+                fg.rdf_graph.add((stats_uri, fg.FOOTBALL.goalsFor, total_goals_literal))
+        elif data_type == 'saves':
+            saves_per_match_literal = baseline_safe_literal(row['Saves per Match'], datatype=XSD.decimal)
+            total_saves_literal = baseline_safe_literal(row['Total Saves'], datatype=XSD.integer)
+            if saves_per_match_literal:
+                fg.rdf_graph.add((stats_uri, fg.FOOTBALL.savesPerMatch, saves_per_match_literal))
+            if total_saves_literal:
+                fg.rdf_graph.add((stats_uri, fg.FOOTBALL.totalSaves, total_saves_literal))
+        elif data_type == 'accurate_pass':
+            accurate_passes_literal = baseline_safe_literal(row['Accurate Passes per Match'], datatype=XSD.decimal)
+            pass_success_literal = baseline_safe_literal(row['Pass Success (%)'], datatype=XSD.decimal)
+            if accurate_passes_literal:
+                fg.rdf_graph.add((stats_uri, fg.FOOTBALL.accuratePassesPerMatch, accurate_passes_literal))
+            if pass_success_literal:
+                fg.rdf_graph.add((stats_uri, fg.FOOTBALL.passSuccessPercentage, pass_success_literal))
+
+
+def baseline_load_all_data(fg, base_path):
+    # Premier league data
+    # Players data
+    baseline_add_player_data(fg, os.path.join(base_path, "Premleg_23_24/player_total_scoring_attempts.csv"), 'scoring', 'PremierLeague')
+    baseline_add_player_data(fg, os.path.join(base_path, "Premleg_23_24/player_top_scorers.csv"), 'goals', 'PremierLeague')
+    baseline_add_player_data(fg, os.path.join(base_path, "Premleg_23_24/player_total_assists_in_attack.csv"), 'chances', 'PremierLeague')
+    baseline_add_player_data(fg, os.path.join(base_path, "Premleg_23_24/player_top_assists.csv"), 'assists', 'PremierLeague')
+
+    # Teams data
+    baseline_add_team_data(fg, os.path.join(base_path, "Premleg_23_24/big_chance_team.csv"), 'big_chance', 'PremierLeague')
+    baseline_add_team_data(fg, os.path.join(base_path, "Premleg_23_24/team_goals_per_match.csv"), 'goals_per_match', 'PremierLeague')
+    baseline_add_team_data(fg, os.path.join(base_path, "Premleg_23_24/saves_team.csv"), 'saves', 'PremierLeague')
+    baseline_add_team_data(fg, os.path.join(base_path, "Premleg_23_24/accurate_pass_team.csv"), 'accurate_pass', 'PremierLeague')
+
+    # La Liga data
+    # Players data
+    baseline_add_player_data(fg, os.path.join(base_path, "laliga2023_34/player_total_scoring_attempts.csv"), 'scoring', 'LaLiga')
+    baseline_add_player_data(fg, os.path.join(base_path, "laliga2023_34/player_top_scorers.csv"), 'goals', 'LaLiga')
+    baseline_add_player_data(fg, os.path.join(base_path, "laliga2023_34/player_total_assists_in_attack.csv"), 'chances', 'LaLiga')
+    baseline_add_player_data(fg, os.path.join(base_path, "laliga2023_34/player_top_assists.csv"), 'assists', 'LaLiga')
+
+    # Teams data
+    baseline_add_team_data(fg, os.path.join(base_path, "laliga2023_34/big_chance_team.csv"), 'big_chance', 'LaLiga')
+    baseline_add_team_data(fg, os.path.join(base_path, "laliga2023_34/team_goals_per_match.csv"), 'goals_per_match', 'LaLiga')
+    baseline_add_team_data(fg, os.path.join(base_path, "laliga2023_34/saves_team.csv"), 'saves', 'LaLiga')
+    baseline_add_team_data(fg, os.path.join(base_path, "laliga2023_34/accurate_pass_team.csv"), 'accurate_pass', 'LaLiga')
+
+    # Serie A data
+    # Players data
+    baseline_add_player_data(fg, os.path.join(base_path, "SerieA23_24/player_total_scoring_attempts.csv"), 'scoring', 'SerieA')
+    baseline_add_player_data(fg, os.path.join(base_path, "SerieA23_24/player_top_scorers.csv"), 'goals', 'SerieA')
+    baseline_add_player_data(fg, os.path.join(base_path, "SerieA23_24/player_total_assists_in_attack.csv"), 'chances', 'SerieA')
+    baseline_add_player_data(fg, os.path.join(base_path, "SerieA23_24/player_top_assists.csv"), 'assists', 'SerieA')
+
+    # Teams data
+    baseline_add_team_data(fg, os.path.join(base_path, "SerieA23_24/big_chance_team.csv"), 'big_chance', 'SerieA')
+    baseline_add_team_data(fg, os.path.join(base_path, "SerieA23_24/team_goals_per_match.csv"), 'goals_per_match', 'SerieA')
+    baseline_add_team_data(fg, os.path.join(base_path, "SerieA23_24/saves_team.csv"), 'saves', 'SerieA')
+    baseline_add_team_data(fg, os.path.join(base_path, "SerieA23_24/accurate_pass_team.csv"), 'accurate_pass', 'SerieA')
+
+
+def vectorized_load_all_data(fg, base_path):
+    for _, file_path, kind, file_type, league, season in data_files(base_path):
+        if kind == "player":
+            fg.add_player_data(file_path, file_type, league, season=season)
+        else:
+            fg.add_team_data(file_path, file_type, league, season=season)
+
+
+def same_graph(a, b):
+    """Compare two graphs whose blank nodes are stats nodes.
+
+    Each blank node is replaced by its signature (incoming and outgoing edges),
+    which is much cheaper than a general isomorphism check on thousands of
+    structurally similar blank nodes.
+    """
+    def canonical(graph):
+        signatures = {}
+        for s, p, o in graph:
+            if isinstance(s, BNode):
+                signatures.setdefault(s, []).append(("out", p, o))
+            if isinstance(o, BNode):
+                signatures.setdefault(o, []).append(("in", s, p))
+        signatures = {node: tuple(sorted(edges)) for node, edges in signatures.items()}
+        return Counter(tuple(signatures.get(term, term) for term in triple) for triple in graph)
+
+    return len(a) == len(b) and canonical(a) == canonical(b)
+
+
+def predicate_difference(a, b):
+    """Triples per predicate that ``b`` has more (positive) or fewer
+    (negative) of than ``a``."""
+    counts = Counter(p for _, p, _ in b)
+    counts.subtract(p for _, p, _ in a)
+    return {p: n for p, n in counts.items() if n}
+
+
+def without(graph, predicates):
+    return [t for t in graph if t[1] not in predicates]
+
+
+def timed_build(load, base_path, repeat):
+    """Best-of-``repeat`` wall time of building a fresh graph with ``load``."""
+    fg = FootballGraph()
+    best = None
+    for _ in range(repeat):
+        fg._initialize()
+        start = time.perf_counter()
+        load(fg, base_path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, fg.rdf_graph
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CSV-to-triples ingest")
+    parser.add_argument("--datasets", default="./datasets")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--parallel", action="store_true", help="also time the process-parallel load_all_data")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-check", action="store_true", help="skip the graph equality check")
+    args = parser.parse_args()
+
+    rowwise_time, rowwise_graph = timed_build(baseline_load_all_data, args.datasets, args.repeat)
+    vectorized_time, vectorized_graph = timed_build(vectorized_load_all_data, args.datasets, args.repeat)
+
+    print(f"Row-by-row ingest: {rowwise_time:.3f}s ({len(rowwise_graph) / rowwise_time:,.0f} triples/s)")
+    print(f"Vectorized ingest: {vectorized_time:.3f}s ({len(vectorized_graph) / vectorized_time:,.0f} triples/s)")
+    print(f"Speedup: {rowwise_time / vectorized_time:.1f}x")
+
+    if not args.no_check:
+        same = same_graph(rowwise_graph, vectorized_graph)
+        print(f"Graphs identical: {same} ({len(rowwise_graph)} vs {len(vectorized_graph)} triples)")
+        if not same:
+            # Later changes add triples the original loaders never wrote (e.g.
+            # inSeason on TeamStats); report them and compare everything else.
+            difference = predicate_difference(rowwise_graph, vectorized_graph)
+            for predicate, count in sorted(difference.items()):
+                print(f"  {count:+d} {vectorized_graph.namespace_manager.normalizeUri(predicate)} triples")
+            rest_same = same_graph(without(rowwise_graph, difference), without(vectorized_graph, difference))
+            print(f"Graphs identical apart from these predicates: {rest_same}")
+
+    if args.parallel:
+        # Serial and parallel loads use the same stats node ids, so their graphs
+        # must be equal as sets of triples.
+        serial_time, serial_graph = timed_build(
+            lambda fg, base_path: fg.load_all_data(base_path), args.datasets, args.repeat)
+        parallel_time, parallel_graph = timed_build(
+            lambda fg, base_path: fg.load_all_data(base_path, parallel=True, max_workers=args.workers),
+            args.datasets, args.repeat)
+        print(f"Serial load_all_data: {serial_time:.3f}s")
+        print(f"Parallel load_all_data: {parallel_time:.3f}s ({serial_time / parallel_time:.1f}x)")
+        if not args.no_check:
+            print(f"Serial and parallel graphs identical: {set(serial_graph) == set(parallel_graph)}")
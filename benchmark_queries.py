@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+import rdflib
+from rdflib import Graph
+from rdflib.plugins.sparql import prepareQuery
+
+from compact_store import COMPACT_STORE
+from graph_snapshot import SNAPSHOT_STORE, Snapshot, SnapshotStore, load_graph
+from query import QUERIES, register_query
+import query_optimizer
+
+PERCENTILES = (50, 90, 99)
+
+
+def summarize(samples):
+    """Latency percentiles, min, max and mean of ``samples``, in seconds."""
+    summary = {f"p{p}": float(value) for p, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES))}
+    summary.update(min=min(samples), max=max(samples), mean=float(np.mean(samples)), samples=len(samples))
+    return summary
+
+
+def time_query(graph, query, cold_runs, warm_runs, max_seconds):
+    """Cold and warm latencies of one query, and the number of rows it returns.
+
+    A cold run compiles the query text and evaluates it; a warm run evaluates
+    the already compiled query again. Once a query has used ``max_seconds``,
+    it stops after its first cold and warm run, so slow queries don't stall
+    the suite. At least one cold run is needed, it compiles the query.
+    """
+    if cold_runs < 1:
+        raise ValueError("At least one cold run is needed to compile the query")
+    cold, warm = [], []
+    started = time.perf_counter()
+    prepared = rows = None
+    for _ in range(cold_runs):
+        start = time.perf_counter()
+        prepared = prepareQuery(query)
+        rows = len(list(graph.query(prepared)))
+        cold.append(time.perf_counter() - start)
+        if time.perf_counter() - started > max_seconds:
+            break
+    for _ in range(warm_runs):
+        start = time.perf_counter()
+        rows = len(list(graph.query(prepared)))
+        warm.append(time.perf_counter() - start)
+        if time.perf_counter() - started > max_seconds:
+            break
+    return rows, cold, warm
+
+
+def peak_memory(graph, query):
+    """Peak Python heap allocated while evaluating a compiled query."""
+    prepared = prepareQuery(query)
+    tracemalloc.start()
+    try:
+        list(graph.query(prepared))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_suite(graph, queries, cold_runs=3, warm_runs=10, max_seconds=30.0, memory=True):
+    results = {}
+    for name, _, query, _ in queries:
+        rows, cold, warm = time_query(graph, query, cold_runs, warm_runs, max_seconds)
+        results[name] = {"rows": rows, "cold": summarize(cold), "warm": summarize(warm) if warm else None}
+        if memory:
+            # One more evaluation, only if it still fits in the query's budget
+            fits = sum(cold) + sum(warm) + min(warm or cold) <= max_seconds
+            results[name]["peak_memory_bytes"] = peak_memory(graph, query) if fits else None
+        warm_p50 = results[name]["warm"]["p50"] if warm else float("nan")
+        print(f"{name:40} {rows:6} rows  cold p50 {results[name]['cold']['p50'] * 1000:9.1f} ms"
+              f"  warm p50 {warm_p50 * 1000:9.1f} ms")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print each query's warm median against the baseline and return the
+    names of the queries that got slower by more than ``threshold`` times."""
+    regressions = []
+    for name, current in results["queries"].items():
+        previous = baseline["queries"].get(name)
+        if previous is None or not previous.get("warm") or not current.get("warm"):
+            continue
+        ratio = current["warm"]["p50"] / previous["warm"]["p50"]
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{name:40} {previous['warm']['p50'] * 1000:9.1f} ms -> {current['warm']['p50'] * 1000:9.1f} ms"
+              f"  {ratio:5.2f}x{flag}")
+        if current["rows"] != previous["rows"]:
+            print(f"{'':40} rows changed: {previous['rows']} -> {current['rows']}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the SPARQL queries of query.py")
+    parser.add_argument("--ontology", default="football_ontology.ttl",
+                        help="Turtle file to query, loaded from its snapshot when that is fresh")
+    parser.add_argument("--snapshot", default=None, help="query this binary snapshot instead")
+    parser.add_argument("--query", action="append", dest="names", help="only run this query (repeatable)")
+    parser.add_argument("--query-file", action="append", default=[],
+                        help="also run the SPARQL query in this file, named after the file (repeatable)")
+    parser.add_argument("--cold", type=int, default=3, help="cold runs per query")
+    parser.add_argument("--warm", type=int, default=10, help="warm runs per query")
+    parser.add_argument("--max-seconds", type=float, default=30.0, help="time budget per query")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the peak memory measurement (also skipped for queries out of time budget)")
+    parser.add_argument("--store", default="default", choices=["default", COMPACT_STORE, SNAPSHOT_STORE],
+                        help="rdflib store to load the graph into")
+    parser.add_argument("--reorder", action="store_true",
+                        help="reorder triple patterns by selectivity and run top-k queries (query_optimizer.py), "
+                             "as main.py does")
+    parser.add_argument("--output", default="query_benchmark.json", help="where to write the results")
+    parser.add_argument("--baseline", default=None, help="results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="warm median slowdown over the baseline that counts as a regression")
+    args = parser.parse_args()
+    if args.cold < 1:
+        parser.error("--cold must be at least 1, the first cold run compiles the query")
+
+    names = args.names and set(args.names)
+    for path in args.query_file:
+        with open(path, "r", encoding="utf-8") as file:
+            name = os.path.splitext(os.path.basename(path))[0]
+            register_query(name, name, file.read())
+        if names:
+            names.add(name)
+    queries = [entry for entry in QUERIES if not names or entry[0] in names]
+
+    start = time.perf_counter()
+    if args.snapshot and args.store == SNAPSHOT_STORE:
+        graph = Graph(store=SnapshotStore(args.snapshot))
+    elif args.snapshot:
+        graph = Snapshot(args.snapshot).to_graph(Graph(store=args.store))
+    else:
+        graph = load_graph(args.ontology, store=args.store)
+    load_seconds = time.perf_counter() - start
+    print(f"Loaded {len(graph)} triples in {load_seconds:.2f}s")
+    if args.reorder:
+        start = time.perf_counter()
+        query_optimizer.optimize(graph)
+        print(f"Gathered pattern statistics in {time.perf_counter() - start:.2f}s")
+
+    results = {
+        "meta": {
+            "source": args.snapshot or args.ontology,
+            "triples": len(graph),
+            "load_seconds": load_seconds,
+            "store": args.store,
+            "reorder": args.reorder,
+            "python": platform.python_version(),
+            "rdflib": rdflib.__version__,
+            "created_at": time.time(),
+        },
+        "queries": run_suite(graph, queries, args.cold, args.warm, args.max_seconds, not args.no_memory),
+    }
+    # Linux reports the peak resident set size in KiB
+    results["meta"]["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} queries regressed: {', '.join(regressions)}")
+            raise SystemExit(1)
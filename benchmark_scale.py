@@ -0,0 +1,89 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from compact_store import COMPACT_STORE
+from football_graph import CHUNK_ROWS, FootballGraph
+from generate_datasets import generate
+from graph_snapshot import write_snapshot
+
+
+def measure(base_path, consolidate_stats=False, turtle=True, chunk_rows=CHUNK_ROWS, store="default"):
+    """Ingest the datasets under ``base_path`` and serialize the graph, timing
+    each step. Runs in a fresh process, so its peak RSS is this build's."""
+    graph = FootballGraph(store)
+    start = time.perf_counter()
+    graph.load_all_data(base_path, consolidate_stats=consolidate_stats, chunk_rows=chunk_rows)
+    ingest_seconds = time.perf_counter() - start
+    triples = len(graph.rdf_graph)
+    result = {
+        "triples": triples,
+        "ingest_seconds": ingest_seconds,
+        "ingest_triples_per_second": triples / ingest_seconds,
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        destination = os.path.join(directory, "football_ontology.ttl")
+        if turtle:
+            start = time.perf_counter()
+            graph.rdf_graph.serialize(destination=destination, format="turtle")
+            result["turtle_seconds"] = time.perf_counter() - start
+            result["turtle_triples_per_second"] = triples / result["turtle_seconds"]
+            result["turtle_bytes"] = os.path.getsize(destination)
+        start = time.perf_counter()
+        write_snapshot(graph.rdf_graph, os.path.join(directory, "football_ontology.snapshot"))
+        result["snapshot_seconds"] = time.perf_counter() - start
+        result["snapshot_triples_per_second"] = triples / result["snapshot_seconds"]
+
+    # Linux reports the peak resident set size in KiB
+    result["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result
+
+
+def run_scale(leagues, seasons, teams, players, coverage, missing_rate, consolidate_stats, turtle, chunk_rows,
+              store="default"):
+    with tempfile.TemporaryDirectory() as base_path:
+        datasets = generate(base_path, leagues, seasons, teams, players, coverage, missing_rate)
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            result = executor.submit(measure, base_path, consolidate_stats, turtle, chunk_rows, store).result()
+    result.update(leagues=leagues, seasons=seasons, datasets=datasets, players=leagues * seasons * teams * players)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingest and serialization on synthetic datasets")
+    parser.add_argument("--leagues", type=int, nargs="+", default=[3, 6, 12, 24],
+                        help="number of leagues of each scale to benchmark")
+    parser.add_argument("--seasons", type=int, default=1)
+    parser.add_argument("--teams", type=int, default=20, help="teams per league")
+    parser.add_argument("--players", type=int, default=25, help="players per team")
+    parser.add_argument("--coverage", type=float, default=0.6, help="share of the players listed in each player file")
+    parser.add_argument("--missing-rate", type=float, default=0.05, help="share of stat values left empty")
+    parser.add_argument("--consolidate-stats", action="store_true")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--store", default="default", choices=["default", COMPACT_STORE],
+                        help="rdflib store to build the graph in")
+    parser.add_argument("--no-turtle", action="store_true", help="skip the Turtle serialization")
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'leagues':>7} {'players':>8} {'triples':>10} {'ingest/s':>10} {'turtle/s':>10} {'snapshot/s':>10}"
+          f" {'peak RSS':>9}")
+    for leagues in args.leagues:
+        result = run_scale(leagues, args.seasons, args.teams, args.players, args.coverage, args.missing_rate,
+                           args.consolidate_stats, not args.no_turtle, args.chunk_rows, args.store)
+        results.append(result)
+        print(f"{leagues:>7} {result['players']:>8} {result['triples']:>10,}"
+              f" {result['ingest_triples_per_second']:>10,.0f} {result.get('turtle_triples_per_second', 0):>10,.0f}"
+              f" {result['snapshot_triples_per_second']:>10,.0f} {result['peak_rss_bytes'] / 2 ** 20:>7,.0f}MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results saved to {args.output}")
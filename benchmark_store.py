@@ -0,0 +1,117 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import gc
+import json
+import multiprocessing
+import random
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+from rdflib.plugins.sparql import prepareQuery
+
+from compact_store import COMPACT_STORE
+from graph_snapshot import SNAPSHOT_STORE, load_graph
+from query import QUERIES
+import query_optimizer
+
+STORES = ["default", COMPACT_STORE, SNAPSHOT_STORE]
+
+# Triple patterns looked up for each sampled triple: which of its subject,
+# predicate and object are bound
+LOOKUPS = ["s??", "sp?", "s?o", "?p?", "?po", "??o", "spo"]
+
+
+def pattern(triple, lookup):
+    return tuple(term if bound != "?" else None for term, bound in zip(triple, lookup))
+
+
+def measure_store(store, source, samples, query_runs, seed=0):
+    """Load ``source`` into ``store`` and time its lookups and queries. Runs
+    in a fresh process, so the memory figures are this store's."""
+    gc.collect()
+    tracemalloc.start()
+    graph = load_graph(source, store=store)
+    gc.collect()
+    graph_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del graph
+    gc.collect()
+
+    start = time.perf_counter()
+    graph = load_graph(source, store=store)
+    result = {"store": store, "triples": len(graph), "load_seconds": time.perf_counter() - start,
+              "graph_bytes": graph_bytes}
+
+    # The same sample in every store, whatever order it iterates in
+    triples = sorted(graph, key=lambda triple: tuple(term.n3() for term in triple))
+    sample = random.Random(seed).sample(triples, min(samples, len(triples)))
+    result["lookups"] = {}
+    for lookup in LOOKUPS:
+        rows = 0
+        start = time.perf_counter()
+        for triple in sample:
+            for _ in graph.triples(pattern(triple, lookup)):
+                rows += 1
+        seconds = time.perf_counter() - start
+        result["lookups"][lookup] = {"microseconds": seconds / len(sample) * 1e6, "rows": rows}
+
+    start = time.perf_counter()
+    sum(1 for _ in graph)
+    result["scan_seconds"] = time.perf_counter() - start
+
+    if query_runs:
+        query_optimizer.optimize(graph)
+        result["queries"] = {}
+        for name, _, query, _ in QUERIES:
+            prepared = prepareQuery(query)
+            rows = sorted(tuple(str(term) for term in row) for row in graph.query(prepared))
+            timings = []
+            for _ in range(query_runs):
+                start = time.perf_counter()
+                list(graph.query(prepared))
+                timings.append(time.perf_counter() - start)
+            result["queries"][name] = {"seconds": float(np.median(timings)), "rows": rows}
+
+    # Linux reports the peak resident set size in KiB
+    result["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the memory and lookup speed of the rdflib stores")
+    parser.add_argument("--ontology", default="football_ontology.ttl",
+                        help="Turtle file to load, from its snapshot when that is fresh")
+    parser.add_argument("--samples", type=int, default=2000, help="sampled triples to look up per pattern")
+    parser.add_argument("--query-runs", type=int, default=3,
+                        help="timed runs of each query.py query (with query_optimizer), 0 to skip them")
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for store in STORES:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results.append(executor.submit(measure_store, store, args.ontology, args.samples,
+                                           args.query_runs).result())
+
+    print(f"{'':24}" + "".join(f"{result['store']:>14}" for result in results))
+    print(f"{'triples':24}" + "".join(f"{result['triples']:>14,}" for result in results))
+    print(f"{'graph memory (MB)':24}" + "".join(f"{result['graph_bytes'] / 2 ** 20:>14.1f}" for result in results))
+    print(f"{'peak RSS (MB)':24}" + "".join(f"{result['peak_rss_bytes'] / 2 ** 20:>14.1f}" for result in results))
+    print(f"{'load (s)':24}" + "".join(f"{result['load_seconds']:>14.3f}" for result in results))
+    print(f"{'full scan (s)':24}" + "".join(f"{result['scan_seconds']:>14.3f}" for result in results))
+    for lookup in LOOKUPS:
+        print(f"{'lookup ' + lookup + ' (us)':24}"
+              + "".join(f"{result['lookups'][lookup]['microseconds']:>14.1f}" for result in results))
+    if args.query_runs:
+        for name, _, _, _ in QUERIES:
+            print(f"{name[:19] + ' (ms)':24}"
+                  + "".join(f"{result['queries'][name]['seconds'] * 1000:>14.1f}" for result in results))
+            if any(result["queries"][name]["rows"] != results[0]["queries"][name]["rows"] for result in results):
+                print(f"{'':24}results differ between the stores")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results saved to {args.output}")
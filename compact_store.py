@@ -0,0 +1,216 @@
+import threading
+
+import numpy as np
+from rdflib import plugin
+from rdflib.store import Store
+
+# Name to select the store with, e.g. Graph(store=COMPACT_STORE)
+COMPACT_STORE = "Compact"
+
+# A triple is packed into one int64 as three 21-bit term ids, in the order
+# of the index (spo, pos or osp)
+ID_BITS = 21
+ID_MASK = (1 << ID_BITS) - 1
+MAX_TERMS = 1 << ID_BITS
+
+# Pending changes are merged into the sorted indexes once there are this
+# many, or when the store is read
+MERGE_SIZE = 1 << 16
+
+
+def pack(a, b, c):
+    return (a << 2 * ID_BITS) | (b << ID_BITS) | c
+
+
+class CompactStore(Store):
+    """In-memory rdflib store that interns terms to integer ids.
+
+    Every distinct term is kept once, in a list indexed by its id. The
+    triples are three sorted int64 NumPy arrays, in subject-predicate-object,
+    predicate-object-subject and object-subject-predicate order, so a lookup
+    by any bound terms is a binary search for a range of one of them. Added
+    and removed triples wait in two small sets until they are merged into
+    the arrays in bulk.
+
+    The store is not context aware (like rdflib's SimpleMemory) and holds at
+    most ``MAX_TERMS`` distinct terms. Ids of terms whose triples were all
+    removed are not reused.
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, configuration=None, identifier=None):
+        super().__init__(configuration)
+        self.identifier = identifier
+        self._ids = {}
+        self._terms = []
+        self._spo = np.empty(0, dtype=np.int64)
+        self._pos = np.empty(0, dtype=np.int64)
+        self._osp = np.empty(0, dtype=np.int64)
+        self._added = set()
+        self._removed = set()
+        self._lock = threading.Lock()
+        self._namespace = {}
+        self._prefix = {}
+
+    def _intern(self, term):
+        term_id = self._ids.get(term)
+        if term_id is None:
+            if len(self._terms) >= MAX_TERMS:
+                raise ValueError(f"CompactStore holds at most {MAX_TERMS} distinct terms")
+            term_id = self._ids[term] = len(self._terms)
+            self._terms.append(term)
+        return term_id
+
+    def _stored(self, key):
+        """Whether the spo ``key`` is in the merged index."""
+        i = np.searchsorted(self._spo, key)
+        return i < len(self._spo) and self._spo[i] == key
+
+    def add(self, triple, context=None, quoted=False):
+        key = pack(*map(self._intern, triple))
+        if key in self._removed:
+            self._removed.discard(key)
+        elif key not in self._added and not self._stored(key):
+            self._added.add(key)
+            if len(self._added) >= MERGE_SIZE:
+                self._merge()
+
+    def add_encoded(self, terms, triples):
+        """Add many triples at once: ``triples`` is an (n, 3) integer array of
+        indexes into ``terms``, as in a graph snapshot."""
+        ids = np.fromiter((self._intern(term) for term in terms), dtype=np.int64, count=len(terms))
+        triples = ids[np.asarray(triples, dtype=np.int64).reshape(-1, 3)]
+        self._merge(pack(triples[:, 0], triples[:, 1], triples[:, 2]))
+
+    def remove(self, triple_pattern, context=None):
+        if None in triple_pattern:
+            triples = [triple for triple, _ in self.triples(triple_pattern)]
+        else:
+            triples = [triple_pattern]
+        for triple in triples:
+            ids = [self._ids.get(term) for term in triple]
+            if None in ids:
+                continue
+            key = pack(*ids)
+            if key in self._added:
+                self._added.discard(key)
+            elif self._stored(key):
+                self._removed.add(key)
+        if len(self._removed) >= MERGE_SIZE:
+            self._merge()
+
+    def _merge(self, added=None):
+        """Fold the pending changes (and ``added`` packed spo keys) into the
+        sorted indexes."""
+        with self._lock:
+            spo = self._spo
+            if self._removed:
+                spo = spo[~np.isin(spo, np.fromiter(self._removed, dtype=np.int64, count=len(self._removed)))]
+            if self._added:
+                spo = np.union1d(spo, np.fromiter(self._added, dtype=np.int64, count=len(self._added)))
+            if added is not None and len(added):
+                spo = np.union1d(spo, added)
+            if spo is not self._spo:
+                s, p, o = spo >> 2 * ID_BITS, (spo >> ID_BITS) & ID_MASK, spo & ID_MASK
+                self._spo = spo
+                self._pos = np.sort(pack(p, o, s))
+                self._osp = np.sort(pack(o, s, p))
+            self._added.clear()
+            self._removed.clear()
+
+    def _range(self, index, first, second=None):
+        """Keys of ``index`` that start with the ``first`` (and ``second``) id."""
+        if second is None:
+            low, high = first << 2 * ID_BITS, (first + 1) << 2 * ID_BITS
+        else:
+            low = (first << 2 * ID_BITS) | (second << ID_BITS)
+            high = low + (1 << ID_BITS)
+        start, end = np.searchsorted(index, [low, high])
+        return index[start:end]
+
+    def triples(self, triple_pattern, context=None):
+        """A generator over all the triples matching the pattern."""
+        if self._added or self._removed:
+            self._merge()
+        ids = []
+        for term in triple_pattern:
+            if term is None:
+                ids.append(None)
+            else:
+                term_id = self._ids.get(term)
+                if term_id is None:
+                    return
+                ids.append(term_id)
+        s, p, o = ids
+        if s is not None:
+            if p is not None:
+                if o is not None:
+                    if self._stored(pack(s, p, o)):
+                        yield tuple(triple_pattern), iter(())
+                    return
+                keys, order = self._range(self._spo, s, p), "spo"
+            elif o is not None:
+                keys, order = self._range(self._osp, o, s), "osp"
+            else:
+                keys, order = self._range(self._spo, s), "spo"
+        elif p is not None:
+            keys, order = (self._range(self._pos, p, o) if o is not None else self._range(self._pos, p)), "pos"
+        elif o is not None:
+            keys, order = self._range(self._osp, o), "osp"
+        else:
+            keys, order = self._spo, "spo"
+
+        terms = self._terms
+        for key in keys.tolist():
+            first, second, third = terms[key >> 2 * ID_BITS], terms[(key >> ID_BITS) & ID_MASK], terms[key & ID_MASK]
+            if order == "spo":
+                yield (first, second, third), iter(())
+            elif order == "pos":
+                yield (third, first, second), iter(())
+            else:
+                yield (second, third, first), iter(())
+
+    def __len__(self, context=None):
+        return len(self._spo) + len(self._added) - len(self._removed)
+
+    def stats(self):
+        return {
+            "triples": len(self),
+            "terms": len(self._terms),
+            "index_bytes": self._spo.nbytes + self._pos.nbytes + self._osp.nbytes,
+            "pending": len(self._added) + len(self._removed),
+        }
+
+    def bind(self, prefix, namespace, override=True):
+        bound_namespace = self._namespace.get(prefix)
+        bound_prefix = self._prefix.get(namespace)
+        if bound_prefix is None and bound_namespace is not None:
+            bound_prefix = self._prefix.get(bound_namespace)
+        if override:
+            if bound_prefix is not None:
+                del self._namespace[bound_prefix]
+            if bound_namespace is not None:
+                del self._prefix[bound_namespace]
+            self._prefix[namespace] = prefix
+            self._namespace[prefix] = namespace
+        else:
+            self._prefix[bound_namespace if bound_namespace is not None else namespace] = (
+                bound_prefix if bound_prefix is not None else prefix)
+            self._namespace[bound_prefix if bound_prefix is not None else prefix] = (
+                bound_namespace if bound_namespace is not None else namespace)
+
+    def namespace(self, prefix):
+        return self._namespace.get(prefix)
+
+    def prefix(self, namespace):
+        return self._prefix.get(namespace)
+
+    def namespaces(self):
+        yield from self._namespace.items()
+
+
+plugin.register(COMPACT_STORE, Store, "compact_store", "CompactStore")
@@ -0,0 +1,57 @@
+import json
+import os
+import re
+
+MANIFEST = "manifest.json"
+
+# Season directory names: 2024-25, 2024_25, 2024-2025, or 2024 for leagues
+# that play within a calendar year
+_SEASON = re.compile(r"^(\d{4})(?:[-_]?(\d{2}|\d{4}))?$")
+
+
+def season_name(directory):
+    """``"2024-25"`` -> ``"2024/25"``, or None if ``directory`` isn't a season."""
+    match = _SEASON.match(directory)
+    if not match:
+        return None
+    start, end = match.groups()
+    return f"{start}/{end[-2:]}" if end else start
+
+
+def season_key(season):
+    """Form of a season that can be used in ids and URIs: 2024/25 -> 2024-25."""
+    return season.replace("/", "-")
+
+
+def read_manifest(base_path):
+    """(directory, league, season) of the datasets listed in the manifest."""
+    path = os.path.join(base_path, MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as file:
+        manifest = json.load(file)
+    return [(entry["directory"], entry["league"], entry["season"]) for entry in manifest["datasets"]]
+
+
+def discover_datasets(base_path):
+    """(directory, league, season) of every dataset under ``base_path``.
+
+    Datasets are the directories listed in ``manifest.json`` and the
+    ``<League>/<Season>`` directories, such as ``LaLiga/2024-25``. Each holds
+    the CSV files of one league in one season.
+    """
+    datasets = read_manifest(base_path)
+    listed = {os.path.normpath(directory) for directory, _, _ in datasets}
+    for league in sorted(os.listdir(base_path)):
+        league_path = os.path.join(base_path, league)
+        if league in listed or not os.path.isdir(league_path):
+            continue
+        seasons = [(directory, season_name(directory)) for directory in sorted(os.listdir(league_path))
+                   if os.path.isdir(os.path.join(league_path, directory))]
+        if not any(season for _, season in seasons):
+            print(f"Skipping {league_path}: not in the manifest and has no season directories")
+            continue
+        for directory, season in seasons:
+            if season and os.path.join(league, directory) not in listed:
+                datasets.append((os.path.join(league, directory), league, season))
+    return datasets
@@ -1,24 +1,128 @@
-from SPARQLWrapper import SPARQLWrapper, JSON
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import argparse
+import hashlib
 import json
+import numpy as np
 import pandas as pd
 from rdflib import Graph, Namespace, Literal, URIRef, BNode
 from rdflib.namespace import RDF, RDFS, OWL, XSD
 import os
-import requests
+from compact_store import COMPACT_STORE
+from dataset_manifest import discover_datasets, season_key
+from graph_snapshot import file_sha256, fresh_snapshot, snapshot_path, write_snapshot
+from provenance import ProvenanceStore
+from stats_store import StatsStore
+from views import MaterializedViews
+from wikidata_cache import CachedResolver, ResolutionCache
+from wikidata_linker import HttpWikidataResolver, resolve
+from wikidata_offline import LocalWikidataResolver
+
+# Season of data loaded without one
+SEASON = "2023/24"
+
+# Rows read from a CSV file at a time
+CHUNK_ROWS = 50_000
+
+PLAYER_FILES = [
+    ("player_total_scoring_attempts.csv", 'scoring'),
+    ("player_top_scorers.csv", 'goals'),
+    ("player_total_assists_in_attack.csv", 'chances'),
+    ("player_top_assists.csv", 'assists'),
+]
+
+TEAM_FILES = [
+    ("big_chance_team.csv", 'big_chance'),
+    ("team_goals_per_match.csv", 'goals_per_match'),
+    ("saves_team.csv", 'saves'),
+    ("accurate_pass_team.csv", 'accurate_pass'),
+]
+
+# (CSV column, fb: property, datatype) of the stats in each file
+PLAYER_COMMON_COLUMNS = [
+    ('Minutes', 'minutes', XSD.integer),
+    ('Matches', 'matches', XSD.integer),
+]
+
+PLAYER_STATS_COLUMNS = {
+    'scoring': [
+        ('Shots per 90', 'shotsPerNinety', XSD.decimal),
+        ('Shot Conversion Rate (%)', 'shotConversionRate', XSD.decimal),
+    ],
+    'goals': [
+        ('Goals', 'goals', XSD.integer),
+        ('Penalties', 'penalties', XSD.integer),
+    ],
+    'chances': [
+        ('Chances Created', 'chancesCreated', XSD.integer),
+        ('Chances Created per 90', 'chancesCreatedPerNinety', XSD.decimal),
+    ],
+    'assists': [
+        ('Assists', 'assists', XSD.integer),
+        ('Secondary Assists', 'secondaryAssists', XSD.decimal),
+    ],
+}
+
+# Kind of entity and file type of each known CSV file name
+FILE_TYPES = {
+    **{file_name: ("player", file_type) for file_name, file_type in PLAYER_FILES},
+    **{file_name: ("team", data_type) for file_name, data_type in TEAM_FILES},
+}
+
+TEAM_COMMON_COLUMNS = [
+    ('Matches', 'gamesPlayed', XSD.integer),
+]
+
+TEAM_STATS_COLUMNS = {
+    'big_chance': [
+        ('Big Chances', 'bigChances', XSD.integer),
+        ('Goals', 'goalsFor', XSD.integer),
+    ],
+    'goals_per_match': [
+        ('Goals per Match', 'goalsPerMatch', XSD.decimal),
+        ('Total Goals Scored', 'goalsFor', XSD.integer),
+    ],
+    'saves': [
+        ('Saves per Match', 'savesPerMatch', XSD.decimal),
+        ('Total Saves', 'totalSaves', XSD.integer),
+    ],
+    'accurate_pass': [
+        ('Accurate Passes per Match', 'accuratePassesPerMatch', XSD.decimal),
+        ('Pass Success (%)', 'passSuccessPercentage', XSD.decimal),
+    ],
+}
+
+# fb: stats properties, and whether their values are integers
+STATS_PROPERTIES = {
+    prop: datatype == XSD.integer
+    for columns in [PLAYER_COMMON_COLUMNS, TEAM_COMMON_COLUMNS,
+                    *PLAYER_STATS_COLUMNS.values(), *TEAM_STATS_COLUMNS.values()]
+    for _, prop, datatype in columns
+}
+
+FOOTBALL = Namespace("http://example.org/football/")
 
 class FootballGraph:
     _instance = None
 
-    def __new__(cls):
+    def __new__(cls, store=None):
         if cls._instance is None:
             cls._instance = super(FootballGraph, cls).__new__(cls)
-            cls._instance._initialize()
+            cls._instance._initialize(store or "default")
+        elif store is not None and store != cls._instance.store:
+            raise ValueError(f"FootballGraph already holds its graph in the {cls._instance.store!r} store")
         return cls._instance
 
-    def _initialize(self):
-        self.rdf_graph = Graph()
-        self.FOOTBALL = Namespace("http://example.org/football/")
+    def _initialize(self, store="default"):
+        # rdflib store plugin holding the graph, e.g. "Compact" (compact_store.py)
+        self.store = store
+        self.rdf_graph = Graph(store=store)
+        self.FOOTBALL = FOOTBALL
         self.WD = Namespace("http://www.wikidata.org/entity/")
+        # Columnar copy of the numeric stats, filled with the same triples
+        self.stats = StatsStore(self.FOOTBALL, STATS_PROPERTIES)
+        # Leaderboards of query.py, computed once the data is loaded
+        self.views = MaterializedViews(self.stats)
 
         # Bind namespaces
         self.rdf_graph.bind("fb", self.FOOTBALL)
@@ -67,6 +171,9 @@ class FootballGraph:
         self.rdf_graph.add((self.FOOTBALL.nationality, OWL.equivalentProperty, self.WD.P27))  # Country of citizenship
         self.rdf_graph.add((self.FOOTBALL.goals, OWL.equivalentProperty, self.WD.P1351))  # Number of points/goals/set scored
 
+        # Triples that don't come from any CSV file
+        self.schema = set(self.rdf_graph)
+
     def safe_literal(self, value, datatype):
         """Safely create a Literal, converting floats to integers when necessary."""
         if pd.isna(value):
@@ -84,134 +191,153 @@ class FootballGraph:
         else:
             return Literal(value, datatype=datatype)
 
-    def add_player_data(self, file_path, file_type, league):
-        df = pd.read_csv(file_path)
-        
-        for _, row in df.iterrows():
-            player_uri = URIRef(self.FOOTBALL[row['Player'].replace(" ", "_")])
-            self.rdf_graph.add((player_uri, RDF.type, self.FOOTBALL.Player))
-            
-            team_uri = URIRef(self.FOOTBALL[row['Team'].replace(" ", "_")])
-            self.rdf_graph.add((team_uri, RDF.type, self.FOOTBALL.Team))
-            self.rdf_graph.add((player_uri, self.FOOTBALL.playsFor, team_uri))
-            
-            country_uri = URIRef(self.FOOTBALL[row['Country']])
-            self.rdf_graph.add((country_uri, RDF.type, self.FOOTBALL.Country))
-            self.rdf_graph.add((player_uri, self.FOOTBALL.nationality, country_uri))
-            
-            league_uri = URIRef(self.FOOTBALL[league])
-            self.rdf_graph.add((league_uri, RDF.type, self.FOOTBALL.League))
-
-            # Create a new PlayerStats instance for this player in this league
-            stats_uri = BNode()
-            self.rdf_graph.add((stats_uri, RDF.type, self.FOOTBALL.PlayerStats))
-            self.rdf_graph.add((player_uri, self.FOOTBALL.hasStats, stats_uri))
-            self.rdf_graph.add((stats_uri, self.FOOTBALL.inLeague, league_uri))
-            self.rdf_graph.add((stats_uri, self.FOOTBALL.inTeam, team_uri))
-            self.rdf_graph.add((stats_uri, self.FOOTBALL.inSeason, Literal("2023/24", datatype=XSD.string)))
-            
-            # Add minutes and matches data if available
-            if 'Minutes' in df.columns:
-                minutes_literal = self.safe_literal(row['Minutes'], datatype=XSD.integer)
-                if minutes_literal:
-                    self.rdf_graph.add((stats_uri, self.FOOTBALL.minutes, minutes_literal))
-            if 'Matches' in df.columns:
-                matches_literal = self.safe_literal(row['Matches'], datatype=XSD.integer)
-                if matches_literal:
-                    self.rdf_graph.add((stats_uri, self.FOOTBALL.matches, matches_literal))
-            
-            # Add specific stats based on file_type
-            if file_type == 'scoring':
-                if 'Shots per 90' in df.columns:
-                    shots_per_90_literal = self.safe_literal(row['Shots per 90'], datatype=XSD.decimal)
-                    if shots_per_90_literal:
-                        self.rdf_graph.add((stats_uri, self.FOOTBALL.shotsPerNinety, shots_per_90_literal))
-                if 'Shot Conversion Rate (%)' in df.columns:
-                    shot_conversion_rate_literal = self.safe_literal(row['Shot Conversion Rate (%)'], datatype=XSD.decimal)
-                    if shot_conversion_rate_literal:
-                        self.rdf_graph.add((stats_uri, self.FOOTBALL.shotConversionRate, shot_conversion_rate_literal))
-            elif file_type == 'goals':
-                if 'Goals' in df.columns:
-                    goals_literal = self.safe_literal(row['Goals'], datatype=XSD.integer)
-                    if goals_literal:
-                        self.rdf_graph.add((stats_uri, self.FOOTBALL.goals, goals_literal))
-                if 'Penalties' in df.columns:
-                    penalties_literal = self.safe_literal(row['Penalties'], datatype=XSD.integer)
-                    if penalties_literal:
-                        self.rdf_graph.add((stats_uri, self.FOOTBALL.penalties, penalties_literal))
-            elif file_type == 'chances':
-                if 'Chances Created' in df.columns:
-                    chances_created_literal = self.safe_literal(row['Chances Created'], datatype=XSD.integer)
-                    if chances_created_literal:
-                        self.rdf_graph.add((stats_uri, self.FOOTBALL.chancesCreated, chances_created_literal))
-                if 'Chances Created per 90' in df.columns:
-                    chances_created_per_90_literal = self.safe_literal(row['Chances Created per 90'], datatype=XSD.decimal)
-                    if chances_created_per_90_literal:
-                        self.rdf_graph.add((stats_uri, self.FOOTBALL.chancesCreatedPerNinety, chances_created_per_90_literal))
-            elif file_type == 'assists':
-                if 'Assists' in df.columns:
-                    assists_literal = self.safe_literal(row['Assists'], datatype=XSD.integer)
-                    if assists_literal:
-                        self.rdf_graph.add((stats_uri, self.FOOTBALL.assists, assists_literal))
-                if 'Secondary Assists' in df.columns:
-                    secondary_assists_literal = self.safe_literal(row['Secondary Assists'], datatype=XSD.decimal)
-                    if secondary_assists_literal:
-                        self.rdf_graph.add((stats_uri, self.FOOTBALL.secondaryAssists, secondary_assists_literal))
-
-    def add_team_data(self, file_path, data_type, league):
-        df = pd.read_csv(file_path)
-        
-        for _, row in df.iterrows():
-            team_uri = URIRef(self.FOOTBALL[row['Team'].replace(" ", "_")])
-            self.rdf_graph.add((team_uri, RDF.type, self.FOOTBALL.Team))
-            
-            country_uri = URIRef(self.FOOTBALL[row['Country']])
-            self.rdf_graph.add((country_uri, RDF.type, self.FOOTBALL.Country))
-            self.rdf_graph.add((team_uri, self.FOOTBALL.nationality, country_uri))
-            
-            league_uri = URIRef(self.FOOTBALL[league])
-            self.rdf_graph.add((league_uri, RDF.type, self.FOOTBALL.League))
-            self.rdf_graph.add((team_uri, self.FOOTBALL.inLeague, league_uri))
-            
-            # Create a new TeamStats instance for this team
-            stats_uri = BNode()
-            self.rdf_graph.add((stats_uri, RDF.type, self.FOOTBALL.TeamStats))
-            self.rdf_graph.add((team_uri, self.FOOTBALL.hasTeamStats, stats_uri))
-            
-            # Add matches played
-            matches_literal = self.safe_literal(row['Matches'], datatype=XSD.integer)
-            if matches_literal:
-                self.rdf_graph.add((stats_uri, self.FOOTBALL.gamesPlayed, matches_literal))
-            
-            # Add specific stats based on data_type
-            if data_type == 'big_chance':
-                big_chances_literal = self.safe_literal(row['Big Chances'], datatype=XSD.integer)
-                goals_literal = self.safe_literal(row['Goals'], datatype=XSD.integer)
-                if big_chances_literal:
-                    self.rdf_graph.add((stats_uri, self.FOOTBALL.bigChances, big_chances_literal))
-                if goals_literal:
-                    self.rdf_graph.add((stats_uri, self.FOOTBALL.goalsFor, goals_literal))
-            elif data_type == 'goals_per_match':
-                goals_per_match_literal = self.safe_literal(row['Goals per Match'], datatype=XSD.decimal)
-                total_goals_literal = self.safe_literal(row['Total Goals Scored'], datatype=XSD.integer)
-                if goals_per_match_literal:
-                    self.rdf_graph.add((stats_uri, self.FOOTBALL.goalsPerMatch, goals_per_match_literal))
-                if total_goals_literal:
-                    self.rdf_graph.add((stats_uri, self.FOOTBALL.goalsFor, total_goals_literal))
-            elif data_type == 'saves':
-                saves_per_match_literal = self.safe_literal(row['Saves per Match'], datatype=XSD.decimal)
-                total_saves_literal = self.safe_literal(row['Total Saves'], datatype=XSD.integer)
-                if saves_per_match_literal:
-                    self.rdf_graph.add((stats_uri, self.FOOTBALL.savesPerMatch, saves_per_match_literal))
-                if total_saves_literal:
-                    self.rdf_graph.add((stats_uri, self.FOOTBALL.totalSaves, total_saves_literal))
-            elif data_type == 'accurate_pass':
-                accurate_passes_literal = self.safe_literal(row['Accurate Passes per Match'], datatype=XSD.decimal)
-                pass_success_literal = self.safe_literal(row['Pass Success (%)'], datatype=XSD.decimal)
-                if accurate_passes_literal:
-                    self.rdf_graph.add((stats_uri, self.FOOTBALL.accuratePassesPerMatch, accurate_passes_literal))
-                if pass_success_literal:
-                    self.rdf_graph.add((stats_uri, self.FOOTBALL.passSuccessPercentage, pass_success_literal))
+    def stat_literals(self, column, datatype):
+        """Vectorized safe_literal over a whole column.
+
+        Returns the positions of the rows that get a triple and their Literals.
+        Missing, unparsable and zero values are dropped, as the row-by-row
+        ``if literal:`` checks did. Each distinct value becomes one Literal.
+        """
+        numbers = pd.to_numeric(column, errors='coerce').to_numpy(dtype=float)
+        if datatype == XSD.integer:
+            numbers = np.trunc(numbers)
+        positions = np.flatnonzero(np.isfinite(numbers) & (numbers != 0))
+        values = numbers[positions].tolist()
+        if datatype == XSD.integer:
+            literals = {value: Literal(int(value), datatype=XSD.integer) for value in set(values)}
+        else:
+            literals = {value: Literal(value, datatype=XSD.decimal) for value in set(values)}
+        return positions, [literals[value] for value in values]
+
+    def column_uris(self, names):
+        """Map a column of names to fb: URIs, building each distinct URI once."""
+        uris = {name: URIRef(self.FOOTBALL[name]) for name in pd.unique(names)}
+        return [uris[name] for name in names]
+
+    def stats_nodes(self, df, bnode_prefix):
+        """One stats blank node per row.
+
+        With a ``bnode_prefix`` the node ids are derived from the row index, so
+        the same file always yields the same nodes, whichever process builds it.
+        """
+        if bnode_prefix is None:
+            return [BNode() for _ in range(len(df))]
+        return [BNode(f"{bnode_prefix}{i}") for i in df.index]
+
+    def player_stats_uri(self, player, team, league, season=SEASON):
+        """Stats node of a player's stint at one team, in one league and
+        season, as used by the consolidated layout, e.g.
+        fb:stats/LaLiga/2023-24/Osasuna/Player_Name."""
+        player_name = str(player)[len(self.FOOTBALL):]
+        team_name = str(team)[len(self.FOOTBALL):]
+        league_name = str(league)[len(self.FOOTBALL):]
+        return URIRef(self.FOOTBALL[f"stats/{league_name}/{season_key(season)}/{team_name}/{player_name}"])
+
+    def player_triples(self, df, file_type, league, bnode_prefix=None, consolidate_stats=False, season=SEASON):
+        FB = self.FOOTBALL
+        players = self.column_uris(df['Player'].str.replace(" ", "_", regex=False))
+        teams = self.column_uris(df['Team'].str.replace(" ", "_", regex=False))
+        countries = self.column_uris(df['Country'])
+        league_uri = URIRef(FB[league])
+        season_literal = Literal(season, datatype=XSD.string)
+
+        if consolidate_stats:
+            # One PlayerStats instance per player, team, league and season,
+            # shared by the rows of every file, so all the stats of a stint are
+            # on one node. A player who changed teams keeps a node per team, as
+            # stats of two stints can't be told apart once on one node
+            stints = list(zip(players, teams))
+            uris = {stint: self.player_stats_uri(*stint, league_uri, season) for stint in dict.fromkeys(stints)}
+            stats = [uris[stint] for stint in stints]
+        else:
+            # One PlayerStats instance per row, for this player in this league
+            stats = self.stats_nodes(df, bnode_prefix)
+
+        triples = []
+        triples.extend((player, RDF.type, FB.Player) for player in dict.fromkeys(players))
+        triples.extend((team, RDF.type, FB.Team) for team in dict.fromkeys(teams))
+        triples.extend((country, RDF.type, FB.Country) for country in dict.fromkeys(countries))
+        if stats:
+            triples.append((league_uri, RDF.type, FB.League))
+        triples.extend(zip(players, repeat(FB.playsFor), teams))
+        triples.extend(zip(players, repeat(FB.nationality), countries))
+        triples.extend(zip(stats, repeat(RDF.type), repeat(FB.PlayerStats)))
+        triples.extend(zip(players, repeat(FB.hasStats), stats))
+        triples.extend(zip(stats, repeat(FB.inLeague), repeat(league_uri)))
+        triples.extend(zip(stats, repeat(FB.inTeam), teams))
+        triples.extend(zip(stats, repeat(FB.inSeason), repeat(season_literal)))
+
+        # Minutes and matches if available, then the stats of this file_type
+        for column, prop, datatype in PLAYER_COMMON_COLUMNS + PLAYER_STATS_COLUMNS.get(file_type, []):
+            if column in df.columns:
+                positions, literals = self.stat_literals(df[column], datatype)
+                triples.extend(zip((stats[i] for i in positions), repeat(FB[prop]), literals))
+        return triples
+
+    def team_triples(self, df, data_type, league, bnode_prefix=None, season=SEASON):
+        FB = self.FOOTBALL
+        teams = self.column_uris(df['Team'].str.replace(" ", "_", regex=False))
+        countries = self.column_uris(df['Country'])
+        league_uri = URIRef(FB[league])
+
+        # One TeamStats instance per row
+        stats = self.stats_nodes(df, bnode_prefix)
+
+        triples = []
+        triples.extend((team, RDF.type, FB.Team) for team in dict.fromkeys(teams))
+        triples.extend((country, RDF.type, FB.Country) for country in dict.fromkeys(countries))
+        if stats:
+            triples.append((league_uri, RDF.type, FB.League))
+        triples.extend(zip(teams, repeat(FB.nationality), countries))
+        triples.extend(zip(teams, repeat(FB.inLeague), repeat(league_uri)))
+        triples.extend(zip(stats, repeat(RDF.type), repeat(FB.TeamStats)))
+        triples.extend(zip(teams, repeat(FB.hasTeamStats), stats))
+        triples.extend(zip(stats, repeat(FB.inSeason), repeat(Literal(season, datatype=XSD.string))))
+
+        # Matches played, then the stats of this data_type
+        for column, prop, datatype in TEAM_COMMON_COLUMNS + TEAM_STATS_COLUMNS.get(data_type, []):
+            positions, literals = self.stat_literals(df[column], datatype)
+            triples.extend(zip((stats[i] for i in positions), repeat(FB[prop]), literals))
+        return triples
+
+    def add_triples(self, triples):
+        self.rdf_graph.addN((s, p, o, self.rdf_graph) for s, p, o in triples)
+        self.stats.add_triples(triples)
+
+    def remove_triples(self, triples):
+        for triple in triples:
+            self.rdf_graph.remove(triple)
+        self.stats.remove_triples(triples)
+
+    def file_triples(self, file_path, kind, file_type, league, season=SEASON, consolidate_stats=False,
+                     chunk_rows=CHUNK_ROWS):
+        """Triples of one CSV file, a list per chunk of ``chunk_rows`` rows,
+        with the same stats node ids on every build."""
+        bnode_prefix = stats_bnode_prefix(league, file_type, season, os.path.dirname(file_path))
+        for df in read_chunks(file_path, chunk_rows):
+            if kind == "player":
+                yield self.player_triples(df, file_type, league, bnode_prefix, consolidate_stats, season)
+            else:
+                yield self.team_triples(df, file_type, league, bnode_prefix, season)
+
+    def turtle(self, triples):
+        """Serialize some triples to Turtle, with the prefixes of the graph."""
+        fragment = Graph()
+        for prefix, namespace in self.rdf_graph.namespaces():
+            fragment.bind(prefix, namespace, override=True)
+        fragment.addN((s, p, o, fragment) for s, p, o in triples)
+        return fragment.serialize(format="turtle", encoding="utf-8")
+
+    def add_player_data(self, file_path, file_type, league, bnode_prefix=None, consolidate_stats=False,
+                        season=SEASON, chunk_rows=None):
+        for df in read_chunks(file_path, chunk_rows):
+            self.add_triples(self.player_triples(df, file_type, league, bnode_prefix, consolidate_stats, season))
+        # The views see the new rows on their next read (the stats store's
+        # version changed), so several files cost one refresh, not one each
+
+    def add_team_data(self, file_path, data_type, league, bnode_prefix=None, season=SEASON, chunk_rows=None):
+        for df in read_chunks(file_path, chunk_rows):
+            self.add_triples(self.team_triples(df, data_type, league, bnode_prefix, season))
 
     def country_iso_to_name(self, country_iso_code):
         with open('./iso_to_country.json', 'r') as file:
@@ -221,49 +347,23 @@ class FootballGraph:
             except KeyError:
                 return None
         
-    def link_country_to_wikidata(self):
-        endpoint_url = "https://query.wikidata.org/sparql"
-        
-        base_query = """
-        ASK
-        WHERE {
-            ?country wdt:P31 wd:Q6256 . # country
-            VALUES ?country { %s }
-        }
-        """
-            
+    def add_wikidata_links(self, matches):
+        for entity, wikidata_id in matches.items():
+            if wikidata_id:
+                self.rdf_graph.add((entity, OWL.sameAs, self.WD[wikidata_id]))
+
+    def link_country_to_wikidata(self, resolver=None):
+        countries = {}
         for country in self.rdf_graph.subjects(RDF.type, self.FOOTBALL.Country):
             country_iso_code = str(country).split("/")[-1].replace("_", " ")
             country_name = self.country_iso_to_name(country_iso_code)
             if not country_name:
                 print(f"Couldn't find the country name for {country_iso_code}")
                 continue
-            
-            # We use the search engine of wikidata
-            wikidata_url = f"https://www.wikidata.org/w/api.php?action=wbsearchentities&search={country_name}&language=en&format=json&type=item"
-            response = requests.get(wikidata_url)
-            data = response.json()
-            wikidata_results = data['search']
-            
-            # We iterate over the results and use sparql to query checking if they are countries
-            for result in wikidata_results:
-                wikidata_id = result['id']
-                sparql_values = "wd:" + wikidata_id
-                
-                query = base_query % sparql_values
-                
-                sparql = SPARQLWrapper(endpoint_url)
-                sparql.setQuery(query)
-                sparql.setReturnFormat(JSON)
-                
-                try:
-                    results = sparql.query().convert()
-                    if results["boolean"]:
-                        wikidata_uri = URIRef(f"http://www.wikidata.org/entity/{result['id']}")
-                        self.rdf_graph.add((country, OWL.sameAs, wikidata_uri))
-                        break
-                except Exception as e:
-                    print(f"Fail: Couldn't execute the query for {country_name}, {wikidata_id}")
+            countries[country] = (country_name, None)
+
+        # Candidates from the Wikidata search, checked to be countries
+        self.add_wikidata_links(resolve(resolver or HttpWikidataResolver(), "country", countries))
 
     def link_leagues_to_wikidata(self):
         wikidata_leagues = {
@@ -274,157 +374,266 @@ class FootballGraph:
         
         for league in self.rdf_graph.subjects(RDF.type, self.FOOTBALL.League):
             league_name = str(league).split("/")[-1].replace("_", " ")
+            if league_name not in wikidata_leagues:
+                print(f"No Wikidata id for the league {league_name}")
+                continue
             wikidata_uri = URIRef(wikidata_leagues[league_name])
             self.rdf_graph.add((league, OWL.sameAs, wikidata_uri))
         
-    def link_players_to_wikidata(self):
-        endpoint_url = "https://query.wikidata.org/sparql"
-        
-        base_query = """
-        ASK
-        WHERE {
-            ?player wdt:P106 wd:Q937857 . # football player
-            ?player wdt:P19|wdt:P27 ?country . # country
-            VALUES ( ?player ?country ) { %s }
-        }
-        """
-        
+    def link_players_to_wikidata(self, resolver=None):
+        players = {}
         for player in self.rdf_graph.subjects(RDF.type, self.FOOTBALL.Player):
             player_name = str(player).split("/")[-1].replace("_", " ")
-            # We use the search engine of wikidata  
-            wikidata_url = f"https://www.wikidata.org/w/api.php?action=wbsearchentities&search={player_name}&language=en&format=json&type=item"
-            response = requests.get(wikidata_url)
-            data = response.json()
-            wikidata_results = data['search']
-            
             country_uri = self.rdf_graph.value(player, self.FOOTBALL.nationality)
+            if not country_uri:
+                players[player] = (player_name, None)
+                continue
+            # The player's birthplace or citizenship must match its nationality,
+            # which can't be checked until the country itself is linked
             wikidata_country = self.rdf_graph.value(country_uri, OWL.sameAs)
-            country_wikidata_id = "wd:" + str(wikidata_country).split("/")[-1]
-            
-            # We iterate over the results and use sparql to query checking if they are players
-            for result in wikidata_results:
-                player_wikidata_id = "wd:" + result['id']
-                
-                if not country_uri:
-                    base_query = """
-                    ASK
-                    WHERE {
-                        ?player wdt:P106 wd:Q937857 . # football player
-                        VALUES ?player { %s }
-                    }
-                    """
-                    sparql_values = player_wikidata_id
-                else:
-                    sparql_values = f"({player_wikidata_id} {country_wikidata_id})"
-                    
-                query = base_query % sparql_values
-                
-                sparql = SPARQLWrapper(endpoint_url)
-                sparql.setQuery(query)
-                sparql.setReturnFormat(JSON)
-                
-                try:
-                    results = sparql.query().convert()
-                    if results["boolean"]:
-                        wikidata_uri = URIRef(f"http://www.wikidata.org/entity/{result['id']}")
-                        self.rdf_graph.add((player, OWL.sameAs, wikidata_uri))
-                        break
-                except Exception as e:
-                    print(f"Fail: Couldn't execute the query for {player_name}, {player_wikidata_id}")
-   
-    def link_teams_to_wikidata(self):
-        endpoint_url = "https://query.wikidata.org/sparql"
-        
-        base_query = """
-        ASK
-        WHERE {
-            ?team wdt:P31 wd:Q476028 . # team
-            VALUES ?team { %s }
-        }
-        """
-        
+            if wikidata_country is None:
+                continue
+            players[player] = (player_name, str(wikidata_country).split("/")[-1])
+
+        # Candidates from the Wikidata search, checked to be football players
+        self.add_wikidata_links(resolve(resolver or HttpWikidataResolver(), "player", players))
+
+    def link_teams_to_wikidata(self, resolver=None):
+        teams = {}
         for team in self.rdf_graph.subjects(RDF.type, self.FOOTBALL.Team):
             team_name = str(team).split("/")[-1].replace("_", " ")
-            # We use the search engine of wikidata
-            wikidata_url = f"https://www.wikidata.org/w/api.php?action=wbsearchentities&search={team_name}&language=en&format=json&type=item"
-            response = requests.get(wikidata_url)
-            data = response.json()
-            wikidata_results = data['search']
-            
-            # We iterate over the results and use sparql to query checking if they are teams
-            for result in wikidata_results:
-                wikidata_id = result['id']
-                sparql_values = "wd:" + wikidata_id
-                query = base_query % sparql_values
-                
-                sparql = SPARQLWrapper(endpoint_url)
-                sparql.setQuery(query)
-                sparql.setReturnFormat(JSON)
-                
-                try:
-                    results = sparql.query().convert()
-                    if results["boolean"]:
-                        wikidata_uri = URIRef(f"http://www.wikidata.org/entity/{wikidata_id}")
-                        self.rdf_graph.add((team, OWL.sameAs, wikidata_uri))
-                        break
-                except Exception as e:
-                    print(f"Fail: Couldn't execute the query for {team_name}, {wikidata_id}")
-
-    def load_all_data(self):
-        base_path = "./datasets"
-        # Premier league data
-        # Players data
-        self.add_player_data(os.path.join(base_path, "Premleg_23_24/player_total_scoring_attempts.csv"), 'scoring', 'PremierLeague')
-        self.add_player_data(os.path.join(base_path, "Premleg_23_24/player_top_scorers.csv"), 'goals', 'PremierLeague')
-        self.add_player_data(os.path.join(base_path, "Premleg_23_24/player_total_assists_in_attack.csv"), 'chances', 'PremierLeague')
-        self.add_player_data(os.path.join(base_path, "Premleg_23_24/player_top_assists.csv"), 'assists', 'PremierLeague')
-        
-        # Teams data
-        self.add_team_data(os.path.join(base_path, "Premleg_23_24/big_chance_team.csv"), 'big_chance', 'PremierLeague')
-        self.add_team_data(os.path.join(base_path, "Premleg_23_24/team_goals_per_match.csv"), 'goals_per_match', 'PremierLeague')
-        self.add_team_data(os.path.join(base_path, "Premleg_23_24/saves_team.csv"), 'saves', 'PremierLeague')
-        self.add_team_data(os.path.join(base_path, "Premleg_23_24/accurate_pass_team.csv"), 'accurate_pass', 'PremierLeague')
-
-        # La Liga data
-        # Players data
-        self.add_player_data(os.path.join(base_path, "laliga2023_34/player_total_scoring_attempts.csv"), 'scoring', 'LaLiga')
-        self.add_player_data(os.path.join(base_path, "laliga2023_34/player_top_scorers.csv"), 'goals', 'LaLiga')
-        self.add_player_data(os.path.join(base_path, "laliga2023_34/player_total_assists_in_attack.csv"), 'chances', 'LaLiga')
-        self.add_player_data(os.path.join(base_path, "laliga2023_34/player_top_assists.csv"), 'assists', 'LaLiga')
-        
-        # Teams data
-        self.add_team_data(os.path.join(base_path, "laliga2023_34/big_chance_team.csv"), 'big_chance', 'LaLiga')
-        self.add_team_data(os.path.join(base_path, "laliga2023_34/team_goals_per_match.csv"), 'goals_per_match', 'LaLiga')
-        self.add_team_data(os.path.join(base_path, "laliga2023_34/saves_team.csv"), 'saves', 'LaLiga')
-        self.add_team_data(os.path.join(base_path, "laliga2023_34/accurate_pass_team.csv"), 'accurate_pass', 'LaLiga')
-        
-        # Serie A data
-        # Players data
-        self.add_player_data(os.path.join(base_path, "SerieA23_24/player_total_scoring_attempts.csv"), 'scoring', 'SerieA')
-        self.add_player_data(os.path.join(base_path, "SerieA23_24/player_top_scorers.csv"), 'goals', 'SerieA')
-        self.add_player_data(os.path.join(base_path, "SerieA23_24/player_total_assists_in_attack.csv"), 'chances', 'SerieA')
-        self.add_player_data(os.path.join(base_path, "SerieA23_24/player_top_assists.csv"), 'assists', 'SerieA')
-        
-        # Teams data
-        self.add_team_data(os.path.join(base_path, "SerieA23_24/big_chance_team.csv"), 'big_chance', 'SerieA')
-        self.add_team_data(os.path.join(base_path, "SerieA23_24/team_goals_per_match.csv"), 'goals_per_match', 'SerieA')
-        self.add_team_data(os.path.join(base_path, "SerieA23_24/saves_team.csv"), 'saves', 'SerieA')
-        self.add_team_data(os.path.join(base_path, "SerieA23_24/accurate_pass_team.csv"), 'accurate_pass', 'SerieA')
+            teams[team] = (team_name, None)
+
+        # Candidates from the Wikidata search, checked to be football clubs
+        self.add_wikidata_links(resolve(resolver or HttpWikidataResolver(), "team", teams))
+
+    def load_all_data(self, base_path="./datasets", parallel=False, max_workers=None, consolidate_stats=False,
+                      leagues=None, seasons=None, chunk_rows=CHUNK_ROWS):
+        """Load every dataset found under ``base_path`` (see discover_datasets),
+        or only those of the given ``leagues`` and ``seasons``.
+
+        Files are read ``chunk_rows`` rows at a time, so memory use while
+        reading depends on the chunk size, not on the size of the corpus.
+
+        With ``parallel`` the workers only read the CSV files and build the
+        triples; inserting them in the graph (and the stats store) stays in
+        this process, one dataset after the other, and is most of the cost of
+        a load. It pays off when there are several CPUs and reading and
+        building the datasets outweigh starting the workers and passing the
+        triples back, i.e. for many or large CSV files; on small datasets or
+        a single CPU the serial load is faster.
+        """
+        if parallel:
+            # Each dataset is built in its own worker process; the main process
+            # only inserts the triples, in dataset order, as workers finish.
+            datasets = [dataset for dataset in discover_datasets(base_path)
+                        if selected(dataset, leagues, seasons)]
+            if datasets:
+                directories = [directory for directory, _, _ in datasets]
+                dataset_leagues = [league for _, league, _ in datasets]
+                dataset_seasons = [season for _, _, season in datasets]
+                n = len(datasets)
+                with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                    for triples in executor.map(dataset_triples, [base_path] * n, directories, dataset_leagues,
+                                                dataset_seasons, [consolidate_stats] * n, [chunk_rows] * n):
+                        self.add_triples(triples)
+            self.views.refresh()
+            return
+
+        for _, file_path, kind, file_type, league, season in data_files(base_path, leagues, seasons):
+            for triples in self.file_triples(file_path, kind, file_type, league, season, consolidate_stats,
+                                             chunk_rows):
+                self.add_triples(triples)
+        self.views.refresh()
     
-    def link_to_wikidata(self):
-        self.link_country_to_wikidata()
+    def load_build(self, ontology, provenance, consolidate_stats=False):
+        """Load the graph of the build ``provenance`` describes, if the
+        ontology and its snapshot are still the ones that build saved."""
+        if not os.path.exists(ontology) or provenance.get_meta("ontology_sha256") != file_sha256(ontology):
+            return False
+        if provenance.get_meta("consolidate_stats") != str(consolidate_stats):
+            return False
+        # Only the snapshot keeps the stats node ids the provenance refers to
+        snapshot = fresh_snapshot(ontology)
+        if snapshot is None:
+            return False
+        self._initialize(self.store)
+        snapshot.to_graph(self.rdf_graph)
+        self.stats.add_triples(self.rdf_graph)
+        return True
+
+    def update_data(self, provenance, base_path="./datasets", ontology="football_ontology.ttl",
+                    consolidate_stats=False):
+        """Bring the previous build up to date with the CSV files.
+
+        Only files whose content hash changed are read again: the triples
+        they no longer produce are retracted, unless another file also
+        produces them, and the new ones added. Without a usable previous
+        build, everything is built and recorded. Returns the changed sources.
+
+        Only reading and diffing the CSV files is limited to the changed
+        ones. Loading the previous graph from its snapshot and filling the
+        stats store from it are still proportional to the whole graph, and so
+        is save_ontology afterwards, which writes the whole Turtle file (from
+        the stored fragments) and snapshot again.
+        """
+        if not self.load_build(ontology, provenance, consolidate_stats):
+            print("No usable previous build, building from all files")
+            provenance.clear()
+            self._initialize(self.store)
+        hashes = provenance.hashes()
+        changed = []
+        for source, file_path, kind, file_type, league, season in data_files(base_path):
+            sha256 = file_sha256(file_path)
+            if hashes.pop(source, None) == sha256:
+                continue
+            triples = set().union(*self.file_triples(file_path, kind, file_type, league, season,
+                                                     consolidate_stats))
+            previous = provenance.triples(source)
+            retracted = previous - triples
+            self.remove_triples(retracted - provenance.shared(retracted, source))
+            self.add_triples(list(triples - previous))
+            provenance.replace(source, sha256, triples, self.turtle(triples))
+            changed.append(source)
+
+        # Files that are gone
+        for source in hashes:
+            retracted = provenance.triples(source)
+            self.remove_triples(retracted - provenance.shared(retracted, source))
+            provenance.remove(source)
+            changed.append(source)
+
+        provenance.set_meta("consolidate_stats", str(consolidate_stats))
+        self.views.refresh()
+        return changed
+
+    def link_to_wikidata(self, resolver=None):
+        # One resolver, so all entity kinds share its limits
+        resolver = resolver or HttpWikidataResolver()
+        self.link_country_to_wikidata(resolver)
         self.link_leagues_to_wikidata()
-        self.link_teams_to_wikidata()
-        self.link_players_to_wikidata()
+        self.link_teams_to_wikidata(resolver)
+        self.link_players_to_wikidata(resolver)
+
+    def save_ontology(self, destination="football_ontology.ttl", snapshot=True, provenance=None):
+        if provenance is None:
+            self.rdf_graph.serialize(destination=destination, format="turtle")
+        else:
+            # Incremental builds only serialize the changed files again: the
+            # Turtle file is the schema and Wikidata links, then the stored
+            # fragment of every file
+            header = self.schema | set(self.rdf_graph.triples((None, OWL.sameAs, None)))
+            with open(destination, "wb") as file:
+                file.write(self.turtle(header))
+                for fragment in provenance.fragments():
+                    file.write(b"\n" + fragment)
+        # Binary snapshot next to the Turtle file, for fast server start-up
+        if snapshot:
+            write_snapshot(self.rdf_graph, snapshot_path(destination), source=destination)
+        if provenance is not None:
+            provenance.set_meta("ontology_sha256", file_sha256(destination))
 
-    def save_ontology(self, destination="football_ontology.ttl"):
-        self.rdf_graph.serialize(destination=destination, format="turtle")
 
 
+def stats_bnode_prefix(league, file_type, season=SEASON, directory=""):
+    """Prefix of the stats node ids of a CSV file in ``directory``. Two
+    datasets can have the same league and season, so a hash of the
+    directory keeps their ids apart."""
+    path = os.path.normpath(directory).replace(os.sep, "/")
+    return f"{league}_{season_key(season)}_{file_type}_{hashlib.sha256(path.encode('utf-8')).hexdigest()[:8]}_"
 
-if __name__ == "__main__":
+
+def read_chunks(file_path, chunk_rows=None):
+    """The rows of a CSV file, as DataFrames of at most ``chunk_rows`` rows.
+
+    Chunks keep the file's row numbers as their index, so stats node ids
+    don't depend on the chunk size.
+    """
+    if chunk_rows is None:
+        return [pd.read_csv(file_path)]
+    return pd.read_csv(file_path, chunksize=chunk_rows)
+
+
+def selected(dataset, leagues=None, seasons=None):
+    _, league, season = dataset
+    return (not leagues or league in leagues) and (not seasons or season in seasons)
+
+
+def dataset_files(base_path, directory):
+    """(file name, kind, file type) of the known CSV files of one dataset."""
+    for file_name in sorted(os.listdir(os.path.join(base_path, directory))):
+        if not file_name.endswith(".csv"):
+            continue
+        if file_name not in FILE_TYPES:
+            print(f"Skipping {os.path.join(directory, file_name)}: unknown file")
+            continue
+        yield (file_name, *FILE_TYPES[file_name])
+
+
+def data_files(base_path, leagues=None, seasons=None):
+    """(source id, path, kind, file type, league, season) of every CSV file
+    of the datasets under ``base_path``."""
+    for dataset in discover_datasets(base_path):
+        if not selected(dataset, leagues, seasons):
+            continue
+        directory, league, season = dataset
+        for file_name, kind, file_type in dataset_files(base_path, directory):
+            yield (f"{league}/{season_key(season)}/{file_name}", os.path.join(base_path, directory, file_name),
+                   kind, file_type, league, season)
+
+
+def dataset_triples(base_path, directory, league, season, consolidate_stats=False, chunk_rows=CHUNK_ROWS):
+    """Build the triples of every CSV of one dataset (worker process entry point)."""
     graph = FootballGraph()
-    graph.load_all_data()
-    graph.link_to_wikidata()
-    graph.save_ontology()
+    triples = []
+    for file_name, kind, file_type in dataset_files(base_path, directory):
+        for chunk in graph.file_triples(os.path.join(base_path, directory, file_name), kind, file_type,
+                                        league, season, consolidate_stats, chunk_rows):
+            triples.extend(chunk)
+    return triples
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the football ontology from the CSV datasets")
+    parser.add_argument("--parallel", action="store_true", help="build each dataset's triples in a separate process (helps with several CPUs and large "
+                             "CSV files; the triples are still inserted by one process)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--consolidate-stats", action="store_true",
+                        help="one stats node per player, team, league and season instead of one per CSV row")
+    parser.add_argument("--league", action="append", dest="leagues", help="only load this league (repeatable)")
+    parser.add_argument("--season", action="append", dest="seasons", help="only load this season, e.g. 2023/24")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-ingest the CSV files that changed since the last incremental build")
+    parser.add_argument("--provenance", default="football_build.sqlite",
+                        help="file hashes and per-file triples of incremental builds")
+    parser.add_argument("--wikidata-cache", default="wikidata_cache.sqlite",
+                        help="SQLite cache of Wikidata resolutions, empty to disable")
+    parser.add_argument("--store", default="default", choices=["default", COMPACT_STORE],
+                        help="rdflib store to build the graph in")
+    parser.add_argument("--wikidata-dump", default=None,
+                        help="link against a local Wikidata JSON or N-Triples subset instead of the live services")
+    args = parser.parse_args()
+    if args.incremental and (args.parallel or args.workers or args.leagues or args.seasons):
+        parser.error("--incremental updates every dataset from its changed files, in this process; "
+                     "it can't be combined with --parallel, --workers, --league or --season")
+
+    graph = FootballGraph(args.store)
+    provenance = None
+    if args.incremental:
+        provenance = ProvenanceStore(args.provenance)
+        changed = graph.update_data(provenance, consolidate_stats=args.consolidate_stats)
+        print(f"Re-ingested {len(changed)} changed files")
+    else:
+        graph.load_all_data(parallel=args.parallel, max_workers=args.workers,
+                            consolidate_stats=args.consolidate_stats, leagues=args.leagues, seasons=args.seasons)
+
+    if args.wikidata_dump:
+        resolver = LocalWikidataResolver.from_file(args.wikidata_dump)
+    else:
+        # Only entities that are new or whose cached resolution expired hit Wikidata
+        resolver = HttpWikidataResolver()
+        if args.wikidata_cache:
+            resolver = CachedResolver(resolver, ResolutionCache(args.wikidata_cache))
+    graph.link_to_wikidata(resolver)
+    graph.save_ontology(provenance=provenance)
     print("Football ontology saved to football_ontology.ttl")
\ No newline at end of file
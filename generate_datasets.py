@@ -0,0 +1,102 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from dataset_manifest import season_key
+
+COUNTRIES = ["ENG", "ESP", "ITA", "GER", "FRA", "POR", "NED", "BEL", "BRA", "ARG", "URU", "NOR", "CRO", "SEN"]
+
+# Columns of each CSV file after Rank/Player/Team (or Rank/Team), with the
+# scale of their values and whether they are counts
+PLAYER_COLUMNS = {
+    "player_total_scoring_attempts.csv": [("Shots per 90", 2.0, False), ("Shot Conversion Rate (%)", 12.0, False)],
+    "player_top_scorers.csv": [("Goals", 6.0, True), ("Penalties", 1.0, True)],
+    "player_total_assists_in_attack.csv": [("Chances Created", 25.0, True), ("Chances Created per 90", 1.2, False)],
+    "player_top_assists.csv": [("Assists", 3.0, True), ("Secondary Assists", 2.0, False)],
+}
+
+TEAM_COLUMNS = {
+    "big_chance_team.csv": [("Big Chances", 80.0, True), ("Goals", 55.0, True)],
+    "team_goals_per_match.csv": [("Goals per Match", 1.4, False), ("Total Goals Scored", 55.0, True)],
+    "saves_team.csv": [("Saves per Match", 3.0, False), ("Total Saves", 110.0, True)],
+    "accurate_pass_team.csv": [("Accurate Passes per Match", 420.0, False), ("Pass Success (%)", 82.0, False)],
+}
+
+
+def stat_column(rng, size, scale, count, missing_rate):
+    values = rng.gamma(2.0, scale / 2.0, size)
+    values = np.floor(values) if count else np.round(values, 1)
+    values[rng.random(size) < missing_rate] = np.nan
+    return values
+
+
+def ranked(df, column, rows):
+    """The ``rows`` best rows by ``column``, ranked like the real files."""
+    df = df.sort_values(column, ascending=False, na_position="last").head(rows)
+    df.insert(0, "Rank", range(1, len(df) + 1))
+    return df
+
+
+def generate_dataset(directory, rng, league, country, teams, players_per_team, coverage, missing_rate):
+    """Write the 8 CSV files of one league and season."""
+    os.makedirs(directory, exist_ok=True)
+    team_names = [f"{league} Club {team:02d}" for team in range(1, teams + 1)]
+    matches = 2 * (teams - 1)
+
+    players = pd.DataFrame({
+        "Player": [f"{league} Player {number:05d}" for number in range(teams * players_per_team)],
+        "Team": np.repeat(team_names, players_per_team),
+        "Country": rng.choice(COUNTRIES, teams * players_per_team),
+    })
+    players["Matches"] = rng.integers(1, matches + 1, len(players))
+    players["Minutes"] = players["Matches"] * rng.integers(20, 91, len(players))
+
+    rows = max(1, int(len(players) * coverage))
+    for file_name, columns in PLAYER_COLUMNS.items():
+        df = players[["Player", "Team"]].copy()
+        for column, scale, count in columns:
+            df[column] = stat_column(rng, len(df), scale, count, missing_rate)
+        df[["Minutes", "Matches", "Country"]] = players[["Minutes", "Matches", "Country"]]
+        ranked(df, columns[0][0], rows).to_csv(os.path.join(directory, file_name), index=False)
+
+    for file_name, columns in TEAM_COLUMNS.items():
+        df = pd.DataFrame({"Team": team_names})
+        for column, scale, count in columns:
+            df[column] = stat_column(rng, teams, scale, count, missing_rate)
+        df["Matches"] = matches
+        df["Country"] = country
+        ranked(df, columns[0][0], teams).to_csv(os.path.join(directory, file_name), index=False)
+
+
+def generate(base_path, leagues=3, seasons=1, teams=20, players_per_team=25, coverage=0.6,
+             missing_rate=0.05, first_season=2023, seed=0):
+    """Write synthetic datasets with the schemas of datasets/* under
+    ``base_path``, as <League>/<Season> directories. Returns their number."""
+    rng = np.random.default_rng(seed)
+    for league_number in range(1, leagues + 1):
+        league = f"League{league_number:02d}"
+        for start in range(first_season - seasons + 1, first_season + 1):
+            season = season_key(f"{start}/{(start + 1) % 100:02d}")
+            generate_dataset(os.path.join(base_path, league, season), rng, league,
+                             COUNTRIES[(league_number - 1) % len(COUNTRIES)], teams, players_per_team,
+                             coverage, missing_rate)
+    return leagues * seasons
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic football CSV datasets")
+    parser.add_argument("destination", help="directory to write the <League>/<Season> datasets to")
+    parser.add_argument("--leagues", type=int, default=3)
+    parser.add_argument("--seasons", type=int, default=1)
+    parser.add_argument("--teams", type=int, default=20, help="teams per league")
+    parser.add_argument("--players", type=int, default=25, help="players per team")
+    parser.add_argument("--coverage", type=float, default=0.6, help="share of the players listed in each player file")
+    parser.add_argument("--missing-rate", type=float, default=0.05, help="share of stat values left empty")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    count = generate(args.destination, args.leagues, args.seasons, args.teams, args.players, args.coverage,
+                     args.missing_rate, seed=args.seed)
+    print(f"Generated {count} datasets in {args.destination}")
@@ -0,0 +1,343 @@
+from bisect import bisect_left, bisect_right
+import hashlib
+import json
+import mmap
+import os
+import pathlib
+import struct
+
+import numpy as np
+from rdflib import Graph, Literal, URIRef, BNode, plugin
+from rdflib.graph import ModificationException
+from rdflib.store import VALID_STORE, Store
+
+from compact_store import CompactStore
+
+# Snapshot layout: MAGIC, a little-endian uint64 header length, the JSON header,
+# then 8-byte aligned sections. The header holds the source file hash, the
+# namespace bindings and the (offset, length) of every section, with offsets
+# counted from the first section:
+#   terms: JSON list of dictionary-encoded terms, the id of a term is its index
+#   spo:   int32 (n, 3) triples of term ids, sorted by subject, predicate, object
+#   pos:   int32 permutation of spo sorted by predicate, object, subject
+#   osp:   int32 permutation of spo sorted by object, subject, predicate
+MAGIC = b"FBSNAP01"
+ALIGNMENT = 8
+
+# Name of the read-only store over a mapped snapshot, e.g.
+# Graph(store=SNAPSHOT_STORE).open("football_ontology.snapshot")
+SNAPSHOT_STORE = "Snapshot"
+
+# Columns of the spo array in each index order
+ORDERS = {"spo": (0, 1, 2), "pos": (1, 2, 0), "osp": (2, 0, 1)}
+
+# Rows decoded at a time when scanning the whole snapshot
+SCAN_ROWS = 1 << 16
+
+
+def snapshot_path(source):
+    return os.path.splitext(source)[0] + ".snapshot"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def encode_term(term):
+    if isinstance(term, URIRef):
+        return ["u", str(term)]
+    if isinstance(term, BNode):
+        return ["b", str(term)]
+    return ["l", str(term), term.datatype and str(term.datatype), term.language]
+
+
+def decode_term(entry):
+    if entry[0] == "u":
+        return URIRef(entry[1])
+    if entry[0] == "b":
+        return BNode(entry[1])
+    return Literal(entry[1], lang=entry[3], datatype=entry[2])
+
+
+def write_snapshot(graph, destination, source=None, source_sha256=None):
+    """Write a dictionary-encoded binary snapshot of ``graph``.
+
+    ``source`` is the serialized ontology the snapshot stands for; its hash
+    (``source_sha256`` when the caller already has it) is recorded so
+    readers can tell when the snapshot is stale.
+    """
+    ids = {}
+    rows = []
+    for triple in graph:
+        rows.append([ids.setdefault(term, len(ids)) for term in triple])
+    spo = np.array(rows, dtype=np.int32).reshape(-1, 3)
+    spo = spo[np.lexsort((spo[:, 2], spo[:, 1], spo[:, 0]))]
+    pos = np.lexsort((spo[:, 0], spo[:, 2], spo[:, 1])).astype(np.int32)
+    osp = np.lexsort((spo[:, 1], spo[:, 0], spo[:, 2])).astype(np.int32)
+
+    sections = [
+        ("terms", json.dumps([encode_term(term) for term in ids], separators=(",", ":")).encode("utf-8")),
+        ("spo", spo.astype("<i4").tobytes()),
+        ("pos", pos.astype("<i4").tobytes()),
+        ("osp", osp.astype("<i4").tobytes()),
+    ]
+    offsets = {}
+    offset = 0
+    for name, data in sections:
+        offsets[name] = [offset, len(data)]
+        offset = _aligned(offset + len(data))
+    header = json.dumps({
+        "source_sha256": source_sha256 or (file_sha256(source) if source else None),
+        "triples": len(spo),
+        "terms": len(ids),
+        "namespaces": {prefix: str(namespace) for prefix, namespace in graph.namespaces()},
+        "sections": offsets,
+    }).encode("utf-8")
+
+    # Write to a temporary file first so readers never map a partial snapshot
+    tmp_path = destination + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<Q", len(header)))
+        file.write(header)
+        data_start = _aligned(file.tell())
+        for name, data in sections:
+            file.seek(data_start + offsets[name][0])
+            file.write(data)
+    os.replace(tmp_path, destination)
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class Snapshot:
+    """A memory-mapped snapshot; the id arrays are views on the file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a graph snapshot")
+        (header_length,) = struct.unpack_from("<Q", self.buffer, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.header = json.loads(self.buffer[start:start + header_length])
+        self.data_start = _aligned(start + header_length)
+        self.spo = self._array("spo").reshape(-1, 3)
+        self.pos = self._array("pos")
+        self.osp = self._array("osp")
+
+    def _array(self, name):
+        offset, length = self.header["sections"][name]
+        return np.frombuffer(self.buffer, dtype="<i4", count=length // 4, offset=self.data_start + offset)
+
+    def terms(self):
+        offset, length = self.header["sections"]["terms"]
+        start = self.data_start + offset
+        return [decode_term(entry) for entry in json.loads(self.buffer[start:start + length])]
+
+    def is_fresh(self, source, sha256=None):
+        """Whether the snapshot was written for ``source``, or for the
+        version of it with hash ``sha256``."""
+        return self.header["source_sha256"] == (sha256 or file_sha256(source))
+
+    def to_graph(self, graph=None):
+        graph = Graph() if graph is None else graph
+        for prefix, namespace in self.header["namespaces"].items():
+            graph.bind(prefix, namespace, override=True)
+        terms = self.terms()
+        if isinstance(graph.store, CompactStore):
+            # Same dictionary encoding: the id arrays are added in bulk
+            graph.store.add_encoded(terms, self.spo)
+            return graph
+        # The terms are already valid nodes, so skip Graph.addN's per-triple checks
+        add = graph.store.add
+        for s, p, o in self.spo.tolist():
+            add((terms[s], terms[p], terms[o]), graph, quoted=False)
+        return graph
+
+
+class SnapshotStore(Store):
+    """Read-only rdflib store over a memory-mapped snapshot.
+
+    The triples are never copied out of the mapped file: lookups binary search
+    its sorted spo array and its pos and osp permutations. Processes that map
+    the same snapshot share one copy of the triples in the page cache, and
+    only decode the terms themselves.
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, configuration=None, identifier=None):
+        self.identifier = identifier
+        self.snapshot = None
+        self._terms = []
+        self._ids = {}
+        self._namespace = {}
+        self._prefix = {}
+        super().__init__(configuration)
+
+    def open(self, configuration, create=False):
+        """Map ``configuration``, a snapshot path or an open ``Snapshot``."""
+        self.snapshot = configuration if isinstance(configuration, Snapshot) else Snapshot(configuration)
+        self._terms = self.snapshot.terms()
+        self._ids = {term: term_id for term_id, term in enumerate(self._terms)}
+        for prefix, namespace in self.snapshot.header["namespaces"].items():
+            self.bind(prefix, URIRef(namespace))
+        return VALID_STORE
+
+    def add(self, triple, context=None, quoted=False):
+        raise ModificationException()
+
+    def remove(self, triple_pattern, context=None):
+        raise ModificationException()
+
+    def _range(self, order, prefix):
+        """Rows of the spo array whose terms in ``order`` start with ``prefix``."""
+        spo = self.snapshot.spo
+        permutation = None if order == "spo" else getattr(self.snapshot, order)
+        columns = ORDERS[order][:len(prefix)]
+        # Memoryviews index to Python ints much faster than NumPy arrays
+        flat = memoryview(spo.reshape(-1).astype(np.int32, copy=False))
+        rows = range(len(spo)) if permutation is None else memoryview(permutation.astype(np.int32, copy=False))
+
+        def key(row):
+            return [flat[3 * row + column] for column in columns]
+
+        start, end = bisect_left(rows, prefix, key=key), bisect_right(rows, prefix, key=key)
+        return spo[start:end] if permutation is None else spo[permutation[start:end]]
+
+    def triples(self, triple_pattern, context=None):
+        """A generator over all the triples matching the pattern."""
+        if self.snapshot is None:
+            return
+        ids = []
+        for term in triple_pattern:
+            if term is None:
+                ids.append(None)
+            else:
+                term_id = self._ids.get(term)
+                if term_id is None:
+                    return
+                ids.append(term_id)
+        s, p, o = ids
+        if s is not None:
+            if p is not None:
+                batches = [self._range("spo", [s, p] if o is None else [s, p, o])]
+            elif o is not None:
+                batches = [self._range("osp", [o, s])]
+            else:
+                batches = [self._range("spo", [s])]
+        elif p is not None:
+            batches = [self._range("pos", [p] if o is None else [p, o])]
+        elif o is not None:
+            batches = [self._range("osp", [o])]
+        else:
+            spo = self.snapshot.spo
+            batches = (spo[start:start + SCAN_ROWS] for start in range(0, len(spo), SCAN_ROWS))
+
+        terms = self._terms
+        for batch in batches:
+            for s, p, o in batch.tolist():
+                yield (terms[s], terms[p], terms[o]), iter(())
+
+    def __len__(self, context=None):
+        return 0 if self.snapshot is None else len(self.snapshot.spo)
+
+    def bind(self, prefix, namespace, override=True):
+        if not override and (prefix in self._namespace or namespace in self._prefix):
+            return
+        if prefix in self._namespace:
+            del self._prefix[self._namespace.pop(prefix)]
+        if namespace in self._prefix:
+            del self._namespace[self._prefix.pop(namespace)]
+        self._namespace[prefix] = namespace
+        self._prefix[namespace] = prefix
+
+    def namespace(self, prefix):
+        return self._namespace.get(prefix)
+
+    def prefix(self, namespace):
+        return self._prefix.get(namespace)
+
+    def namespaces(self):
+        yield from self._namespace.items()
+
+
+plugin.register(SNAPSHOT_STORE, Store, "graph_snapshot", "SnapshotStore")
+
+
+def fresh_snapshot(source, snapshot=None, sha256=None):
+    """The snapshot of ``source``, or None when it is missing, unreadable or
+    was written for another version of ``source`` (than the one with hash
+    ``sha256``, if given)."""
+    snapshot = snapshot or snapshot_path(source)
+    if not os.path.exists(snapshot):
+        return None
+    try:
+        loaded = Snapshot(snapshot)
+        if loaded.is_fresh(source, sha256):
+            return loaded
+        print(f"Snapshot {snapshot} is stale")
+    except (ValueError, KeyError, OSError, struct.error) as e:
+        print(f"Couldn't read snapshot {snapshot}: {e}")
+    return None
+
+
+def mapped_snapshot(source, snapshot=None, data=None):
+    """The snapshot of ``source``, written first when it is missing or stale.
+    ``data`` is the content of ``source`` when the caller already read it."""
+    sha256 = data and hashlib.sha256(data).hexdigest()
+    loaded = fresh_snapshot(source, snapshot, sha256)
+    if loaded is None:
+        graph = parse_turtle(Graph(), source, data)
+        write_snapshot(graph, snapshot or snapshot_path(source), source=source, source_sha256=sha256)
+        loaded = Snapshot(snapshot or snapshot_path(source))
+    return loaded
+
+
+def parse_turtle(graph, source, data=None):
+    if data is None:
+        graph.parse(source, format="turtle")
+    else:
+        # Same base IRI as parsing the file itself
+        graph.parse(data=data, format="turtle", publicID=pathlib.Path(source).absolute().as_uri())
+    return graph
+
+
+def load_graph(source, snapshot=None, store="default", data=None):
+    """Load ``source`` from its binary snapshot, or parse the Turtle file when
+    the snapshot is missing, unreadable or was written for another version.
+    ``store`` is the rdflib store plugin to hold the graph, such as
+    ``"Compact"`` (compact_store.py). The ``"Snapshot"`` store maps the
+    snapshot instead of loading it, and writes it first if needed.
+
+    Given the ``data`` of ``source``, already read by the caller, the graph
+    is that version of it: the snapshot is only used if it was written for
+    those bytes, and they are parsed instead of the file otherwise."""
+    if store == SNAPSHOT_STORE:
+        return Graph(store=SnapshotStore(mapped_snapshot(source, snapshot, data)))
+    loaded = fresh_snapshot(source, snapshot, data and hashlib.sha256(data).hexdigest())
+    if loaded is not None:
+        return loaded.to_graph(Graph(store=store))
+    return parse_turtle(Graph(store=store), source, data)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write the binary snapshot of a Turtle ontology")
+    parser.add_argument("source", nargs="?", default="football_ontology.ttl")
+    args = parser.parse_args()
+
+    graph = Graph()
+    graph.parse(args.source, format="turtle")
+    write_snapshot(graph, snapshot_path(args.source), source=args.source)
+    print(f"Snapshot saved to {snapshot_path(args.source)}")
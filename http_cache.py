@@ -0,0 +1,141 @@
+from email.utils import formatdate, parsedate_to_datetime
+import hashlib
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    # Listed in requirements.txt; an install without it only offers gzip
+    brotli = None
+
+# Content encodings offered, preferred first when the client accepts both
+ENCODINGS = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def etag(graph_version, normalized_query, *variant):
+    """Weak ETag of a query's response: the same for the same graph version,
+    normalized query and ``variant`` (format, page, ...), whatever the
+    encoding it is sent in."""
+    key = "\n".join([*map(str, variant), normalized_query])
+    return f'W/"{graph_version[:16]}-{hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]}"'
+
+
+def http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
+
+
+def not_modified(headers, tag, modified):
+    """Whether a request with ``headers`` already has the response with ETag
+    ``tag``, last modified at the ``modified`` timestamp. If-None-Match takes
+    precedence over If-Modified-Since, as in RFC 9110."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [candidate.strip() for candidate in if_none_match.split(",")]
+        return "*" in tags or tag.removeprefix("W/") in (candidate.removeprefix("W/") for candidate in tags)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return int(modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def negotiate(accept_encoding):
+    """The best of ``ENCODINGS`` for an Accept-Encoding header, or None."""
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, parameters = item.strip().partition(";")
+        weight = 1.0
+        if parameters.strip().startswith("q="):
+            try:
+                weight = float(parameters.strip()[2:])
+            except ValueError:
+                continue
+        weights[coding.strip().lower()] = weight
+    best = None
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > 0 and (best is None or weight > best[1]):
+            best = encoding, weight
+    return best and best[0]
+
+
+class Compressor:
+    """Incremental gzip or Brotli compression of a response body."""
+
+    def __init__(self, encoding, gzip_level=6, brotli_quality=4):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        """Compressed ``data``, flushed so the client can decode it already."""
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b""):
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing response bodies of ``minimum_size`` bytes
+    or more with the encoding the client prefers (``negotiate``). Streamed
+    responses are compressed as they are sent, each chunk flushed."""
+
+    def __init__(self, app, minimum_size=1024, gzip_level=6, brotli_quality=4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        start = None
+        compressor = None
+
+        async def compressed_send(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                start = message
+                if "content-encoding" not in Headers(raw=start["headers"]):
+                    MutableHeaders(scope=start).add_vary_header("Accept-Encoding")
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            body, more = message.get("body", b""), message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(scope=start)
+                if (encoding is None or "content-encoding" in headers or start["status"] in (204, 304)
+                        or (not more and len(body) < self.minimum_size)):
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+                compressor = Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers["Content-Encoding"] = encoding
+                if more:
+                    del headers["Content-Length"]
+                else:
+                    body = compressor.finish(body)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start)
+            body = compressor.chunk(body) if more else compressor.finish(body)
+            await send({"type": "http.response.body", "body": body, "more_body": more})
+
+        await self.app(scope, receive, compressed_send)
@@ -1,19 +1,460 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+import hashlib
+import hmac
+import os
+import signal
+import time
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from rdflib import Graph
-from rdflib.plugins.sparql import prepareQuery
+from football_graph import FOOTBALL, STATS_PROPERTIES
+from graph_snapshot import file_sha256, load_graph
+from http_cache import CompressionMiddleware, etag, http_date, not_modified
+from query_cache import PreparedQueryCache, QueryResultCache, normalize_query, result_size
+from query_executor import QueryExecutor, QueryQueueFull, guarded, result_rows
+from query_guard import QueryLimits, QueryTimeout, QueryTooExpensive, TooManyRows
+from query_metrics import QueryMetrics, profile_path, timed_evaluation
+import query_optimizer
+from sparql_results import (
+    decode_cursor, encode_cursor, evaluate, ndjson_stream, page, sparql_json_stream,
+)
+from stats_store import PLAYER, TEAM, StatsStore, parse_filter
+from views import MaterializedViews
+
+ONTOLOGY = "football_ontology.ttl"
+
+# Response formats: "json" is the original {"results": [...]} body, the
+# others are streamed one solution at a time
+STREAM_MEDIA_TYPES = {
+    "sparql-json": "application/sparql-results+json",
+    "ndjson": "application/x-ndjson",
+}
+
+STATS_KINDS = {"players": PLAYER, "teams": TEAM}
+
+# Reorder the triple patterns of queries by their estimated selectivity and
+# evaluate ORDER BY ... LIMIT as top-k (query_optimizer.py)
+REORDER_PATTERNS = os.environ.get("SPARQL_REORDER_PATTERNS", "1") != "0"
+
+# rdflib store holding the served graph: "default" (rdflib's Memory store),
+# "Compact", the dictionary-encoded store of compact_store.py, or "Snapshot",
+# which maps the binary snapshot read-only (graph_snapshot.py)
+GRAPH_STORE = os.environ.get("SPARQL_STORE", "default")
+
+# Limits of each query (query_guard.py): wall-clock seconds from its arrival
+# until its evaluation is stopped, rows of a result held in memory (streamed
+# results aren't) and estimated cost, rejected before evaluating. 0 disables
+# a limit.
+QUERY_TIMEOUT = float(os.environ.get("SPARQL_QUERY_TIMEOUT", 30))
+MAX_ROWS = int(os.environ.get("SPARQL_MAX_ROWS", 100_000))
+MAX_QUERY_COST = float(os.environ.get("SPARQL_MAX_QUERY_COST", 1e7))
+
+# Cache-Control of GET /sparql responses. They carry an ETag (graph version
+# and query hash) and Last-Modified (ontology file time), so by default
+# clients and caches revalidate, and get a 304 until the graph changes; e.g.
+# "public, max-age=300" lets them reuse responses for 5 minutes.
+CACHE_CONTROL = os.environ.get("SPARQL_CACHE_CONTROL", "public, no-cache")
+
+# Responses of this many bytes or more are compressed (Brotli or gzip) for
+# clients that accept it
+COMPRESS_MIN_BYTES = int(os.environ.get("SPARQL_COMPRESS_MIN_BYTES", 1024))
+
+# Most queries accepted by one POST /sparql/batch request
+MAX_BATCH_QUERIES = int(os.environ.get("SPARQL_MAX_BATCH_QUERIES", 64))
+
+# Bearer token POST /reload requires; when unset, only requests from this
+# host may reload
+RELOAD_TOKEN = os.environ.get("SPARQL_RELOAD_TOKEN")
+
+# Process id of the serve.py supervisor when the graph is shared by several
+# worker processes; reloading it is then up to the supervisor
+SUPERVISOR = os.environ.get("SPARQL_SUPERVISOR")
+
+# Compiled queries, keyed on the normalized query text
+prepared_queries = PreparedQueryCache(maxsize=int(os.environ.get("SPARQL_QUERY_CACHE_SIZE", 256)))
+
+# Query results, keyed on (normalized query, graph version)
+query_results = QueryResultCache(
+    max_entries=int(os.environ.get("SPARQL_RESULT_CACHE_ENTRIES", 1024)),
+    max_bytes=int(os.environ.get("SPARQL_RESULT_CACHE_BYTES", 64 * 1024 * 1024)),
+)
+
+# Query evaluation runs on a thread or process pool, off the event loop
+query_executor = QueryExecutor(
+    ONTOLOGY,
+    mode=os.environ.get("SPARQL_EXECUTOR", "thread"),
+    max_concurrency=int(os.environ.get("SPARQL_MAX_CONCURRENCY", os.cpu_count() or 4)),
+    max_pending=int(os.environ.get("SPARQL_MAX_PENDING", 64)),
+    optimize=REORDER_PATTERNS,
+    store=GRAPH_STORE,
+)
 
-app = FastAPI()
+# Latency histograms per query fingerprint; requests slower than the
+# threshold go to the slow query log (JSON lines, printed when no file is set)
+query_metrics = QueryMetrics(
+    slow_threshold=float(os.environ.get("SPARQL_SLOW_QUERY_SECONDS", 1.0)),
+    slow_log=os.environ.get("SPARQL_SLOW_QUERY_LOG"),
+)
 
-graph = Graph()
-graph.parse("football_ontology.ttl", format="turtle")
+# Directory for the cProfile dumps of /sparql?profile=true; profiling is
+# disabled when unset
+PROFILE_DIR = os.environ.get("SPARQL_PROFILE_DIR")
+
+def read_ontology():
+    """Everything served from the ontology, built from one read of the file:
+    (graph, graph version, modification time, stats store, views, file
+    content). The graph version is the hash of the content that was loaded,
+    even if the file changes meanwhile. Touches no served state, so it can
+    run on a thread while requests are served."""
+    with open(ONTOLOGY, "rb") as file:
+        data = file.read()
+        modified = os.fstat(file.fileno()).st_mtime
+    # Loads the binary snapshot written by save_ontology, or parses the Turtle
+    # data when the snapshot is missing or was written for other content
+    new_graph = load_graph(ONTOLOGY, store=GRAPH_STORE, data=data)
+    if REORDER_PATTERNS:
+        query_optimizer.optimize(new_graph)
+    # Columnar copy of the numeric stats for the /stats endpoints
+    new_stats = StatsStore.from_graph(new_graph, FOOTBALL, STATS_PROPERTIES)
+    # The query.py leaderboards, served without evaluating SPARQL
+    new_views = MaterializedViews(new_stats)
+    new_views.refresh()
+    return new_graph, hashlib.sha256(data).hexdigest(), modified, new_stats, new_views, data
+
+def install_ontology(loaded):
+    """Serve what ``read_ontology`` returned. The globals are swapped in one
+    statement, on the event loop, so no request sees a mix of two versions."""
+    global graph, graph_version, graph_modified, stats, views
+    graph, graph_version, graph_modified, stats, views, data = loaded
+    query_results.clear()
+    query_executor.reload(data)
+
+def load_ontology():
+    """(Re)load the served graph; the graph version is the ontology file hash."""
+    install_ontology(read_ontology())
+
+load_ontology()
+
+# One reload at a time
+reload_lock = asyncio.Lock()
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    query_executor.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+
+class BatchQuery(BaseModel):
+    name: str
+    query: str
+
+class BatchRequest(BaseModel):
+    queries: List[BatchQuery]
+
+def query_limits():
+    """Limits of a query arriving now."""
+    return QueryLimits.starting_now(QUERY_TIMEOUT, MAX_ROWS or None, MAX_QUERY_COST or None)
+
+def query_error(e):
+    """HTTP status and detail of a failed query."""
+    if isinstance(e, QueryQueueFull):
+        return 503, f"Too many queries in progress: {e}"
+    if isinstance(e, QueryTimeout):
+        return 504, f"{e} after {QUERY_TIMEOUT:g} s"
+    if isinstance(e, (QueryTooExpensive, TooManyRows)):
+        return 422, str(e)
+    return 400, str(e)
+
+async def query_page(query, normalized, format, cursor, page_size, start, profile, limits):
+    """One page of results, with a cursor for the next page if there is one.
+
+    The whole result (at most the row limit) is evaluated once per graph
+    version and kept in the result cache, so reading all the pages costs one
+    evaluation, not one per page; a page is only evaluated again if its
+    result was evicted meanwhile."""
+    current_graph, version = graph, graph_version
+    offset = decode_cursor(cursor, normalized, version) if cursor else 0
+    key = (normalized, version, "pages")
+    # A profiled request always evaluates the query
+    result = None if profile else query_results.get(key)
+    if result is None:
+        def evaluate_all(prepared):
+            query_type, variables, rows = evaluate(current_graph, prepared)
+            return query_type, variables, result_rows(rows, limits)
+
+        result, timing = await query_executor.run(
+            timed_evaluation, prepared_queries, query, guarded(current_graph, limits, evaluate_all), profile)
+        query_results.put(key, result, size=result_size(result[2]))
+        query_metrics.record(normalized, time.perf_counter() - start, rows=len(result[2]), result_cached=False,
+                             profile=profile, **timing)
+    else:
+        query_metrics.record(normalized, time.perf_counter() - start, rows=len(result[2]), result_cached=True)
+    query_type, variables, rows = result
+    rows, has_more = page(rows, offset, page_size)
+    next_cursor = encode_cursor(normalized, version, offset + len(rows)) if has_more else None
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if format == "sparql-json":
+        body = sparql_json_stream(query_type, variables, iter(rows), next_cursor)
+    elif format == "ndjson":
+        body = ndjson_stream(query_type, variables, iter(rows))
+    else:
+        return JSONResponse(jsonable_encoder({"results": rows, "next_cursor": next_cursor}), headers=headers)
+    return StreamingResponse(body, media_type=STREAM_MEDIA_TYPES[format], headers=headers)
+
+async def stream_query(query, normalized, format, start, limits):
+    """Stream all results; rows are encoded as they are evaluated and never
+    held in memory together. The deadline also covers sending them."""
+    current_graph = graph
+    await query_executor.acquire()
+    try:
+        # Compile before the response starts, so syntax errors are still a 400
+        prepare_start = time.perf_counter()
+        prepared, prepared_cached = await query_executor.call(prepared_queries.lookup, query)
+        prepare = time.perf_counter() - prepare_start
+        limits.check_cost(prepared.algebra, query_optimizer.statistics(current_graph))
+    except BaseException:
+        query_executor.release()
+        raise
+
+    def chunks():
+        # Evaluation and encoding interleave, so the evaluation time of a
+        # streamed query includes encoding (and waiting on the client)
+        evaluate_start, count, error = time.perf_counter(), 0, None
+
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        try:
+            query_type, variables, rows = evaluate(current_graph, prepared)
+            if format == "sparql-json":
+                yield from sparql_json_stream(query_type, variables, counted(rows))
+            else:
+                yield from ndjson_stream(query_type, variables, counted(rows))
+        except Exception as e:
+            # The response has started, so the client only sees it cut short
+            error = str(e)
+            raise
+        finally:
+            end = time.perf_counter()
+            query_metrics.record(normalized, end - start, prepare, end - evaluate_start, count,
+                                 prepared_cached=prepared_cached, error=error)
+
+    return StreamingResponse(query_executor.stream(chunks(), deadline=limits.deadline),
+                             media_type=STREAM_MEDIA_TYPES[format])
+
+async def cached_query(query, normalized, current_graph, version, start, profile=None, limits=None):
+    """Rows of ``query`` from the result cache, or evaluated on the query pool
+    and cached, and record the request's metrics."""
+    key = (normalized, version)
+    # A profiled request always evaluates the query
+    results = None if profile else query_results.get(key)
+    if results is None:
+        results, timing = await query_executor.query(current_graph, prepared_queries, query, profile, limits)
+        query_results.put(key, results)
+        query_metrics.record(normalized, time.perf_counter() - start, rows=len(results), result_cached=False,
+                             profile=profile, **timing)
+    else:
+        query_metrics.record(normalized, time.perf_counter() - start, rows=len(results), result_cached=True)
+    return results
 
 @app.get("/sparql")
-async def sparql_endpoint(query: str):
+async def sparql_endpoint(request: Request, response: Response, query: str, format: str = "json",
+                          page_size: Optional[int] = None, cursor: Optional[str] = None, profile: bool = False):
+    if format != "json" and format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown format {format!r}")
+    if page_size is not None and page_size <= 0:
+        raise HTTPException(status_code=400, detail="page_size must be positive")
+    paged = page_size is not None or cursor is not None
+    if profile and not PROFILE_DIR:
+        raise HTTPException(status_code=400, detail="Profiling is disabled, set SPARQL_PROFILE_DIR to enable it")
+    if profile and format in STREAM_MEDIA_TYPES and not paged:
+        raise HTTPException(status_code=400, detail="Streamed queries can't be profiled, use format=json")
+    if MAX_ROWS and page_size is not None and page_size > MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"page_size can be at most {MAX_ROWS}")
+    start = time.perf_counter()
+    limits = query_limits()
+    normalized = normalize_query(query)
+    dump = profile_path(PROFILE_DIR, normalized) if profile else None
+    current_graph, version, modified = graph, graph_version, graph_modified
+    if profile:
+        headers = {"Cache-Control": "no-store"}
+    else:
+        # Answered before evaluating or even looking up the results
+        headers = {
+            "ETag": etag(version, normalized, format, page_size, cursor),
+            "Last-Modified": http_date(modified),
+            "Cache-Control": CACHE_CONTROL,
+        }
+        if not_modified(request.headers, headers["ETag"], modified):
+            return Response(status_code=304, headers=headers)
     try:
-        print(query)
-        results = graph.query(prepareQuery(query))
-        
-        return {"results": list(results)}
+        if paged:
+            result = await query_page(query, normalized, format, cursor, page_size or min(1000, MAX_ROWS or 1000),
+                                      start, dump, limits)
+        elif format in STREAM_MEDIA_TYPES:
+            result = await stream_query(query, normalized, format, start, limits)
+        else:
+            result = {"results": await cached_query(query, normalized, current_graph, version, start, dump, limits)}
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        query_metrics.record(normalized, time.perf_counter() - start, error=str(e))
+        status, detail = query_error(e)
+        raise HTTPException(status_code=status, detail=detail)
+    (result if isinstance(result, Response) else response).headers.update(headers)
+    return result
+
+@app.post("/sparql/batch")
+async def sparql_batch(batch: BatchRequest):
+    """Results of many named queries in one response. Identical queries (after
+    normalization) are evaluated once, and the distinct ones run in parallel
+    on the query pool, all against the same graph version."""
+    if len(batch.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    names = [item.name for item in batch.queries]
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=400, detail="Query names must be unique")
+    start = time.perf_counter()
+    limits = query_limits()
+    current_graph, version = graph, graph_version
+    normalized = [normalize_query(item.query) for item in batch.queries]
+    distinct = dict(zip(normalized, (item.query for item in batch.queries)))
+
+    async def outcome(text, normalized):
+        # A failed query doesn't fail the others
+        try:
+            return {"results": await cached_query(text, normalized, current_graph, version, start, limits=limits)}
+        except Exception as e:
+            query_metrics.record(normalized, time.perf_counter() - start, error=str(e))
+            status, detail = query_error(e)
+            return {"error": detail, "status": status}
+
+    outcomes = await asyncio.gather(*(outcome(text, key) for key, text in distinct.items()))
+    outcomes = dict(zip(distinct, outcomes))
+    return {
+        "graph_version": version,
+        "evaluated": len(distinct),
+        "queries": {name: outcomes[key] for name, key in zip(names, normalized)},
+    }
+
+@app.get("/sparql/cache")
+async def sparql_cache_stats():
+    return {
+        "graph_version": graph_version,
+        "prepared_queries": prepared_queries.stats(),
+        "results": query_results.stats(),
+    }
+
+@app.get("/sparql/executor")
+async def sparql_executor_stats():
+    return query_executor.stats()
+
+@app.get("/sparql/metrics")
+async def sparql_metrics(top: Optional[int] = 50, order_by: str = "total"):
+    try:
+        metrics = query_metrics.stats(top, order_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    metrics["caches"] = {"prepared_queries": prepared_queries.stats(), "results": query_results.stats()}
+    statistics = query_optimizer.statistics(graph)
+    metrics["optimizer"] = statistics.stats() if statistics else None
+    return metrics
+
+@app.get("/sparql/metrics/slow")
+async def sparql_slow_queries():
+    return {"slow_query_seconds": query_metrics.slow_threshold, "queries": query_metrics.slow_queries()}
+
+@app.post("/sparql/metrics/reset")
+async def reset_sparql_metrics():
+    query_metrics.reset()
+    return {"since": query_metrics.started_at}
+
+def stats_request(kind, where):
+    """Stats table of ``kind`` and the parsed ``where`` filters, or a 4xx."""
+    if kind not in STATS_KINDS:
+        raise HTTPException(status_code=404, detail=f"Unknown kind {kind!r}, expected players or teams")
+    try:
+        return stats.table(STATS_KINDS[kind]), [parse_filter(expression) for expression in where]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/stats")
+async def stats_columns():
+    return stats.stats()
+
+@app.get("/stats/{kind}/aggregate")
+async def stats_aggregate(kind: str, metric: str, function: str = "avg", by: str = "league",
+                          where: List[str] = Query([]), league: Optional[str] = None,
+                          team: Optional[str] = None, season: Optional[str] = None):
+    table, filters = stats_request(kind, where)
+    try:
+        return {"results": table.aggregate(metric, function, by, filters, league=league, team=team, season=season)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/stats/{kind}/top")
+async def stats_top(kind: str, metric: str, k: int = 10, per: Optional[str] = None, ascending: bool = False,
+                    columns: List[str] = Query([]), where: List[str] = Query([]), league: Optional[str] = None,
+                    team: Optional[str] = None, season: Optional[str] = None):
+    table, filters = stats_request(kind, where)
+    try:
+        return {"results": table.top(metric, k, per, ascending, columns, filters,
+                                     league=league, team=team, season=season)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/stats/{kind}/scan")
+async def stats_scan(kind: str, columns: List[str] = Query([]), where: List[str] = Query([]),
+                     order_by: Optional[str] = None, ascending: bool = True, limit: Optional[int] = 100,
+                     league: Optional[str] = None, team: Optional[str] = None, season: Optional[str] = None):
+    table, filters = stats_request(kind, where)
+    try:
+        return {"results": table.scan(columns, filters, order_by, ascending, limit,
+                                      league=league, team=team, season=season)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/views")
+async def list_views():
+    return {"graph_version": graph_version, "refreshed_at": views.refreshed_at, "views": views.describe()}
+
+@app.get("/views/{name}")
+async def get_view(name: str):
+    try:
+        return Response(content=views.body(name), media_type="application/json")
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown view {name!r}")
+
+def reload_allowed(request):
+    """With SPARQL_RELOAD_TOKEN set, /reload needs it as a bearer token;
+    without, it only accepts requests from this host."""
+    if RELOAD_TOKEN:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), RELOAD_TOKEN.encode())
+    return request.client is not None and request.client.host in ("127.0.0.1", "::1")
+
+@app.post("/reload")
+async def reload_ontology(request: Request):
+    if not reload_allowed(request):
+        raise HTTPException(status_code=403, detail="Reloading needs the SPARQL_RELOAD_TOKEN bearer token")
+    loop = asyncio.get_running_loop()
+    async with reload_lock:
+        changed = await loop.run_in_executor(None, file_sha256, ONTOLOGY) != graph_version
+        if SUPERVISOR:
+            # Reloading here would only update this worker: the supervisor
+            # reloads the shared graph and restarts every worker instead
+            if changed:
+                os.kill(int(SUPERVISOR), signal.SIGHUP)
+            return {"graph_version": graph_version, "triples": len(graph), "reloading": changed}
+        if changed:
+            # Loading takes seconds: it runs on a thread while the current
+            # graph keeps serving, and is swapped in once complete
+            install_ontology(await loop.run_in_executor(None, read_ontology))
+    return {"graph_version": graph_version, "triples": len(graph)}
\ No newline at end of file
@@ -0,0 +1,62 @@
+import argparse
+
+from rdflib import Graph
+from rdflib.namespace import RDF
+
+from football_graph import SEASON, FootballGraph
+from graph_snapshot import snapshot_path, write_snapshot
+
+
+def consolidate_stats(graph):
+    """Merge the PlayerStats nodes of each player, team, league and season
+    into one.
+
+    Every triple of a per-row stats node is moved to the consolidated stats
+    node of the player's stint (the one ``load_all_data(consolidate_stats=True)``
+    creates) and the player's ``fb:hasStats`` link is repointed. Returns the
+    number of stats nodes that were merged away.
+
+    The nodes of one stint only share the minutes and matches, which are
+    equal, so nothing is lost; only namesakes in one team would end up on one
+    node, where equal values of theirs collapse into one triple.
+    """
+    football = FootballGraph()
+    FB = football.FOOTBALL
+    merged = 0
+    for stats in list(graph.subjects(RDF.type, FB.PlayerStats)):
+        player = graph.value(predicate=FB.hasStats, object=stats)
+        team = graph.value(stats, FB.inTeam)
+        league = graph.value(stats, FB.inLeague)
+        if player is None or team is None or league is None:
+            print(f"Skipping stats node {stats} without a player, team or league")
+            continue
+        season = graph.value(stats, FB.inSeason)
+        target = football.player_stats_uri(player, team, league, str(season) if season else SEASON)
+        if target == stats:
+            continue
+        for prop, value in list(graph.predicate_objects(stats)):
+            graph.remove((stats, prop, value))
+            graph.add((target, prop, value))
+        graph.remove((player, FB.hasStats, stats))
+        graph.add((player, FB.hasStats, target))
+        merged += 1
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rewrite an ontology to one stats node per player, team, league and season")
+    parser.add_argument("source", nargs="?", default="football_ontology.ttl", help="Turtle file to migrate")
+    parser.add_argument("-o", "--output", default=None, help="where to write the result, the source by default")
+    parser.add_argument("--no-snapshot", action="store_true", help="don't write a binary snapshot next to the output")
+    args = parser.parse_args()
+
+    graph = Graph()
+    graph.parse(args.source, format="turtle")
+    before = len(graph)
+    merged = consolidate_stats(graph)
+    destination = args.output or args.source
+    graph.serialize(destination=destination, format="turtle")
+    if not args.no_snapshot:
+        write_snapshot(graph, snapshot_path(destination), source=destination)
+    print(f"Merged {merged} stats nodes: {before} -> {len(graph)} triples, saved to {destination}")
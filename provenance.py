@@ -0,0 +1,103 @@
+import json
+import sqlite3
+
+from graph_snapshot import decode_term, encode_term
+
+
+def _key(term):
+    return json.dumps(encode_term(term), ensure_ascii=False)
+
+
+class ProvenanceStore:
+    """Which triples each source file produced, for incremental rebuilds.
+
+    A SQLite database with, per source (a ``league/file`` id), the content
+    hash of the file it was built from and its Turtle fragment, and the
+    triples it produced. A triple produced by several sources (a player's
+    type, a team's league) stays in the graph until none of them produce it.
+    """
+
+    def __init__(self, path="football_build.sqlite"):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                fragment BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS triples (
+                source TEXT NOT NULL,
+                s TEXT NOT NULL,
+                p TEXT NOT NULL,
+                o TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS triples_source ON triples (source);
+            CREATE INDEX IF NOT EXISTS triples_spo ON triples (s, p, o);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """)
+        self._connection.commit()
+
+    def hashes(self):
+        return dict(self._connection.execute("SELECT source, sha256 FROM sources"))
+
+    def triples(self, source):
+        rows = self._connection.execute("SELECT s, p, o FROM triples WHERE source = ?", (source,))
+        return {tuple(decode_term(json.loads(term)) for term in row) for row in rows}
+
+    def shared(self, triples, source):
+        """The ``triples`` that a source other than ``source`` also produced.
+
+        One query for all of them: the triples go in a temporary table that
+        is joined with the stored triples.
+        """
+        keys = {tuple(map(_key, triple)): triple for triple in triples}
+        if not keys:
+            return set()
+        with self._connection:
+            self._connection.execute("CREATE TEMP TABLE IF NOT EXISTS candidates (s TEXT, p TEXT, o TEXT)")
+            self._connection.executemany("INSERT INTO candidates VALUES (?, ?, ?)", keys)
+            rows = self._connection.execute("""
+                SELECT s, p, o FROM candidates AS c
+                WHERE EXISTS (SELECT 1 FROM triples AS t
+                              WHERE t.s = c.s AND t.p = c.p AND t.o = c.o AND t.source != ?)
+                """, (source,)).fetchall()
+            self._connection.execute("DELETE FROM candidates")
+        return {keys[row] for row in rows}
+
+    def replace(self, source, sha256, triples, fragment):
+        with self._connection:
+            self._connection.execute("DELETE FROM triples WHERE source = ?", (source,))
+            self._connection.executemany("INSERT INTO triples VALUES (?, ?, ?, ?)",
+                                         [(source, *map(_key, triple)) for triple in triples])
+            self._connection.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)", (source, sha256, fragment))
+
+    def remove(self, source):
+        with self._connection:
+            self._connection.execute("DELETE FROM triples WHERE source = ?", (source,))
+            self._connection.execute("DELETE FROM sources WHERE source = ?", (source,))
+
+    def fragments(self):
+        """Turtle fragments of all sources, in source order."""
+        return [fragment for _, fragment in
+                self._connection.execute("SELECT source, fragment FROM sources ORDER BY source")]
+
+    def get_meta(self, key):
+        row = self._connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def clear(self):
+        with self._connection:
+            self._connection.execute("DELETE FROM triples")
+            self._connection.execute("DELETE FROM sources")
+            self._connection.execute("DELETE FROM meta")
+
+    def close(self):
+        self._connection.close()
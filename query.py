@@ -1,16 +1,11 @@
 from rdflib import Graph
 from rdflib.plugins.sparql import prepareQuery
 
-# Load the RDF graph
-g = Graph()
-g.parse("football_ontology.ttl", format="turtle")
 
-
-print("Top 10 players by total goals in each league:")
-print()
-
-# Prepare and execute the query
-query = prepareQuery("""
+# (name, title, query, line printed for each result row) of the canonical
+# queries; benchmark_queries.py times the same list
+QUERIES = [
+    ("top-goals-by-league", "Top 10 players by total goals in each league:", """
 PREFIX fb: <http://example.org/football/>
 
 SELECT ?playerName ?leagueName (SUM(?goals) AS ?totalGoals)
@@ -26,24 +21,9 @@ WHERE {
 GROUP BY ?playerName ?leagueName
 ORDER BY DESC(?totalGoals)
 LIMIT 10
-""")
-
-results = g.query(query)
-
-# Print the results
-for row in results:
-    print(f"Player: {row.playerName}, League: {row.leagueName}, Total Goals: {row.totalGoals}")
-
-
-print()
-print("--------------------------------------------------------------------------------")
-print()
-
-print("Top 10 players with the highest shot conversion rate (minimum 5 goals):")
-print()
-
-# Prepare and execute the query
-query = prepareQuery("""
+""",
+     "Player: {playerName}, League: {leagueName}, Total Goals: {totalGoals}"),
+    ("conversion-rate-min-goals", "Top 10 players with the highest shot conversion rate (minimum 5 goals):", """
 PREFIX fb: <http://example.org/football/>
 
 SELECT ?playerName ?leagueName ?goals ?conversionRate
@@ -60,25 +40,9 @@ WHERE {
 }
 ORDER BY DESC(?conversionRate)
 LIMIT 10
-""")
-
-results = g.query(query)
-
-# Print the results
-for row in results:
-    print(f"Player: {row.playerName}, League: {row.leagueName}, Total Goals: {row.conversionRate}")
-
-
-print() 
-print("--------------------------------------------------------------------------------")
-print()
-
-
-print("Players who have created the most chances but have not scored any goals:")
-print()
-
-# Prepare and execute the query
-query = prepareQuery("""
+""",
+     "Player: {playerName}, League: {leagueName}, Total Goals: {conversionRate}"),
+    ("chances-without-goals", "Players who have created the most chances but have not scored any goals:", """
 PREFIX fb: <http://example.org/football/>
 
 SELECT ?playerName ?leagueName ?chancesCreated
@@ -95,25 +59,9 @@ WHERE {
 }
 ORDER BY DESC(?chancesCreated)
 LIMIT 10
-""")
-
-results = g.query(query)
-
-# Print the results
-for row in results:
-    print(f"Player: {row.playerName}, League: {row.leagueName}, Chances Created: {row.chancesCreated}")
-    
-    
-print()
-print("--------------------------------------------------------------------------------")
-print()
-
-
-print("Compare the average shots per 90 minutes of all leagues:")
-print()
-
-# Prepare and execute the query
-query = prepareQuery("""
+""",
+     "Player: {playerName}, League: {leagueName}, Chances Created: {chancesCreated}"),
+    ("avg-shots-per-ninety", "Compare the average shots per 90 minutes of all leagues:", """
 PREFIX fb: <http://example.org/football/>
 
 SELECT ?leagueName (AVG(?shotsPerNinety) AS ?avgShotsPerNinety)
@@ -125,25 +73,9 @@ WHERE {
 }
 GROUP BY ?leagueName
 ORDER BY DESC(?avgShotsPerNinety)
-""")
-
-results = g.query(query)
-
-# Print the results
-for row in results:
-    print(f"League: {row.leagueName}, Average shots per ninety: {row.avgShotsPerNinety}")
-    
-
-print()
-print("--------------------------------------------------------------------------------")
-print()
-
-
-print("Players who have score stats in both Premier League and La Liga:")
-print()
-
-# Prepare and execute the query
-query = prepareQuery("""
+""",
+     "League: {leagueName}, Average shots per ninety: {avgShotsPerNinety}"),
+    ("goals-in-premier-league-and-laliga", "Players who have score stats in both Premier League and La Liga:", """
 PREFIX fb: <http://example.org/football/>
 
 SELECT ?playerName ?premierLeagueGoals ?laLigaGoals
@@ -167,25 +99,9 @@ WHERE {
 }
 ORDER BY DESC(?premierLeagueGoals) DESC(?laLigaGoals)
 LIMIT 10
-""")
-
-results = g.query(query)
-
-# Print the results
-for row in results:
-    print(f"Player: {row.playerName}, Premier League Goals: {row.premierLeagueGoals}, La Liga Goals: {row.laLigaGoals}")
- 
-
-print()
-print("--------------------------------------------------------------------------------")   
-print()
-
-
-print("Top scorers in the Premier League:")
-print()
-
-# Prepare and execute the query
-query = prepareQuery("""
+""",
+     "Player: {playerName}, Premier League Goals: {premierLeagueGoals}, La Liga Goals: {laLigaGoals}"),
+    ("premier-league-top-scorers", "Top scorers in the Premier League:", """
 PREFIX fb: <http://example.org/football/>
 
 SELECT ?playerName ?goals
@@ -198,21 +114,9 @@ WHERE {
 }
 ORDER BY DESC(?goals)
 LIMIT 10
-""")
-results = g.query(query)
-for row in results:
-    print(f"Player: {row.playerName}, Goals: {row.goals}")    
-
-print()
-print("--------------------------------------------------------------------------------")   
-print()
-
-
-print("Players with the highest shot conversion rate in La Liga:")
-print()
-
-# Prepare and execute the query
-query = prepareQuery("""
+""",
+     "Player: {playerName}, Goals: {goals}"),
+    ("laliga-conversion-rate", "Players with the highest shot conversion rate in La Liga:", """
 PREFIX fb: <http://example.org/football/>
 
 SELECT ?playerName ?conversionRate
@@ -225,22 +129,9 @@ WHERE {
 }
 ORDER BY DESC(?conversionRate)
 LIMIT 10
-""")
-results = g.query(query)
-for row in results:
-    print(f"Player: {row.playerName}, Conversion Rate: {row.conversionRate}")
-
-
-print()
-print("--------------------------------------------------------------------------------")   
-print()
-
-
-print("Top 10 Players and their minutes played in a league:")
-print()
-
-# Prepare and execute the query
-query = prepareQuery("""
+""",
+     "Player: {playerName}, Conversion Rate: {conversionRate}"),
+    ("most-minutes", "Top 10 Players and their minutes played in a league:", """
 PREFIX fb: <http://example.org/football/>
 
 SELECT DISTINCT ?playerName ?league ?minutes
@@ -254,22 +145,9 @@ WHERE {
 }
 ORDER BY DESC(?minutes)
 LIMIT 10
-""")
-results = g.query(query)
-for row in results:
-    print(f"Player: {row.playerName}, League: {row.league}, Minutes: {row.minutes}")
-
-
-print()
-print("--------------------------------------------------------------------------------")   
-print()
-
-
-print("Players with the most assists in La Liga:")
-print()
-
-# Prepare and execute the query
-query = prepareQuery("""
+""",
+     "Player: {playerName}, League: {league}, Minutes: {minutes}"),
+    ("laliga-assists", "Players with the most assists in La Liga:", """
 PREFIX fb: <http://example.org/football/>
 
 SELECT ?playerName ?assists
@@ -282,7 +160,37 @@ WHERE {
 }
 ORDER BY DESC(?assists)
 LIMIT 10
-""")
-results = g.query(query)
-for row in results:
-    print(f"Player: {row.playerName}, Assists: {row.assists}")
+""",
+     "Player: {playerName}, Assists: {assists}"),
+]
+
+
+def register_query(name, title, query, line=None):
+    """Add a query to QUERIES, so it is printed and benchmarked with the others."""
+    if any(existing == name for existing, _, _, _ in QUERIES):
+        raise ValueError(f"A query named {name!r} is already registered")
+    QUERIES.append((name, title, query, line))
+
+
+def print_results(results, line):
+    variables = [str(var) for var in results.vars]
+    for row in results:
+        values = dict(zip(variables, row))
+        print(line.format(**values) if line else ", ".join(f"{var}: {value}" for var, value in values.items()))
+
+
+if __name__ == "__main__":
+    # Load the RDF graph
+    g = Graph()
+    g.parse("football_ontology.ttl", format="turtle")
+
+    for index, (name, title, query, line) in enumerate(QUERIES):
+        if index:
+            print()
+            print("--------------------------------------------------------------------------------")
+            print()
+        print(title)
+        print()
+
+        # Prepare and execute the query
+        print_results(g.query(prepareQuery(query)), line)
@@ -0,0 +1,144 @@
+from collections import OrderedDict
+import re
+import sys
+import threading
+
+from rdflib.plugins.sparql import prepareQuery
+
+# String literals and IRIs are kept verbatim; whitespace runs and comments
+# outside of them are folded into a single space.
+_QUERY_TOKENS = re.compile(
+    r'''("""(?:[^"\\]|\\.|"(?!""))*"""'''
+    r"""|'''(?:[^'\\]|\\.|'(?!''))*'''"""
+    r'''|"(?:[^"\\\n]|\\.)*"'''
+    r"""|'(?:[^'\\\n]|\\.)*'"""
+    r'''|<[^<>"{}|^`\\\s]*>)'''
+    r'''|((?:#[^\n]*|\s+)+)'''
+)
+
+
+def normalize_query(query):
+    """Canonical text of a query, so formatting differences share a cache entry."""
+    return _QUERY_TOKENS.sub(lambda match: match.group(1) or " ", query).strip()
+
+
+class PreparedQueryCache:
+    """LRU cache of compiled (parsed and translated) SPARQL queries."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query):
+        return self.lookup(query)[0]
+
+    def lookup(self, query):
+        """The compiled query, and whether it came from the cache."""
+        key = normalize_query(query)
+        with self._lock:
+            prepared = self._queries.get(key)
+            if prepared is not None:
+                self._queries.move_to_end(key)
+                self.hits += 1
+                return prepared, True
+            self.misses += 1
+
+        # Compile outside the lock; a query that fails to parse is not cached
+        prepared = prepareQuery(query)
+        if self.maxsize > 0:
+            with self._lock:
+                self._queries[key] = prepared
+                self._queries.move_to_end(key)
+                while len(self._queries) > self.maxsize:
+                    self._queries.popitem(last=False)
+        return prepared, False
+
+    def clear(self):
+        with self._lock:
+            self._queries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._queries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def result_size(rows):
+    """Rough memory footprint of a list of result rows, in bytes."""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        if isinstance(row, tuple):
+            size += sum(sys.getsizeof(term) for term in row)
+    return size
+
+
+class QueryResultCache:
+    """LRU cache of query results, bounded by entry count and by memory size.
+
+    Keys should include the graph version, so a reloaded graph never serves
+    results computed on the previous one.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, rows, size=None):
+        """Cache ``rows`` under ``key``. ``size`` is their footprint in bytes,
+        ``result_size(rows)`` when not given."""
+        if size is None:
+            size = result_size(rows)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._results.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._results[key] = (rows, size)
+            self.bytes += size
+            while len(self._results) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._results.popitem(last=False)
+                self.bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._results),
+                "max_entries": self.max_entries,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,195 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+from graph_snapshot import load_graph
+from query_cache import PreparedQueryCache
+import query_guard
+from query_metrics import timed_evaluation
+import query_optimizer
+from sparql_results import evaluate
+
+
+class QueryQueueFull(Exception):
+    """Raised when more queries are waiting than the executor accepts."""
+
+
+def result_rows(rows, limits=None):
+    # Plain tuples from sparql_results.evaluate, which can be pickled and keep
+    # the solutions that bind no variable (iterating an rdflib Result drops them)
+    return limits.rows(rows) if limits else list(rows)
+
+
+# In process mode each worker holds its own copy of the served graph
+_worker_graph = None
+_worker_queries = None
+
+
+def _init_worker(source, optimize=False, store="default", data=None):
+    global _worker_graph, _worker_queries
+    _worker_graph = load_graph(source, store=store, data=data)
+    _worker_queries = PreparedQueryCache()
+    if optimize:
+        query_optimizer.optimize(_worker_graph)
+
+
+def guarded(graph, limits, run):
+    """``run``, a function of a compiled query on ``graph``, evaluating it
+    within the ``query_guard.QueryLimits``: its estimated cost is checked
+    first, and its deadline while it runs."""
+    if limits is None:
+        return run
+
+    def run_guarded(prepared):
+        with query_guard.deadline(limits.deadline):
+            limits.check_cost(prepared.algebra, query_optimizer.statistics(graph))
+            return run(prepared)
+    return run_guarded
+
+
+def timed_query(graph, prepared_queries, query, profile=None, limits=None):
+    """Rows of ``query`` on ``graph`` and the timing of its evaluation."""
+    run = guarded(graph, limits, lambda prepared: result_rows(evaluate(graph, prepared)[2], limits))
+    return timed_evaluation(prepared_queries, query, run, profile)
+
+
+def _evaluate_in_worker(query, profile=None, limits=None):
+    return timed_query(_worker_graph, _worker_queries, query, profile, limits)
+
+
+class QueryExecutor:
+    """Evaluates SPARQL queries off the event loop.
+
+    At most ``max_concurrency`` queries are evaluated at once, on a pool of
+    threads (``mode="thread"``) or of worker processes that each load
+    ``source`` (``mode="process"``). Up to ``max_pending`` more wait for a free
+    slot; beyond that ``QueryQueueFull`` is raised so the caller can shed load.
+    With ``optimize``, worker processes reorder the triple patterns of their
+    queries with ``query_optimizer``; they hold their graph in the rdflib
+    ``store``.
+    """
+
+    def __init__(self, source, mode="thread", max_concurrency=4, max_pending=64, optimize=False,
+                 store="default"):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown executor mode {mode!r}")
+        self.source = source
+        self.mode = mode
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.optimize = optimize
+        self.store = store
+        # Content of ``source`` the workers load, when the caller read it
+        self.data = None
+        self.pending = 0
+        self.running = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._pool = self._create_pool()
+        # Work that needs the main process graph (such as streamed results)
+        # always runs on threads, also in process mode
+        self._thread_pool = None
+
+    def _create_pool(self):
+        if self.mode == "process":
+            return ProcessPoolExecutor(self.max_concurrency, initializer=_init_worker,
+                                       initargs=(self.source, self.optimize, self.store, self.data))
+        return ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="sparql")
+
+    def reload(self, data=None):
+        """Restart process workers so they load the current ontology, or the
+        ``data`` of it the main process loaded, so both serve one version."""
+        if self.mode == "process":
+            self.data = data
+            old_pool, self._pool = self._pool, self._create_pool()
+            old_pool.shutdown(wait=False)
+
+    def forked(self):
+        """Start over in a process forked from the one that created the
+        executor (see serve.py): the parent's pool threads and worker
+        processes don't carry over to the child."""
+        self.pending = 0
+        self.running = 0
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._pool = self._create_pool()
+        self._thread_pool = None
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+
+    async def acquire(self):
+        """Wait for an evaluation slot; every successful call needs a release()."""
+        if self.pending >= self.max_pending:
+            raise QueryQueueFull(f"{self.pending} queries already waiting")
+        self.pending += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.pending -= 1
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+        self._slots.release()
+
+    async def run(self, function, *args):
+        """Run ``function`` on the thread pool within an evaluation slot."""
+        await self.acquire()
+        try:
+            return await self.call(function, *args)
+        finally:
+            self.release()
+
+    async def call(self, function, *args):
+        """Run ``function`` on the thread pool; the caller holds a slot."""
+        return await asyncio.get_running_loop().run_in_executor(self._threads(), function, *args)
+
+    async def stream(self, chunks, batch_size=256, deadline=None):
+        """Drain an iterator of text chunks on the thread pool, ``batch_size``
+        chunks at a time, and release the caller's slot when done. Queries
+        evaluated by the chunks stop at the wall-clock ``deadline``."""
+
+        def next_batch():
+            with query_guard.deadline(deadline):
+                return list(islice(chunks, batch_size))
+
+        try:
+            while True:
+                batch = await self.call(next_batch)
+                if not batch:
+                    break
+                yield "".join(batch)
+        finally:
+            self.release()
+
+    def _threads(self):
+        if self.mode == "thread":
+            return self._pool
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="sparql")
+        return self._thread_pool
+
+    async def query(self, graph, prepared_queries, query, profile=None, limits=None):
+        """Rows of ``query`` and the timing of its evaluation (see
+        ``timed_evaluation``); with ``profile``, the evaluation's cProfile
+        stats are dumped to that path. The evaluation stays within the
+        ``query_guard.QueryLimits`` ``limits``."""
+        await self.acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            if self.mode == "process":
+                return await loop.run_in_executor(self._pool, _evaluate_in_worker, query, profile, limits)
+            return await loop.run_in_executor(self._pool, timed_query, graph, prepared_queries, query, profile,
+                                              limits)
+        finally:
+            self.release()
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "max_concurrency": self.max_concurrency,
+            "max_pending": self.max_pending,
+            "running": self.running,
+            "pending": self.pending,
+        }
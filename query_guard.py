@@ -0,0 +1,91 @@
+from contextlib import contextmanager
+from itertools import islice
+import threading
+import time
+
+# Solutions a basic graph pattern produces between two deadline checks
+CHECK_EVERY = 64
+
+# Deadline of the evaluation running on each thread
+_local = threading.local()
+
+
+class QueryTimeout(Exception):
+    """Raised when a query is still being evaluated at its deadline."""
+
+
+class QueryTooExpensive(Exception):
+    """Raised for a query whose estimated cost is over the limit."""
+
+
+class TooManyRows(Exception):
+    """Raised when a query returns more rows than a response may hold."""
+
+
+class QueryLimits:
+    """Bounds on the evaluation of one query: a wall-clock ``deadline`` (as
+    from ``time.time()``), the ``max_rows`` of a result held in memory and
+    the ``max_cost`` estimated by ``GraphStatistics.cost``. None disables
+    each of them. Limits are plain values, so they can be sent to worker
+    processes."""
+
+    def __init__(self, deadline=None, max_rows=None, max_cost=None):
+        self.deadline = deadline
+        self.max_rows = max_rows
+        self.max_cost = max_cost
+
+    @classmethod
+    def starting_now(cls, timeout=None, max_rows=None, max_cost=None):
+        """Limits of a query that may run for ``timeout`` seconds from now."""
+        return cls(time.time() + timeout if timeout else None, max_rows, max_cost)
+
+    def check_cost(self, algebra, statistics):
+        """Reject ``algebra`` up front if its estimated cost is over the
+        limit; not checked without the graph's ``statistics``."""
+        if self.max_cost is None or statistics is None:
+            return
+        cost = statistics.cost(algebra)
+        if cost > self.max_cost:
+            raise QueryTooExpensive(f"Estimated cost {cost:.3g} is over the limit of {self.max_cost:.3g}, "
+                                    f"bind more of the triple patterns' terms or join them on shared variables")
+
+    def rows(self, rows):
+        """``rows`` as a list, or TooManyRows as soon as there are too many."""
+        if self.max_rows is None:
+            return list(rows)
+        rows = list(islice(rows, self.max_rows + 1))
+        if len(rows) > self.max_rows:
+            raise TooManyRows(f"More than {self.max_rows} rows, add a LIMIT or stream them with format=ndjson")
+        return rows
+
+
+def check(deadline):
+    if deadline is not None and time.time() > deadline:
+        raise QueryTimeout("Query timed out")
+
+
+@contextmanager
+def deadline(at):
+    """Make the evaluations started in the enclosed code, on this thread, stop
+    at the wall-clock time ``at`` (None for no deadline)."""
+    previous = getattr(_local, "deadline", None)
+    _local.deadline = at
+    try:
+        check(at)
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def current_deadline():
+    return getattr(_local, "deadline", None)
+
+
+def checked(solutions, at):
+    """Yield ``solutions``, raising QueryTimeout once the deadline ``at`` has
+    passed. The check runs every ``CHECK_EVERY`` solutions, so a query stops
+    soon after its deadline even while it is still producing results."""
+    for count, solution in enumerate(solutions):
+        if not count % CHECK_EVERY:
+            check(at)
+        yield solution
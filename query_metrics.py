@@ -0,0 +1,246 @@
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import cProfile
+import json
+import os
+import threading
+import time
+
+from sparql_results import query_fingerprint
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+# Longest query text kept in the metrics and the slow query log
+MAX_QUERY_TEXT = 2000
+
+
+class Histogram:
+    """Counts of observed latencies per bucket, with their sum and maximum."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile, capped at the maximum."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class QueryStats:
+    """Metrics of one query fingerprint."""
+
+    def __init__(self, query):
+        self.query = query[:MAX_QUERY_TEXT]
+        self.requests = 0
+        self.errors = 0
+        self.slow = 0
+        self.total = Histogram()
+        self.prepare = Histogram()
+        self.evaluate = Histogram()
+        self.rows = 0
+        self.max_rows = 0
+        self.result_hits = 0
+        self.result_misses = 0
+        self.prepared_hits = 0
+        self.prepared_misses = 0
+
+    def to_dict(self):
+        results = self.result_hits + self.result_misses
+        prepared = self.prepared_hits + self.prepared_misses
+        return {
+            "query": self.query,
+            "requests": self.requests,
+            "errors": self.errors,
+            "slow": self.slow,
+            "total": self.total.to_dict(),
+            "prepare": self.prepare.to_dict(),
+            "evaluate": self.evaluate.to_dict(),
+            "rows": {"sum": self.rows, "max": self.max_rows},
+            "result_cache": {"hits": self.result_hits, "misses": self.result_misses,
+                             "hit_rate": self.result_hits / results if results else 0.0},
+            "prepared_cache": {"hits": self.prepared_hits, "misses": self.prepared_misses,
+                               "hit_rate": self.prepared_hits / prepared if prepared else 0.0},
+        }
+
+
+class QueryMetrics:
+    """Latency histograms per query fingerprint and a slow query log.
+
+    Queries are keyed on the fingerprint of their normalized text, and at
+    most ``max_queries`` fingerprints are tracked (the least recently seen
+    are dropped). Requests that take ``slow_threshold`` seconds or longer are
+    logged as JSON lines to ``slow_log``, or printed when it is None, and the
+    last ``keep_slow`` of them are kept for the metrics endpoint.
+    """
+
+    def __init__(self, slow_threshold=1.0, slow_log=None, max_queries=1000, keep_slow=100):
+        self.slow_threshold = slow_threshold
+        self.slow_log = slow_log
+        self.max_queries = max_queries
+        self.started_at = time.time()
+        self._queries = OrderedDict()
+        self._slow = deque(maxlen=keep_slow)
+        self._lock = threading.Lock()
+
+    def record(self, normalized, total, prepare=None, evaluate=None, rows=None, result_cached=None,
+               prepared_cached=None, error=None, profile=None):
+        """Record one request for ``normalized`` that took ``total`` seconds.
+
+        ``prepare`` and ``evaluate`` are the seconds spent compiling and
+        evaluating the query, None when it didn't get that far (or its
+        results came from the cache). Returns the query fingerprint.
+        """
+        fingerprint = query_fingerprint(normalized)
+        slow = total >= self.slow_threshold
+        with self._lock:
+            stats = self._queries.get(fingerprint)
+            if stats is None:
+                stats = self._queries[fingerprint] = QueryStats(normalized)
+                while len(self._queries) > self.max_queries:
+                    self._queries.popitem(last=False)
+            self._queries.move_to_end(fingerprint)
+            stats.requests += 1
+            stats.total.observe(total)
+            if prepare is not None:
+                stats.prepare.observe(prepare)
+            if evaluate is not None:
+                stats.evaluate.observe(evaluate)
+            if rows is not None:
+                stats.rows += rows
+                stats.max_rows = max(stats.max_rows, rows)
+            if result_cached is not None:
+                stats.result_hits += result_cached
+                stats.result_misses += not result_cached
+            if prepared_cached is not None:
+                stats.prepared_hits += prepared_cached
+                stats.prepared_misses += not prepared_cached
+            stats.errors += error is not None
+            stats.slow += slow
+
+        if slow:
+            self._log_slow({
+                "time": time.time(),
+                "fingerprint": fingerprint,
+                "total_seconds": total,
+                "prepare_seconds": prepare,
+                "evaluate_seconds": evaluate,
+                "rows": rows,
+                "result_cached": result_cached,
+                "error": error,
+                "profile": profile,
+                "query": normalized[:MAX_QUERY_TEXT],
+            })
+        return fingerprint
+
+    def _log_slow(self, entry):
+        line = json.dumps(entry)
+        with self._lock:
+            self._slow.append(entry)
+            if self.slow_log:
+                with open(self.slow_log, "a", encoding="utf-8") as file:
+                    file.write(line + "\n")
+                return
+        print(line)
+
+    def slow_queries(self):
+        """The most recent slow requests, newest first."""
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def stats(self, top=None, order_by="total"):
+        """Metrics of each fingerprint, the ones with the most time spent in
+        ``order_by`` (total, prepare or evaluate) first."""
+        if order_by not in ("total", "prepare", "evaluate"):
+            raise ValueError(f"Unknown order {order_by!r}, expected total, prepare or evaluate")
+        with self._lock:
+            tracked = len(self._queries)
+            queries = sorted(self._queries.items(), key=lambda item: getattr(item[1], order_by).sum, reverse=True)
+            queries = [{"fingerprint": fingerprint, **stats.to_dict()} for fingerprint, stats in queries[:top]]
+        return {
+            "since": self.started_at,
+            "slow_query_seconds": self.slow_threshold,
+            "tracked": tracked,
+            "queries": queries,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._slow.clear()
+            self.started_at = time.time()
+
+
+def profile_path(directory, normalized):
+    """File to dump the profile of one evaluation of ``normalized`` to."""
+    return os.path.join(directory, f"{query_fingerprint(normalized)}-{time.time_ns()}.prof")
+
+
+@contextmanager
+def profiled(path):
+    """Profile the enclosed code with cProfile and dump the stats to ``path``,
+    for ``python -m pstats`` or snakeviz. Does nothing when ``path`` is None."""
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+def timed_evaluation(prepared_queries, query, run, profile=None):
+    """Compile ``query`` through the cache and ``run`` the compiled query.
+
+    Returns what ``run`` returned and its timing: the seconds spent compiling
+    (close to zero on a cache hit) and evaluating, and whether the compiled
+    query came from the cache.
+    """
+    with profiled(profile):
+        start = time.perf_counter()
+        prepared, cached = prepared_queries.lookup(query)
+        prepared_at = time.perf_counter()
+        result = run(prepared)
+        evaluated_at = time.perf_counter()
+    return result, {
+        "prepare": prepared_at - start,
+        "evaluate": evaluated_at - prepared_at,
+        "prepared_cached": cached,
+    }
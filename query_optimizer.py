@@ -0,0 +1,361 @@
+from collections import Counter
+from decimal import Decimal
+import heapq
+from itertools import islice
+import weakref
+
+from rdflib import BNode, Literal, URIRef, Variable
+from rdflib.plugins.sparql import CUSTOM_EVALS
+from rdflib.plugins.sparql.evaluate import evalBGP, evalPart
+from rdflib.plugins.sparql.evalutils import _val
+from rdflib.plugins.sparql.parserutils import CompValue, value
+
+import query_guard
+
+# Names of the basic graph pattern and ORDER BY ... LIMIT hooks in rdflib's
+# CUSTOM_EVALS
+HOOK = "football_bgp_order"
+TOP_K_HOOK = "football_top_k"
+
+# Share of a sorted index's triples that a top-k query may walk before it
+# falls back to evaluating every solution
+INDEX_BUDGET = 0.1
+
+# Stands in for a variable bound by an earlier pattern of the same BGP,
+# whose value isn't known while ordering
+JOINED = object()
+
+# Statistics of the graphs whose queries are reordered
+_statistics = weakref.WeakKeyDictionary()
+
+
+def is_variable(term):
+    return isinstance(term, (Variable, BNode))
+
+
+def is_number(term):
+    return (isinstance(term, Literal) and isinstance(term.value, (int, float, Decimal))
+            and not isinstance(term.value, bool) and term.value == term.value)
+
+
+class SortedIndex:
+    """Distinct numeric values of a predicate in ascending order, each with
+    its literals (e.g. 5 and 5.0) and its number of triples."""
+
+    def __init__(self, counts):
+        groups = {}
+        for literal, count in counts.items():
+            groups.setdefault(literal.value, []).append((literal, count))
+        self.values = sorted(groups)
+        self.literals = [[literal for literal, _ in groups[number]] for number in self.values]
+        self.counts = [sum(count for _, count in groups[number]) for number in self.values]
+        self.triples = sum(self.counts)
+
+    def walk(self, descending=False):
+        """(literals, triples) of each value, from the lowest or the highest."""
+        order = range(len(self.values) - 1, -1, -1) if descending else range(len(self.values))
+        return ((self.literals[i], self.counts[i]) for i in order)
+
+
+class OrderKey:
+    """Sort key of a solution under ORDER BY conditions, comparing like
+    rdflib's successive stable sorts do."""
+
+    __slots__ = ("keys", "descending")
+
+    def __init__(self, keys, descending):
+        self.keys = keys
+        self.descending = descending
+
+    def __lt__(self, other):
+        for a, b, descending in zip(self.keys, other.keys, self.descending):
+            if descending:
+                a, b = b, a
+            if a < b:
+                return True
+            if b < a:
+                return False
+        return False
+
+    def __eq__(self, other):
+        return not (self < other or other < self)
+
+
+def top_k(solutions, conditions, k=None):
+    """The first ``k`` (or all) ``solutions`` in the order of the ORDER BY
+    ``conditions``, kept in a heap of ``k`` entries instead of sorting them
+    all. Ties stay in evaluation order, as in rdflib's full sort."""
+    descending = [condition.order == "DESC" for condition in conditions]
+
+    def key(solution):
+        return OrderKey([_val(value(solution, condition.expr, variables=True)) for condition in conditions],
+                        descending)
+
+    if k is None:
+        return sorted(solutions, key=key)
+    return heapq.nsmallest(k, solutions, key=key)
+
+
+def object_predicates(part, variable):
+    """Predicates of the triple patterns that bind ``variable`` as their
+    object in every solution of ``part``: those of its basic graph pattern,
+    when ``part`` only extends and filters it without rebinding ``variable``."""
+    while part.name in ("Extend", "Filter"):
+        if part.name == "Extend" and part.var == variable:
+            return []
+        part = part.p
+    if part.name != "BGP":
+        return []
+    return [p for _, p, o in part.triples if o == variable and isinstance(p, URIRef)]
+
+
+def modifiers(rows, parts):
+    """Apply the Project and Distinct ``parts`` (outermost first) to ``rows``."""
+    for part in reversed(parts):
+        if part.name == "Project":
+            rows = [row.project(part.PV) for row in rows]
+        else:
+            seen = set()
+            rows = [row for row in rows if not (row in seen or seen.add(row))]
+    return rows
+
+
+class GraphStatistics:
+    """Triple counts of a graph, used to estimate the cardinality of triple
+    patterns: per predicate, the number of triples and of distinct subjects
+    and objects, and per (predicate, object) pair the number of triples.
+    """
+
+    def __init__(self, graph):
+        subjects, objects = {}, {}
+        self.triples = 0
+        self.predicates = Counter()
+        self.predicate_objects = Counter()
+        for s, p, o in graph:
+            self.triples += 1
+            self.predicates[p] += 1
+            self.predicate_objects[p, o] += 1
+            subjects.setdefault(p, set()).add(s)
+            objects.setdefault(p, set()).add(o)
+        self.subjects = {p: len(values) for p, values in subjects.items()}
+        self.objects = {p: len(values) for p, values in objects.items()}
+        self.distinct_subjects = len(set().union(*subjects.values())) if subjects else 0
+        self.distinct_objects = len(set().union(*objects.values())) if objects else 0
+        # Sorted index of every predicate whose objects are all numbers
+        self.indexes = {
+            p: SortedIndex({o: self.predicate_objects[p, o] for o in values})
+            for p, values in objects.items() if all(is_number(o) for o in values)
+        }
+
+    def cardinality(self, subject, predicate, obj):
+        """Estimated number of triples matching a pattern. Each term is a
+        node, ``JOINED`` for a variable bound by an earlier pattern, or None
+        for a variable that is still free."""
+        if predicate is None or predicate is JOINED:
+            count, subjects, objects = self.triples, self.distinct_subjects, self.distinct_objects
+        else:
+            count = self.predicates.get(predicate, 0)
+            subjects, objects = self.subjects.get(predicate, 0), self.objects.get(predicate, 0)
+            if obj is not None and obj is not JOINED:
+                count = self.predicate_objects.get((predicate, obj), 0)
+                objects = 0
+        if not count:
+            return 0
+        if subject is not None and subjects:
+            count /= subjects
+        if obj is not None and objects:
+            count /= objects
+        return count
+
+    def order(self, patterns, values=None):
+        """``patterns`` ordered to run the most selective first.
+
+        Greedily picks the pattern with the lowest estimated cardinality,
+        given the variables bound by the patterns before it, among those
+        that share a variable with them; so joins follow the graph instead of
+        building cross products. ``values`` maps variables that are already
+        bound (e.g. by an enclosing join) to their value.
+        """
+        values = values or {}
+        remaining = list(patterns)
+        joined = set()
+        ordered = []
+
+        def resolve(term):
+            if not is_variable(term):
+                return term
+            if term in values:
+                return values[term]
+            return JOINED if term in joined else None
+
+        while remaining:
+            candidates = [pattern for pattern in remaining
+                          if not joined or any(term in joined for term in pattern if is_variable(term))]
+            best = min(candidates or remaining, key=lambda pattern: self.cardinality(*map(resolve, pattern)))
+            remaining.remove(best)
+            ordered.append(best)
+            joined.update(term for term in best if is_variable(term) and term not in values)
+        return ordered
+
+    def cost(self, part):
+        """Estimated number of intermediate solutions rdflib goes through to
+        evaluate the algebra ``part`` of a query: the solutions after each
+        triple pattern of its basic graph patterns, in the order ``order``
+        picks, with the right side of joins evaluated once per solution of
+        the left side. Cross products multiply."""
+        return self._estimate(part, frozenset())[1]
+
+    def _estimate(self, part, bound):
+        """(solutions, cost) of evaluating ``part`` with the ``bound`` variables."""
+        if not isinstance(part, CompValue):
+            return 1, 0
+        if part.name == "BGP":
+            rows, cost, joined = 1, 0, set(bound)
+
+            def resolve(term):
+                if not is_variable(term):
+                    return term
+                return JOINED if term in joined else None
+
+            for pattern in self.order(part.triples, dict.fromkeys(bound, JOINED)):
+                rows *= self.cardinality(*map(resolve, pattern))
+                cost += rows
+                joined.update(term for term in pattern if is_variable(term))
+            return rows, cost
+        if part.name in ("Join", "LeftJoin"):
+            rows, cost = self._estimate(part.p1, bound)
+            if part.name == "Join" and not part.get("lazy"):
+                # Both sides are evaluated on their own, then nested-loop joined
+                right_rows, right_cost = self._estimate(part.p2, bound)
+                return rows * right_rows, cost + right_cost + rows * right_rows
+            right_rows, right_cost = self._estimate(part.p2, bound | (part.p1.get("_vars") or set()))
+            if part.name == "LeftJoin":
+                right_rows = max(right_rows, 1)
+            return rows * right_rows, cost + rows * right_cost
+        if part.name in ("Union", "Minus"):
+            rows, cost = self._estimate(part.p1, bound)
+            right_rows, right_cost = self._estimate(part.p2, bound)
+            return (rows + right_rows if part.name == "Union" else rows), cost + right_cost
+        if part.name == "values":
+            return len(part.res), 0
+        return self._estimate(part.get("p"), bound)
+
+    def index_top(self, ctx, order_by, needed, parts):
+        """Solutions of ``order_by`` sorted by its conditions, enough of them
+        for the first ``needed`` rows after the Project and Distinct
+        ``parts``, found by walking the sorted index of the first condition's
+        variable. None if the query doesn't allow it or the walk gets longer
+        than ``INDEX_BUDGET`` of the index.
+
+        Each distinct value is bound in turn and the rest of the query is
+        evaluated for it, so only the solutions with the best values are
+        computed. The walk stops after a whole value, so ties are complete.
+
+        Also None once the graph's size differs from when the statistics were
+        gathered: values added since then aren't in the index.
+        """
+        if len(ctx.graph) != self.triples:
+            return None
+        condition = order_by.expr[0]
+        variable = condition.expr
+        if not isinstance(variable, Variable) or ctx[variable] is not None:
+            return None
+        indexes = [self.indexes[p] for p in object_predicates(order_by.p, variable) if p in self.indexes]
+        if not indexes:
+            return None
+        index = min(indexes, key=lambda index: index.triples)
+        project = next((part.PV for part in parts if part.name == "Project"), None)
+        distinct = any(part.name == "Distinct" for part in parts)
+
+        solutions, rows, walked = [], set(), 0
+        for literals, triples in index.walk(condition.order == "DESC"):
+            for literal in literals:
+                bound = ctx.push()
+                bound[variable] = literal
+                for solution in evalPart(bound, order_by.p):
+                    solutions.append(solution)
+                    if distinct:
+                        rows.add(solution.project(project) if project else solution)
+            if (len(rows) if distinct else len(solutions)) >= needed:
+                break
+            walked += triples
+            if walked > INDEX_BUDGET * index.triples:
+                return None
+        return top_k(solutions, order_by.expr)
+
+    def stats(self):
+        return {
+            "triples": self.triples,
+            "predicates": len(self.predicates),
+            "subjects": self.distinct_subjects,
+            "objects": self.distinct_objects,
+            "sorted_indexes": {str(p): len(index.values) for p, index in self.indexes.items()},
+        }
+
+
+def evaluate_bgp(ctx, part):
+    """CUSTOM_EVALS hook: evaluate a basic graph pattern of a graph with
+    statistics in the estimated order, and check the deadline of queries that
+    have one (see query_guard.py) as its solutions are produced; other parts,
+    and graphs without statistics or deadline, are left to rdflib."""
+    if part.name != "BGP":
+        raise NotImplementedError()
+    statistics = _statistics.get(ctx.graph)
+    deadline = query_guard.current_deadline()
+    if statistics is None and deadline is None:
+        raise NotImplementedError()
+    patterns = part.triples
+    if statistics is not None:
+        values = {term: ctx[term] for triple in part.triples for term in triple
+                  if is_variable(term) and ctx[term] is not None}
+        patterns = statistics.order(patterns, values)
+    solutions = evalBGP(ctx, patterns)
+    return solutions if deadline is None else query_guard.checked(solutions, deadline)
+
+
+def evaluate_top_k(ctx, part):
+    """CUSTOM_EVALS hook: evaluate ORDER BY ... LIMIT of a graph with
+    statistics without sorting every solution. Reads the sorted index of the
+    ordering variable when the query allows it, else keeps the best
+    solutions in a bounded heap. Other parts and graphs are left to rdflib."""
+    if part.name != "Slice" or part.length is None or _statistics.get(ctx.graph) is None:
+        raise NotImplementedError()
+    parts, order_by = [], part.p
+    while order_by.name in ("Project", "Distinct"):
+        parts.append(order_by)
+        order_by = order_by.p
+    if order_by.name != "OrderBy":
+        raise NotImplementedError()
+    needed = part.start + part.length
+    solutions = _statistics[ctx.graph].index_top(ctx, order_by, needed, parts)
+    if solutions is None:
+        if any(modifier.name == "Distinct" for modifier in parts):
+            # How many solutions DISTINCT needs isn't known up front
+            raise NotImplementedError()
+        solutions = top_k(evalPart(ctx, order_by.p), order_by.expr, needed)
+    return islice(modifiers(solutions, parts), part.start, needed)
+
+
+def optimize(graph):
+    """Gather the statistics and sorted indexes of ``graph``; from now on,
+    reorder the basic graph patterns of its SPARQL queries with them and run
+    its ORDER BY ... LIMIT queries as top-k queries.
+
+    The statistics are not updated when the graph changes. Patterns are
+    still reordered with them, which only affects speed, but the sorted
+    indexes are no longer used once the number of triples differs from when
+    they were built: top-k queries then keep the best solutions in a heap.
+    A change that adds as many triples as it removes goes unnoticed, so call
+    ``optimize`` again after changing the graph.
+    """
+    statistics = _statistics[graph] = GraphStatistics(graph)
+    return statistics
+
+
+def statistics(graph):
+    """Statistics of ``graph``, or None if its queries aren't optimized."""
+    return _statistics.get(graph)
+
+
+CUSTOM_EVALS[HOOK] = evaluate_bgp
+CUSTOM_EVALS[TOP_K_HOOK] = evaluate_top_k
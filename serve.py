@@ -0,0 +1,186 @@
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import time
+import traceback
+
+import uvicorn
+
+from graph_snapshot import SNAPSHOT_STORE, file_sha256, mapped_snapshot
+
+# The ontology served by main.py
+ONTOLOGY = "football_ontology.ttl"
+
+# "fork" loads the graph once and forks the workers from that process, so they
+# share its pages copy-on-write and use the least memory; "mmap" has each worker
+# map the binary snapshot, sharing only its triples
+MODES = ["fork", "mmap"]
+
+# Modules main.py imports, loaded before forking in mmap mode so the workers
+# share them as well
+PRELOAD = ["fastapi", "football_graph", "query_cache", "query_executor", "query_metrics", "query_optimizer",
+           "sparql_results", "stats_store", "views"]
+
+# Seconds a worker gets to finish its requests before it is killed
+GRACEFUL_SECONDS = 30
+
+
+class Supervisor:
+    """Runs ``workers`` uvicorn processes serving main.py on one listening
+    socket.
+
+    In fork mode the graph is loaded (with the garbage collector disabled)
+    before the workers are forked, then frozen with ``gc.freeze`` so that
+    collections in the workers don't write to the shared objects; the graph,
+    stats tables and views are shared. In mmap mode the workers are forked
+    first and each serves the snapshot through the read-only ``"Snapshot"``
+    store. Only the snapshot's triples are shared, through the page cache:
+    every worker still decodes the term table and builds its own stats
+    tables and views, so it holds more private memory than in fork mode.
+
+    Workers that exit are restarted. SIGHUP reloads the ontology and replaces
+    the workers one at a time; SIGTERM and SIGINT stop them.
+    """
+
+    def __init__(self, mode="fork", workers=2, host="127.0.0.1", port=8000, log_level="info"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown serving mode {mode!r}")
+        self.mode = mode
+        self.workers = workers
+        self.log_level = log_level
+        self.socket = socket.create_server((host, port), backlog=2048)
+        self.socket.set_inheritable(True)
+        self.children = set()
+        self.main = None
+        self.stopping = False
+        self.reloading = False
+
+    def prepare(self):
+        """Load what the workers share, before they are forked."""
+        if self.mode == "mmap":
+            os.environ["SPARQL_STORE"] = SNAPSHOT_STORE
+            # Written here once, not by every worker at the same time
+            mapped_snapshot(ONTOLOGY)
+        gc.disable()
+        if self.mode == "mmap":
+            for module in PRELOAD:
+                importlib.import_module(module)
+        elif self.main is None:
+            self.main = importlib.import_module("main")
+        elif file_sha256(ONTOLOGY) != self.main.graph_version:
+            gc.unfreeze()
+            self.main.load_ontology()
+            gc.collect()
+        gc.freeze()
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children.add(pid)
+            return pid
+        status = 0
+        try:
+            self.serve()
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            os._exit(status)
+
+    def serve(self):
+        """Run one worker, in the forked child."""
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        gc.enable()
+        if self.main is None:
+            app = importlib.import_module("main")
+        else:
+            app = self.main
+            app.query_executor.forked()
+        config = uvicorn.Config(app.app, log_level=self.log_level, timeout_graceful_shutdown=GRACEFUL_SECONDS)
+        uvicorn.Server(config).run(sockets=[self.socket])
+
+    def reap(self):
+        """Forget the workers that exited; True if any did."""
+        reaped = False
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                break
+            reaped = True
+            if pid in self.children:
+                self.children.discard(pid)
+                if not self.stopping:
+                    print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting",
+                          flush=True)
+        return reaped
+
+    def stop_worker(self, pid):
+        """Ask a worker to finish its requests and exit, killing it if it
+        doesn't in time."""
+        self.children.discard(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        deadline = time.monotonic() + GRACEFUL_SECONDS + 5
+        while time.monotonic() < deadline:
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                return
+            time.sleep(0.1)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    def reload(self):
+        """Reload the ontology and replace the workers one at a time, so the
+        others keep serving meanwhile."""
+        self.reloading = False
+        print("Reloading the ontology", flush=True)
+        self.prepare()
+        for pid in list(self.children):
+            self.spawn()
+            self.stop_worker(pid)
+
+    def run(self):
+        def stop(signum, frame):
+            self.stopping = True
+
+        def reload(signum, frame):
+            self.reloading = True
+
+        os.environ["SPARQL_SUPERVISOR"] = str(os.getpid())
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, reload)
+        self.prepare()
+        print(f"Serving {ONTOLOGY} with {self.workers} workers ({self.mode} mode)", flush=True)
+
+        while not self.stopping:
+            self.reap()
+            if self.reloading:
+                self.reload()
+            while len(self.children) < self.workers and not self.stopping:
+                self.spawn()
+            time.sleep(0.2)
+
+        for pid in list(self.children):
+            self.stop_worker(pid)
+        self.socket.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve main.py from several workers sharing one graph")
+    parser.add_argument("--mode", default="fork", choices=MODES,
+                        help="share the graph copy-on-write after fork (least memory), or have each worker "
+                             "map the binary snapshot")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    Supervisor(args.mode, args.workers, args.host, args.port, args.log_level).run()
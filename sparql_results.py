@@ -0,0 +1,105 @@
+import base64
+import hashlib
+import json
+
+from rdflib import BNode, Literal, URIRef
+from rdflib.plugins.sparql.evaluate import evalQuery
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that is malformed or belongs to another query or graph version."""
+
+
+def evaluate(graph, prepared):
+    """Evaluate a prepared query lazily.
+
+    Returns ``(type, vars, solutions)``: row tuples for SELECT, triples for
+    CONSTRUCT/DESCRIBE and a single boolean for ASK. Unlike iterating an rdflib
+    Result, SELECT rows are not kept once they have been consumed. Solutions
+    that bind none of the variables are rows of Nones, as in the other
+    formats.
+    """
+    res = evalQuery(graph, prepared)
+    query_type = res["type_"]
+    if query_type == "SELECT":
+        variables = list(res["vars_"])
+        rows = (tuple(bindings.get(var) for var in variables) for bindings in res["bindings"])
+        return query_type, variables, rows
+    if query_type == "ASK":
+        return query_type, [], iter([res["askAnswer"]])
+    return query_type, ["subject", "predicate", "object"], iter(res["graph"])
+
+
+def term_json(term):
+    """SPARQL 1.1 JSON results encoding of an RDF term."""
+    if isinstance(term, URIRef):
+        return {"type": "uri", "value": str(term)}
+    if isinstance(term, BNode):
+        return {"type": "bnode", "value": str(term)}
+    if isinstance(term, Literal):
+        encoded = {"type": "literal", "value": str(term)}
+        if term.language:
+            encoded["xml:lang"] = term.language
+        elif term.datatype:
+            encoded["datatype"] = str(term.datatype)
+        return encoded
+    return {"type": "literal", "value": str(term)}
+
+
+def row_json(variables, row):
+    return {str(var): term_json(term) for var, term in zip(variables, row) if term is not None}
+
+
+def sparql_json_stream(query_type, variables, rows, next_cursor=None):
+    """Yield a SPARQL 1.1 JSON results document one solution at a time."""
+    extra = f',"next_cursor":{json.dumps(next_cursor)}' if next_cursor else ""
+    if query_type == "ASK":
+        yield f'{{"head":{{}},"boolean":{json.dumps(bool(next(rows)))}{extra}}}'
+        return
+    yield json.dumps({"head": {"vars": [str(var) for var in variables]}})[:-1] + ',"results":{"bindings":['
+    separator = ""
+    for row in rows:
+        yield separator + json.dumps(row_json(variables, row))
+        separator = ","
+    yield f"]}}{extra}}}"
+
+
+def ndjson_stream(query_type, variables, rows):
+    """Yield one JSON object per line, one line per solution."""
+    if query_type == "ASK":
+        yield json.dumps({"boolean": bool(next(rows))}) + "\n"
+        return
+    for row in rows:
+        yield json.dumps(row_json(variables, row)) + "\n"
+
+
+def query_fingerprint(normalized_query):
+    return hashlib.sha256(normalized_query.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(normalized_query, graph_version, offset):
+    state = {"q": query_fingerprint(normalized_query), "v": graph_version[:16], "o": offset}
+    return base64.urlsafe_b64encode(json.dumps(state).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, normalized_query, graph_version):
+    """Offset of the next page; the cursor must come from the same query and graph version."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        offset = int(state["o"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    if state.get("q") != query_fingerprint(normalized_query):
+        raise InvalidCursor("Cursor belongs to another query")
+    if state.get("v") != graph_version[:16]:
+        raise InvalidCursor("Cursor belongs to a previous version of the graph")
+    return offset
+
+
+def page(rows, offset, page_size):
+    """Rows of one page of the list ``rows``, and whether more rows follow it.
+
+    Cursors hold an offset into the whole result, which is evaluated once and
+    kept, so a page is a slice of it and not a new evaluation.
+    """
+    return rows[offset:offset + page_size], len(rows) > offset + page_size
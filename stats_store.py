@@ -0,0 +1,308 @@
+import re
+
+import numpy as np
+
+PLAYER = "player"
+TEAM = "team"
+DIMENSIONS = ("entity", "team", "league", "season")
+AGGREGATES = ("sum", "avg", "min", "max", "count")
+
+_FILTER = re.compile(r"^\s*(\w+)\s*(>=|<=|!=|=|>|<)\s*(\S+)\s*$")
+_OPERATORS = {
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    ">": np.greater,
+    "<": np.less,
+    "=": np.equal,
+    "!=": np.not_equal,
+}
+
+
+def parse_filter(expression):
+    """``"goals>=5"`` -> ``("goals", ">=", 5.0)``."""
+    match = _FILTER.match(expression)
+    if not match:
+        raise ValueError(f"Invalid filter {expression!r}, expected e.g. goals>=5")
+    column, operator, value = match.groups()
+    try:
+        return column, operator, float(value)
+    except ValueError:
+        raise ValueError(f"Invalid filter {expression!r}, the value must be a number")
+
+
+class StatsTable:
+    """Columnar stats of one kind of entity, one row per entity, team, league and season.
+
+    ``codes[dimension]`` holds the row's index into ``names[dimension]`` for
+    the entity, team, league and season dimensions (-1 when unknown), and
+    ``columns`` one float array per stats property, NaN where a row has no value.
+    """
+
+    def __init__(self, kind, dimensions, columns, integer_columns=()):
+        self.kind = kind
+        self.names = {}
+        self.codes = {}
+        for dimension in DIMENSIONS:
+            labels = np.array(["" if label is None else label for label in dimensions[dimension]], dtype=str)
+            self.names[dimension], codes = np.unique(labels, return_inverse=True)
+            if len(self.names[dimension]) and self.names[dimension][0] == "":
+                # Unknown values sort first, give them code -1
+                self.names[dimension], codes = self.names[dimension][1:], codes - 1
+            self.codes[dimension] = codes.astype(np.int32)
+        self.columns = columns
+        self.integer_columns = set(integer_columns)
+
+    def __len__(self):
+        return len(self.codes["entity"])
+
+    def column(self, name):
+        if name not in self.columns:
+            raise ValueError(f"Unknown {self.kind} stat {name!r}")
+        return self.columns[name]
+
+    def mask(self, filters=(), rows=None, **dimensions):
+        """Rows that pass every ``(column, operator, value)`` filter and whose
+        dimensions have the given names, e.g. ``league="LaLiga"``, within the
+        boolean ``rows`` mask if one is given."""
+        selected = np.ones(len(self), dtype=bool) if rows is None else np.array(rows, dtype=bool)
+        for column, operator, value in filters:
+            # Comparisons with NaN are False, so rows without the stat drop out
+            with np.errstate(invalid="ignore"):
+                selected &= _OPERATORS[operator](self.column(column), value)
+        for dimension, name in dimensions.items():
+            if name is None:
+                continue
+            if dimension == "team" and self.kind == TEAM:
+                dimension = "entity"
+            if dimension not in self.codes:
+                raise ValueError(f"Unknown dimension {dimension!r}")
+            code = np.searchsorted(self.names[dimension], name)
+            if code == len(self.names[dimension]) or self.names[dimension][code] != name:
+                selected[:] = False
+            else:
+                selected &= self.codes[dimension] == code
+        return selected
+
+    def value(self, column, value):
+        if np.isnan(value):
+            return None
+        return int(value) if column in self.integer_columns else float(value)
+
+    def row(self, index, columns):
+        record = {}
+        for dimension in DIMENSIONS:
+            if dimension == "team" and self.kind == TEAM:
+                continue
+            code = self.codes[dimension][index]
+            name = self.kind if dimension == "entity" else dimension
+            record[name] = str(self.names[dimension][code]) if code >= 0 else None
+        for column in columns:
+            record[column] = self.value(column, self.columns[column][index])
+        return record
+
+    def aggregate(self, metric, function="sum", by="league", filters=(), **dimensions):
+        """``function`` of ``metric`` over the selected rows, per ``by`` group.
+
+        Rows without a value for ``metric`` are ignored. Groups are returned
+        largest first.
+        """
+        if function not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate {function!r}, expected one of {', '.join(AGGREGATES)}")
+        if by not in self.codes:
+            raise ValueError(f"Unknown dimension {by!r}")
+        values = self.column(metric)
+        selected = self.mask(filters, **dimensions) & ~np.isnan(values) & (self.codes[by] >= 0)
+        groups, values = self.codes[by][selected], values[selected]
+        size = len(self.names[by])
+        counts = np.bincount(groups, minlength=size)
+        if function in ("sum", "avg"):
+            results = np.bincount(groups, weights=values, minlength=size)
+            if function == "avg":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    results = results / counts
+        elif function == "count":
+            results = counts.astype(float)
+        else:
+            results = np.full(size, np.inf if function == "min" else -np.inf)
+            (np.minimum if function == "min" else np.maximum).at(results, groups, values)
+
+        present = np.flatnonzero(counts)
+        order = present[np.argsort(-results[present], kind="stable")]
+        integer = function == "count" or (function != "avg" and metric in self.integer_columns)
+        return [{by: str(self.names[by][group]),
+                 function: int(results[group]) if integer else float(results[group]),
+                 "rows": int(counts[group])}
+                for group in order]
+
+    def top(self, metric, k=10, per=None, ascending=False, columns=(), filters=(), **dimensions):
+        """The ``k`` rows with the highest (or lowest) ``metric``, overall or
+        within each ``per`` group, with the requested extra ``columns``."""
+        if per is not None and per not in self.codes:
+            raise ValueError(f"Unknown dimension {per!r}")
+        values = self.column(metric)
+        for column in columns:
+            self.column(column)
+        selected = np.flatnonzero(self.mask(filters, **dimensions) & ~np.isnan(values))
+        keys = values[selected] if ascending else -values[selected]
+        columns = [metric, *(column for column in columns if column != metric)]
+
+        if per is None:
+            return [self.row(index, columns) for index in self._smallest(selected, keys, k)]
+        tops = {}
+        for group in np.unique(self.codes[per][selected]):
+            in_group = self.codes[per][selected] == group
+            name = str(self.names[per][group]) if group >= 0 else None
+            tops[name] = [self.row(index, columns)
+                          for index in self._smallest(selected[in_group], keys[in_group], k)]
+        return tops
+
+    @staticmethod
+    def _smallest(indices, keys, k):
+        # Partial selection of the k smallest keys, then a sort of only those;
+        # ties are broken by row, so they always rank in name order
+        if k <= 0:
+            return indices[:0]
+        if k < len(keys):
+            selected = keys <= np.partition(keys, k - 1)[k - 1]
+            indices, keys = indices[selected], keys[selected]
+        return indices[np.lexsort((indices, keys))[:k]]
+
+    def scan(self, columns=(), filters=(), order_by=None, ascending=True, limit=None, **dimensions):
+        """Selected rows with the requested ``columns``, optionally sorted."""
+        for column in columns:
+            self.column(column)
+        selected = np.flatnonzero(self.mask(filters, **dimensions))
+        if order_by is not None:
+            keys = self.column(order_by)[selected]
+            # Rows without the value go last either way
+            keys = np.where(np.isnan(keys), np.inf, keys if ascending else -keys)
+            selected = selected[np.argsort(keys, kind="stable")]
+        if limit is not None:
+            selected = selected[:limit]
+        return [self.row(index, columns) for index in selected]
+
+
+class StatsStore:
+    """Columnar side store of the numeric stats in the RDF graph.
+
+    Fed with the same triples that are inserted in the graph: the values of
+    the stats ``properties`` of each stats node, the ``hasStats`` and
+    ``hasTeamStats`` links to its player or team, and its ``inLeague``,
+    ``inTeam`` and ``inSeason``. Stats nodes of one stint (entity, team,
+    league and season) are merged into one row, whose value of each stat is
+    the sum of the distinct values its nodes have: the nodes of one stint
+    repeat the minutes and matches, and a consolidated node holds each value
+    once. A player who changed teams has a row per team, so summing the rows
+    gives the totals SPARQL aggregates over the stats nodes.
+
+    Like the graph, the store holds a set of facts: a node keeps every value
+    its triples give a property until the last of those triples is removed.
+    The tables are rebuilt on first use after the triples change.
+    """
+
+    def __init__(self, namespace, properties):
+        self.namespace = str(namespace)
+        self.properties = {namespace[name]: name for name in properties}
+        self.integer_columns = {name for name, integer in properties.items() if integer}
+        self._links = {
+            namespace.hasStats: PLAYER,
+            namespace.hasTeamStats: TEAM,
+        }
+        self._in_league = namespace.inLeague
+        self._in_team = namespace.inTeam
+        self._in_season = namespace.inSeason
+        self._values = {}
+        self._owners = {}
+        self._leagues = {}
+        self._teams = {}
+        self._seasons = {}
+        self._tables = {}
+        # Bumped by every add_triples, so derived data can tell it is stale
+        self.version = 0
+
+    @classmethod
+    def from_graph(cls, graph, namespace, properties):
+        store = cls(namespace, properties)
+        store.add_triples(graph)
+        return store
+
+    def _facts(self, s, p, o):
+        """The set of facts the triple (s, p, o) belongs to, and its fact."""
+        name = self.properties.get(p)
+        if name is not None:
+            # The literal itself, so "5"^^xsd:integer and "5.0"^^xsd:decimal
+            # are two facts, as they are two triples
+            return self._values.setdefault(s, {}).setdefault(name, set()), o
+        if p in self._links:
+            return self._owners.setdefault(o, set()), (self._links[p], s)
+        facts = {self._in_league: self._leagues, self._in_team: self._teams,
+                 self._in_season: self._seasons}.get(p)
+        if facts is None:
+            return None, None
+        return facts.setdefault(s, set()), o
+
+    def add_triples(self, triples):
+        for triple in triples:
+            facts, fact = self._facts(*triple)
+            if facts is not None:
+                facts.add(fact)
+        self._tables = {}
+        self.version += 1
+
+    def remove_triples(self, triples):
+        """Forget the facts of triples that were removed from the graph."""
+        for triple in triples:
+            facts, fact = self._facts(*triple)
+            if facts is not None:
+                facts.discard(fact)
+        self._tables = {}
+        self.version += 1
+
+    def table(self, kind):
+        if kind not in (PLAYER, TEAM):
+            raise ValueError(f"Unknown kind {kind!r}")
+        if kind not in self._tables:
+            self._tables[kind] = self._build(kind)
+        return self._tables[kind]
+
+    def _local(self, term):
+        return None if term is None else str(term)[len(self.namespace):]
+
+    @staticmethod
+    def _first(facts):
+        # A node has one league, team and season; should it have more (the
+        # consolidated nodes of older builds were per league, not per team),
+        # the first in name order is used, whatever the order of the triples
+        return min(facts) if facts else None
+
+    def _build(self, kind):
+        rows = {}
+        for node, owners in self._owners.items():
+            for owner_kind, entity in owners:
+                if owner_kind != kind:
+                    continue
+                # Team stats nodes have no league of their own, the team does
+                league = self._first(self._leagues.get(node)) or self._first(self._leagues.get(entity))
+                season = self._first(self._seasons.get(node))
+                key = (entity, self._first(self._teams.get(node)), league, None if season is None else str(season))
+                values = rows.setdefault(key, {})
+                for name, literals in self._values.get(node, {}).items():
+                    values.setdefault(name, set()).update(float(literal) for literal in literals)
+
+        # Rows in name order, so ties rank the same however the triples arrived
+        keys = sorted(rows, key=lambda key: tuple(str(part or "") for part in key))
+        dimensions = {
+            "entity": [self._local(entity) for entity, _, _, _ in keys],
+            "team": [self._local(team) for _, team, _, _ in keys],
+            "league": [self._local(league) for _, _, league, _ in keys],
+            "season": [season for _, _, _, season in keys],
+        }
+        names = sorted({name for values in rows.values() for name, distinct in values.items() if distinct})
+        columns = {name: np.array([sum(rows[key][name]) if rows[key].get(name) else np.nan for key in keys],
+                                  dtype=float)
+                   for name in names}
+        return StatsTable(kind, dimensions, columns, self.integer_columns)
+
+    def stats(self):
+        return {kind: {"rows": len(self.table(kind)), "columns": sorted(self.table(kind).columns)}
+                for kind in (PLAYER, TEAM)}
@@ -0,0 +1,70 @@
+from rdflib import Graph, Literal, Namespace
+from rdflib.namespace import RDF
+
+import compact_store
+from compact_store import CompactStore
+
+FB = Namespace("http://example.org/football/")
+
+
+def players(count):
+    return [(FB[f"player{i}"], FB.goals, Literal(i)) for i in range(count)]
+
+
+def test_pending_changes_are_visible_before_the_merge():
+    store = CompactStore()
+    graph = Graph(store=store)
+    for triple in players(3):
+        graph.add(triple)
+    assert store.stats()["pending"] == 3
+    assert len(graph) == 3
+    graph.remove((FB.player0, FB.goals, Literal(0)))
+    # Removing a pending addition just forgets it
+    assert store.stats()["pending"] == 2
+    assert set(graph) == set(players(3)[1:])
+    assert store.stats()["pending"] == 0
+
+
+def test_removal_and_re_add_of_merged_triples():
+    store = CompactStore()
+    graph = Graph(store=store)
+    for triple in players(3):
+        graph.add(triple)
+    len(list(graph))
+    graph.remove((FB.player1, FB.goals, Literal(1)))
+    assert store.stats()["pending"] == 1
+    assert len(graph) == 2
+    graph.add((FB.player1, FB.goals, Literal(1)))
+    # Re-adding a pending removal cancels it
+    assert store.stats()["pending"] == 0
+    assert set(graph) == set(players(3))
+    # Once merged, the removal leaves the indexes
+    graph.remove((FB.player1, FB.goals, Literal(1)))
+    assert (FB.player1, FB.goals, Literal(1)) not in graph
+    assert store.stats()["triples"] == 2 and store.stats()["pending"] == 0
+    # Adding a stored triple again changes nothing
+    graph.add((FB.player2, FB.goals, Literal(2)))
+    assert store.stats()["pending"] == 0
+    assert len(graph) == 2
+
+
+def test_pattern_removal_and_lookups():
+    graph = Graph(store=CompactStore())
+    for triple in players(5):
+        graph.add(triple)
+    graph.add((FB.player0, RDF.type, FB.Player))
+    graph.remove((None, FB.goals, None))
+    assert set(graph) == {(FB.player0, RDF.type, FB.Player)}
+    assert set(graph.subjects(RDF.type, FB.Player)) == {FB.player0}
+    assert list(graph.objects(FB.unknown, None)) == []
+
+
+def test_large_batches_are_merged_in_bulk(monkeypatch):
+    monkeypatch.setattr(compact_store, "MERGE_SIZE", 4)
+    store = CompactStore()
+    graph = Graph(store=store)
+    for triple in players(10):
+        graph.add(triple)
+    assert store.stats()["pending"] < 4
+    assert len(graph) == 10
+    assert [int(o) for o in sorted(graph.objects(None, FB.goals))] == list(range(10))
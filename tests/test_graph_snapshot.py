@@ -0,0 +1,67 @@
+import pytest
+from rdflib import BNode, Graph, Literal, Namespace, URIRef
+from rdflib.namespace import RDF, XSD
+
+import compact_store  # noqa: F401 (registers the "Compact" store)
+from graph_snapshot import (
+    SNAPSHOT_STORE, Snapshot, SnapshotStore, fresh_snapshot, load_graph, snapshot_path, write_snapshot,
+)
+
+FB = Namespace("http://example.org/football/")
+
+TRIPLES = {
+    (FB.Player_Name, RDF.type, FB.Player),
+    (FB.Player_Name, FB.hasStats, BNode("LaLiga_2023-24_goals_0")),
+    (BNode("LaLiga_2023-24_goals_0"), FB.goals, Literal(12, datatype=XSD.integer)),
+    (BNode("LaLiga_2023-24_goals_0"), FB.inSeason, Literal("2023/24", datatype=XSD.string)),
+    (FB.Spain, FB.label, Literal("España", lang="es")),
+    (FB.Spain, FB.note, Literal("plain")),
+    (FB.Player_Name, FB.nationality, FB.Spain),
+}
+
+
+@pytest.fixture
+def source(tmp_path):
+    graph = Graph()
+    graph.bind("fb", FB)
+    for triple in TRIPLES:
+        graph.add(triple)
+    path = tmp_path / "ontology.ttl"
+    graph.serialize(destination=str(path), format="turtle")
+    write_snapshot(graph, snapshot_path(str(path)), source=str(path))
+    return str(path)
+
+
+def test_round_trip_keeps_every_term(source):
+    snapshot = Snapshot(snapshot_path(source))
+    assert snapshot.is_fresh(source)
+    assert set(snapshot.to_graph()) == TRIPLES
+    assert snapshot.header["namespaces"]["fb"] == str(FB)
+
+
+def test_round_trip_into_the_compact_store(source):
+    graph = load_graph(source, store="Compact")
+    assert set(graph) == TRIPLES
+    assert set(graph.objects(FB.Spain, FB.label)) == {Literal("España", lang="es")}
+
+
+def test_snapshot_store_answers_every_pattern(source):
+    graph = Graph(store=SnapshotStore(Snapshot(snapshot_path(source))))
+    stats = BNode("LaLiga_2023-24_goals_0")
+    assert len(graph) == len(TRIPLES)
+    assert set(graph.triples((stats, None, None))) == {t for t in TRIPLES if t[0] == stats}
+    assert set(graph.triples((None, FB.goals, None))) == {t for t in TRIPLES if t[1] == FB.goals}
+    assert set(graph.triples((None, None, FB.Spain))) == {(FB.Player_Name, FB.nationality, FB.Spain)}
+    assert (FB.Player_Name, RDF.type, FB.Player) in graph
+    assert (FB.Player_Name, RDF.type, FB.Team) not in graph
+    assert set(graph.triples((URIRef("http://example.org/unknown"), None, None))) == set()
+
+
+def test_stale_snapshot_is_not_used(source):
+    with open(source, "a", encoding="utf-8") as file:
+        file.write("\nfb:Italy a fb:Country .\n")
+    assert fresh_snapshot(source) is None
+    # The Turtle file is parsed instead, and the mapped store rewrites the snapshot
+    assert (FB.Italy, RDF.type, FB.Country) in load_graph(source)
+    assert (FB.Italy, RDF.type, FB.Country) in load_graph(source, store=SNAPSHOT_STORE)
+    assert fresh_snapshot(source) is not None
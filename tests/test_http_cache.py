@@ -0,0 +1,67 @@
+import gzip
+
+import brotli
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from http_cache import ENCODINGS, CompressionMiddleware, negotiate
+
+BODY = "".join(f"row {i}\n" for i in range(2000))
+
+DECOMPRESS = {"br": brotli.decompress, "gzip": gzip.decompress}
+
+
+async def text(request):
+    return PlainTextResponse(BODY)
+
+
+async def small(request):
+    return PlainTextResponse("ok")
+
+
+async def stream(request):
+    async def rows():
+        for start in range(0, len(BODY), 1000):
+            yield BODY[start:start + 1000]
+    return StreamingResponse(rows(), media_type="text/plain")
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = Starlette(routes=[Route("/text", text), Route("/small", small), Route("/stream", stream)])
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+
+def raw_get(client, path, accept_encoding):
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_brotli_is_offered_first():
+    assert ENCODINGS == ["br", "gzip"]
+    assert negotiate("gzip, br") == "br"
+    assert negotiate("br;q=0.5, gzip") == "gzip"
+    assert negotiate("identity") is None
+
+
+@pytest.mark.parametrize("path", ["/text", "/stream"])
+@pytest.mark.parametrize("accept, encoding", [("br, gzip", "br"), ("gzip", "gzip")])
+def test_negotiated_encoding_decompresses_to_the_body(client, path, accept, encoding):
+    response, raw = raw_get(client, path, accept)
+    assert response.headers["content-encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(raw) < len(BODY)
+    assert DECOMPRESS[encoding](raw).decode() == BODY
+
+
+def test_small_and_unaccepted_responses_are_not_compressed(client):
+    response, raw = raw_get(client, "/small", "br, gzip")
+    assert "content-encoding" not in response.headers
+    assert raw == b"ok"
+    response, raw = raw_get(client, "/text", "identity")
+    assert "content-encoding" not in response.headers
+    assert raw.decode() == BODY
@@ -0,0 +1,110 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+GOALS = """
+PREFIX fb: <http://example.org/football/>
+SELECT ?stats ?goals WHERE { ?stats fb:goals ?goals } ORDER BY ?stats ?goals
+"""
+
+TEAMS = """
+PREFIX fb: <http://example.org/football/>
+SELECT ?team WHERE { ?team a fb:Team } ORDER BY ?team
+"""
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture(autouse=True)
+def empty_result_cache():
+    main.query_results.clear()
+
+
+def misses():
+    return main.query_results.stats()["misses"]
+
+
+def test_etag_revalidation(client):
+    response = client.get("/sparql", params={"query": GOALS})
+    assert response.status_code == 200
+    tag, modified = response.headers["etag"], response.headers["last-modified"]
+    assert client.get("/sparql", params={"query": GOALS}, headers={"If-None-Match": tag}).status_code == 304
+    # Formatting doesn't change the ETag, another query or format does
+    reformatted = client.get("/sparql", params={"query": "  " + GOALS.replace("\n", " ")},
+                             headers={"If-None-Match": tag})
+    assert reformatted.status_code == 304
+    assert client.get("/sparql", params={"query": TEAMS}).headers["etag"] != tag
+    assert client.get("/sparql", params={"query": GOALS, "format": "ndjson"}).headers["etag"] != tag
+    assert client.get("/sparql", params={"query": GOALS},
+                      headers={"If-Modified-Since": modified}).status_code == 304
+    assert client.get("/sparql", params={"query": GOALS},
+                      headers={"If-None-Match": 'W/"other"', "If-Modified-Since": modified}).status_code == 200
+
+
+def test_batch_evaluates_identical_queries_once(client):
+    before = misses()
+    response = client.post("/sparql/batch", json={"queries": [
+        {"name": "goals", "query": GOALS},
+        {"name": "goals-again", "query": GOALS.replace("\n", "   \n")},
+        {"name": "teams", "query": TEAMS},
+        {"name": "broken", "query": "SELECT WHERE"},
+    ]})
+    body = response.json()
+    assert body["evaluated"] == 3
+    assert misses() - before == 3
+    queries = body["queries"]
+    assert queries["goals"] == queries["goals-again"]
+    assert queries["goals"]["results"] == client.get("/sparql", params={"query": GOALS}).json()["results"]
+    assert queries["broken"]["status"] == 400
+    assert client.post("/sparql/batch", json={"queries": [{"name": "a", "query": TEAMS},
+                                                          {"name": "a", "query": GOALS}]}).status_code == 400
+
+
+def read_pages(client, query, page_size, format="json"):
+    pages, cursor = [], None
+    while True:
+        params = {"query": query, "page_size": page_size, "format": format}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/sparql", params=params)
+        assert response.status_code == 200
+        body = response.json()
+        pages.append(body["results"]["bindings"] if format == "sparql-json" else body["results"])
+        cursor = body.get("next_cursor")
+        assert response.headers.get("x-next-cursor") == cursor
+        if not cursor:
+            return pages
+
+
+def test_cursor_paging(client):
+    everything = client.get("/sparql", params={"query": GOALS}).json()["results"]
+    before = misses()
+    pages = read_pages(client, GOALS, 100)
+    assert [row for rows in pages for row in rows] == everything
+    assert len(pages) == -(-len(everything) // 100)
+    # The result was evaluated for the first page only
+    assert misses() - before == 1
+    bindings = [row for rows in read_pages(client, GOALS, 250, "sparql-json") for row in rows]
+    assert len(bindings) == len(everything)
+
+
+def test_invalid_cursors_are_rejected(client):
+    cursor = client.get("/sparql", params={"query": GOALS, "page_size": 10}).json()["next_cursor"]
+    other = client.get("/sparql", params={"query": TEAMS, "page_size": 10, "cursor": cursor})
+    assert other.status_code == 400
+    assert client.get("/sparql", params={"query": GOALS, "cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/sparql", params={"query": GOALS, "page_size": 0}).status_code == 400
+
+
+def test_reload_clears_the_result_cache(client):
+    client.get("/sparql", params={"query": TEAMS})
+    assert main.query_results.stats()["entries"] == 1
+    main.install_ontology(main.read_ontology())
+    assert main.query_results.stats()["entries"] == 0
+    before = misses()
+    client.get("/sparql", params={"query": TEAMS})
+    assert misses() - before == 1
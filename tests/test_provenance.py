@@ -0,0 +1,24 @@
+from rdflib import BNode, Literal, Namespace
+from rdflib.namespace import RDF
+
+from provenance import ProvenanceStore
+
+FB = Namespace("http://example.org/football/")
+
+PLAYER = (FB.Player_Name, RDF.type, FB.Player)
+LEAGUE = (FB.LaLiga, RDF.type, FB.League)
+GOALS = (BNode("LaLiga_2023-24_goals_0"), FB.goals, Literal(12))
+
+
+def test_shared_triples_are_those_another_source_produced():
+    provenance = ProvenanceStore(":memory:")
+    provenance.replace("LaLiga/2023-24/player_top_scorers.csv", "a", {PLAYER, LEAGUE, GOALS}, b"")
+    provenance.replace("LaLiga/2023-24/player_top_assists.csv", "b", {PLAYER, LEAGUE}, b"")
+    source = "LaLiga/2023-24/player_top_scorers.csv"
+    assert provenance.shared({PLAYER, LEAGUE, GOALS}, source) == {PLAYER, LEAGUE}
+    assert provenance.shared({GOALS}, source) == set()
+    assert provenance.shared(set(), source) == set()
+    # Nothing left over from the previous call
+    assert provenance.shared({PLAYER}, "LaLiga/2023-24/player_top_assists.csv") == {PLAYER}
+    provenance.remove("LaLiga/2023-24/player_top_assists.csv")
+    assert provenance.shared({PLAYER, LEAGUE, GOALS}, source) == set()
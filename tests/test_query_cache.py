@@ -0,0 +1,49 @@
+from rdflib import Literal, Variable
+
+from query_cache import QueryResultCache, normalize_query, result_size
+
+ROWS = [(Literal(i), Literal(str(i))) for i in range(10)]
+
+
+def test_evicts_the_least_recently_used_entry():
+    cache = QueryResultCache(max_entries=2)
+    cache.put(("a", "v1"), ROWS)
+    cache.put(("b", "v1"), ROWS)
+    assert cache.get(("a", "v1")) == ROWS
+    cache.put(("c", "v1"), ROWS)
+    # "a" was used after "b", so "b" goes
+    assert cache.get(("b", "v1")) is None
+    assert cache.get(("a", "v1")) == ROWS
+    assert cache.get(("c", "v1")) == ROWS
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (2, 3, 1)
+
+
+def test_bounded_by_bytes():
+    size = result_size(ROWS)
+    cache = QueryResultCache(max_bytes=2 * size)
+    cache.put(("a", "v1"), ROWS)
+    cache.put(("b", "v1"), ROWS)
+    cache.put(("c", "v1"), ROWS)
+    assert cache.stats()["bytes"] == 2 * size
+    assert cache.get(("a", "v1")) is None
+    # A result larger than the whole cache is not kept
+    cache.put(("d", "v1"), ROWS * 3)
+    assert cache.get(("d", "v1")) is None
+    # Entries that are not row lists give their size
+    cache.put(("e", "v1"), ("SELECT", [Variable("x")], ROWS), size=size)
+    assert cache.stats()["bytes"] == 2 * size
+
+
+def test_replacing_and_clearing_keep_the_byte_count():
+    cache = QueryResultCache()
+    cache.put(("a", "v1"), ROWS)
+    cache.put(("a", "v1"), ROWS[:1])
+    assert cache.stats()["bytes"] == result_size(ROWS[:1])
+    cache.clear()
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
+
+
+def test_formatting_differences_share_a_key():
+    query = 'SELECT ?s  # players\n WHERE { ?s ?p "a  b" }'
+    assert normalize_query(query) == 'SELECT ?s WHERE { ?s ?p "a  b" }'
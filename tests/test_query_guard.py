@@ -0,0 +1,65 @@
+import time
+
+import pytest
+from rdflib import Graph, Literal, Namespace
+from rdflib.plugins.sparql import prepareQuery
+
+import query_guard
+import query_optimizer
+from query_executor import guarded, result_rows
+from query_guard import QueryLimits, QueryTimeout, QueryTooExpensive, TooManyRows
+from sparql_results import evaluate
+
+FB = Namespace("http://example.org/football/")
+
+# Two unrelated patterns: a cross product of every pair of players
+CROSS_PRODUCT = """
+PREFIX fb: <http://example.org/football/>
+SELECT ?a ?b WHERE { ?a fb:goals ?x . ?b fb:goals ?y }
+"""
+
+ONE_PLAYER = """
+PREFIX fb: <http://example.org/football/>
+SELECT ?goals WHERE { fb:player1 fb:goals ?goals }
+"""
+
+
+@pytest.fixture(scope="module")
+def graph():
+    graph = Graph()
+    for i in range(300):
+        graph.add((FB[f"player{i}"], FB.goals, Literal(i)))
+    query_optimizer.optimize(graph)
+    return graph
+
+
+def run(graph, query, limits):
+    prepared = prepareQuery(query)
+    return guarded(graph, limits, lambda prepared: result_rows(evaluate(graph, prepared)[2], limits))(prepared)
+
+
+def test_expensive_query_is_rejected_before_it_runs(graph):
+    with pytest.raises(QueryTooExpensive):
+        run(graph, CROSS_PRODUCT, QueryLimits(max_cost=10_000))
+    assert run(graph, ONE_PLAYER, QueryLimits(max_cost=10_000)) == [(Literal(1),)]
+
+
+def test_evaluation_stops_at_the_deadline(graph):
+    start = time.time()
+    with pytest.raises(QueryTimeout):
+        run(graph, CROSS_PRODUCT, QueryLimits(deadline=start + 0.05))
+    # Stopped while producing the 90,000 solutions, not after them
+    assert time.time() - start < 1.0
+
+
+def test_deadline_already_passed(graph):
+    with pytest.raises(QueryTimeout):
+        run(graph, ONE_PLAYER, QueryLimits(deadline=time.time() - 1))
+    # The deadline only applies inside the guarded evaluation
+    assert query_guard.current_deadline() is None
+
+
+def test_too_many_rows(graph):
+    with pytest.raises(TooManyRows):
+        run(graph, CROSS_PRODUCT, QueryLimits(max_rows=100))
+    assert len(run(graph, CROSS_PRODUCT, QueryLimits(max_rows=90_000))) == 90_000
@@ -0,0 +1,41 @@
+from rdflib import Graph, Literal, Namespace
+
+import query_optimizer
+
+FB = Namespace("http://example.org/football/")
+
+TOP_GOALS = """
+PREFIX fb: <http://example.org/football/>
+
+SELECT ?player ?goals
+WHERE { ?player fb:goals ?goals }
+ORDER BY DESC(?goals)
+LIMIT 3
+"""
+
+
+def goals_graph(count=200):
+    graph = Graph()
+    for i in range(count):
+        graph.add((FB[f"player{i}"], FB.goals, Literal(i)))
+    return graph
+
+
+def top_goals(graph):
+    return [int(row.goals) for row in graph.query(TOP_GOALS)]
+
+
+def test_top_k_reads_the_sorted_index():
+    graph = goals_graph()
+    query_optimizer.optimize(graph)
+    assert top_goals(graph) == [199, 198, 197]
+
+
+def test_top_k_sees_triples_added_after_optimize():
+    graph = goals_graph()
+    query_optimizer.optimize(graph)
+    graph.add((FB.newcomer, FB.goals, Literal(999)))
+    assert top_goals(graph) == [999, 199, 198]
+    graph.remove((FB.player199, FB.goals, Literal(199)))
+    graph.remove((FB.newcomer, FB.goals, Literal(999)))
+    assert top_goals(graph) == [198, 197, 196]
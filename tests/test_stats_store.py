@@ -0,0 +1,89 @@
+import os
+from collections import defaultdict
+
+import pytest
+
+from football_graph import STATS_PROPERTIES, FootballGraph
+from stats_store import StatsStore
+
+DATASETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "datasets")
+
+# SUM over the stats nodes, not over the fb:playsFor join, which repeats each
+# node once per team of a player who changed teams
+SUM_PER_PLAYER_AND_LEAGUE = """
+PREFIX fb: <http://example.org/football/>
+
+SELECT ?playerName ?leagueName (SUM(?value) AS ?total)
+WHERE {
+  ?player fb:hasStats ?stats .
+  ?stats fb:inLeague ?league ;
+         fb:%s ?value .
+  BIND(STRAFTER(STR(?league), "http://example.org/football/") AS ?leagueName)
+  BIND(STRAFTER(STR(?player), "http://example.org/football/") AS ?playerName)
+}
+GROUP BY ?playerName ?leagueName
+"""
+
+
+@pytest.fixture(params=[False, True], ids=["per-row", "consolidated"])
+def graph(request):
+    graph = FootballGraph()
+    graph._initialize()
+    graph.load_all_data(DATASETS, consolidate_stats=request.param, leagues=["LaLiga"])
+    yield graph
+    graph._initialize()
+
+
+def table_totals(graph, metric):
+    totals = defaultdict(float)
+    for row in graph.stats.table("player").scan([metric]):
+        if row[metric] is not None:
+            totals[row["player"], row["league"]] += row[metric]
+    return dict(totals)
+
+
+def sparql_totals(graph, metric):
+    return {(str(row.playerName), str(row.leagueName)): float(row.total)
+            for row in graph.rdf_graph.query(SUM_PER_PLAYER_AND_LEAGUE % metric)}
+
+
+@pytest.mark.parametrize("metric", ["goals", "assists", "chancesCreated", "penalties"])
+def test_tables_match_sparql_sums(graph, metric):
+    assert table_totals(graph, metric) == pytest.approx(sparql_totals(graph, metric))
+
+
+def test_stints_are_rows_of_their_own(graph):
+    players = graph.stats.table("player")
+    rows = {row["team"]: row for row in players.scan(["goals", "minutes"], entity="Raul_Garcia")}
+    assert rows["Osasuna"]["goals"] == 6 and rows["Osasuna"]["minutes"] == 1347
+    assert rows["Athletic_Club"]["goals"] == 1 and rows["Athletic_Club"]["minutes"] == 404
+    betis = players.scan(["minutes"], entity="Juan_Cruz", team="Real_Betis")
+    assert [row["minutes"] for row in betis] == [71]
+
+
+def test_tables_dont_depend_on_triple_order(graph):
+    reordered = StatsStore(graph.FOOTBALL, STATS_PROPERTIES)
+    reordered.add_triples(reversed(list(graph.rdf_graph)))
+    assert (reordered.table("player").scan(["goals", "minutes"])
+            == graph.stats.table("player").scan(["goals", "minutes"]))
+
+
+def test_removed_triples_leave_the_other_values(graph):
+    FB = graph.FOOTBALL
+    goals = [(s, p, o) for s, p, o in graph.rdf_graph.triples((None, FB.goals, None))
+             if (FB.Raul_Garcia, FB.hasStats, s) in graph.rdf_graph]
+    graph.remove_triples([min(goals, key=lambda triple: int(triple[2]))])
+    assert table_totals(graph, "goals")["Raul_Garcia", "LaLiga"] == 6
+    assert table_totals(graph, "goals") == pytest.approx(sparql_totals(graph, "goals"))
+
+
+def test_layouts_give_the_same_tables():
+    graph = FootballGraph()
+    tables = []
+    for consolidate_stats in (False, True):
+        graph._initialize()
+        graph.load_all_data(DATASETS, consolidate_stats=consolidate_stats, leagues=["LaLiga"])
+        players = graph.stats.table("player")
+        tables.append(players.scan(sorted(players.columns)))
+    graph._initialize()
+    assert tables[0] == tables[1]
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from football_graph import FootballGraph
+from query import QUERIES
+
+DATASETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "datasets")
+
+# View name -> (query.py query, its ranked column, the view's column)
+COMPARED = {
+    "top-scorers": ("top-goals-by-league", "totalGoals", "goals"),
+    "best-conversion-rate": ("conversion-rate-min-goals", "conversionRate", "shotConversionRate"),
+    "chances-without-goals": ("chances-without-goals", "chancesCreated", "chancesCreated"),
+    "average-shots-per-ninety": ("avg-shots-per-ninety", "avgShotsPerNinety", "avg"),
+    "premier-league-top-scorers": ("premier-league-top-scorers", "goals", "goals"),
+    "laliga-conversion-rate": ("laliga-conversion-rate", "conversionRate", "shotConversionRate"),
+    "most-minutes": ("most-minutes", "minutes", "minutes"),
+    "laliga-assists": ("laliga-assists", "assists", "assists"),
+}
+
+
+@pytest.fixture(scope="module")
+def graph():
+    # Tables are the same in both layouts (test_stats_store.py), so the
+    # default one is enough here
+    graph = FootballGraph()
+    graph._initialize()
+    graph.load_all_data(DATASETS)
+    yield graph
+    graph._initialize()
+
+
+@pytest.mark.parametrize("view", COMPARED)
+def test_views_rank_what_their_queries_return(graph, view):
+    name, column, view_column = COMPARED[view]
+    query = next(query for query_name, _, query, _ in QUERIES if query_name == name)
+    expected = [float(row[column]) for row in graph.rdf_graph.query(query)]
+    # Ties at the cut-off may rank other players, but never other values
+    assert [row[view_column] for row in graph.views.results(view)] == pytest.approx(expected)
@@ -0,0 +1,149 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from wikidata_linker import HttpWikidataResolver, resolve
+
+# Search results of the stand-in wbsearchentities, by name
+SEARCH = {
+    "Spain": ["Q29"],
+    "Italy": ["Q38", "Q9999"],
+    "England": ["Q21"],
+    "Nowhere": [],
+}
+
+# Candidates the stand-in SPARQL endpoint accepts as countries
+COUNTRIES = {"Q29", "Q38", "Q21"}
+
+
+class StandIn(ThreadingHTTPServer):
+    """Local stand-in for wbsearchentities (GET /w/api.php) and the SPARQL
+    endpoint (POST /sparql).
+
+    ``throttle`` maps a path to the number of requests to answer with 429
+    first, and ``broken`` holds VALUES candidates whose SPARQL query gets a
+    200 response with a body of the wrong shape.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.lock = threading.Lock()
+        self.log = []
+        self.throttle = {}
+        self.broken = set()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body, headers=()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def throttled(self, path, detail):
+        with self.server.lock:
+            self.server.log.append((time.monotonic(), path, detail))
+            remaining = self.server.throttle.get(path, 0)
+            if remaining:
+                self.server.throttle[path] = remaining - 1
+        if remaining:
+            self.reply(429, {}, [("Retry-After", "0")])
+        return remaining
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        name = parse_qs(url.query)["search"][0]
+        if not self.throttled(url.path, name):
+            self.reply(200, {"search": [{"id": id} for id in SEARCH[name]]})
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        query = parse_qs(self.rfile.read(length).decode())["query"][0]
+        values = re.search(r"VALUES \?item \{([^}]*)\}", query).group(1).split()
+        candidates = [value.removeprefix("wd:") for value in values]
+        if self.throttled(self.path, candidates):
+            return
+        if self.server.broken & set(candidates):
+            self.reply(200, {"head": {"vars": ["item"]}})
+            return
+        bindings = [{"item": {"value": f"http://www.wikidata.org/entity/{candidate}"}}
+                    for candidate in candidates if candidate in COUNTRIES]
+        self.reply(200, {"head": {"vars": ["item"]}, "results": {"bindings": bindings}})
+
+
+@pytest.fixture
+def server():
+    server = StandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def resolver(server, **options):
+    options.setdefault("requests_per_second", 0)
+    return HttpWikidataResolver(api_url=server.url("/w/api.php"), sparql_url=server.url("/sparql"),
+                                timeout=5.0, **options)
+
+
+def requests_to(server, path):
+    return [entry for entry in server.log if entry[1] == path]
+
+
+ENTITIES = {name: (name, None) for name in ["Spain", "Italy", "England", "Nowhere"]}
+
+
+def test_resolves_with_one_values_query_per_batch(server):
+    matches = resolve(resolver(server, batch_size=2), "country", ENTITIES)
+    assert matches == {"Spain": "Q29", "Italy": "Q38", "England": "Q21", "Nowhere": None}
+    checks = sorted(sorted(detail) for _, _, detail in requests_to(server, "/sparql"))
+    # Every candidate of a batch goes in the VALUES of a single query
+    assert checks == [["Q21"], ["Q29", "Q38", "Q9999"]]
+
+
+def test_retries_throttled_requests(server):
+    server.throttle = {"/w/api.php": 2, "/sparql": 1}
+    matches = resolve(resolver(server, retries=2), "country", {"Spain": ("Spain", None)})
+    assert matches == {"Spain": "Q29"}
+    assert len(requests_to(server, "/w/api.php")) == 3
+    assert len(requests_to(server, "/sparql")) == 2
+
+
+def test_gives_up_after_the_retries(server):
+    server.throttle = {"/sparql": 2}
+    matches = resolve(resolver(server, retries=1), "country", {"Spain": ("Spain", None)})
+    # A failed check is not a definite "no match": the key is left out
+    assert matches == {}
+    assert len(requests_to(server, "/sparql")) == 2
+
+
+def test_rate_limits_request_starts(server):
+    rate = 20.0
+    resolve(resolver(server, requests_per_second=rate, batch_size=2), "country", ENTITIES)
+    starts = sorted(start for start, _, _ in server.log)
+    # 4 searches and 2 checks, at most ``rate`` starts per second
+    assert len(starts) == 6
+    assert starts[-1] - starts[0] >= (len(starts) - 1) / rate * 0.9
+
+
+def test_unexpected_response_body_only_loses_its_batch(server):
+    server.broken = {"Q21"}
+    matches = resolve(resolver(server, batch_size=2), "country", ENTITIES)
+    # England's check failed; Nowhere had no candidates to check
+    assert matches == {"Spain": "Q29", "Italy": "Q38", "Nowhere": None}
@@ -0,0 +1,153 @@
+import json
+import time
+
+import numpy as np
+
+from stats_store import PLAYER
+
+
+class View:
+    """A named leaderboard, computed from one stats table by ``compute``."""
+
+    def __init__(self, name, description, kind, compute):
+        self.name = name
+        self.description = description
+        self.kind = kind
+        self.compute = compute
+
+
+def league_totals(players, metric, k=10):
+    """The ``k`` highest sums of ``metric`` per player and league, over all
+    the rows (stints) of a player in that league."""
+    values = players.column(metric)
+    selected = np.flatnonzero(~np.isnan(values))
+    keys = np.stack([players.codes["entity"][selected], players.codes["league"][selected]])
+    groups, inverse = np.unique(keys, axis=1, return_inverse=True)
+    totals = np.bincount(inverse.ravel(), weights=values[selected], minlength=groups.shape[1])
+    # Largest first, ties in name order
+    order = np.lexsort((np.arange(len(totals)), -totals))[:k]
+    return [{"player": str(players.names["entity"][groups[0, group]]),
+             "league": str(players.names["league"][groups[1, group]]),
+             metric: players.value(metric, totals[group])}
+            for group in order]
+
+
+def league_pairs(players, metric, other, keep, k=10):
+    """The ``k`` highest ``metric`` values paired with an ``other`` value
+    of the same player in the same league that passes ``keep``.
+
+    Every row with ``metric`` is paired with every row with a kept
+    ``other``, stints included, as the query.py self-joins of two
+    ``fb:hasStats`` nodes on ``fb:inLeague`` do.
+    """
+    values, others = players.column(metric), players.column(other)
+    entities, leagues = players.codes["entity"], players.codes["league"]
+    with np.errstate(invalid="ignore"):
+        kept = np.flatnonzero(keep(others))
+    partners = {}
+    for index in kept:
+        partners.setdefault((entities[index], leagues[index]), []).append(index)
+    pairs = [(index, partner) for index in np.flatnonzero(~np.isnan(values))
+             for partner in partners.get((entities[index], leagues[index]), ())]
+    pairs.sort(key=lambda pair: (-values[pair[0]], pair))
+    return [{"player": str(players.names["entity"][entities[index]]),
+             "league": str(players.names["league"][leagues[index]]),
+             metric: players.value(metric, values[index]),
+             other: players.value(other, others[partner])}
+            for index, partner in pairs[:k]]
+
+
+def distinct_top(players, metric, k=10):
+    """The ``k`` highest distinct (player, league, ``metric``) triples, as
+    ``SELECT DISTINCT`` of those three returns them."""
+    values = players.column(metric)
+    selected = np.flatnonzero(~np.isnan(values))
+    results, seen = [], set()
+    for index in selected[np.lexsort((selected, -values[selected]))]:
+        key = (players.codes["entity"][index], players.codes["league"][index], values[index])
+        if key in seen:
+            continue
+        seen.add(key)
+        results.append({"player": str(players.names["entity"][key[0]]),
+                        "league": str(players.names["league"][key[1]]),
+                        metric: players.value(metric, values[index])})
+        if len(results) == k:
+            break
+    return results
+
+
+# The leaderboards of query.py, each computing what its query does, with the
+# stats nodes of a player in a league standing for the rows of its stints.
+# top-scorers sums each stint once, where the query's fb:playsFor join
+# repeats the goals of a player who changed teams once per team.
+VIEWS = [
+    View("top-scorers", "Top 10 players by total goals in one league", PLAYER,
+         lambda players: league_totals(players, "goals")),
+    View("best-conversion-rate", "Top 10 players by shot conversion rate, with at least 5 goals", PLAYER,
+         lambda players: league_pairs(players, "shotConversionRate", "goals", lambda goals: goals >= 5)),
+    # Zero values are not stored, so like the query this is empty for the
+    # graphs football_graph.py builds
+    View("chances-without-goals", "Players who created the most chances without scoring", PLAYER,
+         lambda players: league_pairs(players, "chancesCreated", "goals", lambda goals: goals == 0)),
+    View("average-shots-per-ninety", "Average shots per 90 minutes of each league", PLAYER,
+         lambda players: players.aggregate("shotsPerNinety", "avg", by="league")),
+    View("premier-league-top-scorers", "Top scorers in the Premier League", PLAYER,
+         lambda players: players.top("goals", 10, league="PremierLeague")),
+    View("laliga-conversion-rate", "Players with the highest shot conversion rate in La Liga", PLAYER,
+         lambda players: players.top("shotConversionRate", 10, league="LaLiga")),
+    View("most-minutes", "Top 10 players by minutes played in a league", PLAYER,
+         lambda players: distinct_top(players, "minutes")),
+    View("laliga-assists", "Players with the most assists in La Liga", PLAYER,
+         lambda players: players.top("assists", 10, league="LaLiga")),
+]
+
+
+class MaterializedViews:
+    """Results of the ``views``, kept as ready-to-send JSON bodies.
+
+    ``refresh()`` computes every view from ``store``; after that ``body()``
+    and ``results()`` are dictionary lookups. When new triples reach the
+    store, the views are recomputed on the next read.
+    """
+
+    def __init__(self, store, views=VIEWS):
+        self.store = store
+        self.views = {view.name: view for view in views}
+        self.version = None
+        self.refreshed_at = None
+        self._results = {}
+        self._bodies = {}
+
+    def refresh(self):
+        results = {}
+        for name, view in self.views.items():
+            try:
+                results[name] = view.compute(self.store.table(view.kind))
+            except ValueError as e:
+                # The stat isn't in the graph (e.g. none of those files were loaded)
+                print(f"Couldn't compute view {name}: {e}")
+                results[name] = []
+        self._results = results
+        self._bodies = {name: json.dumps({"view": name, "results": rows}).encode("utf-8")
+                        for name, rows in results.items()}
+        self.version = self.store.version
+        self.refreshed_at = time.time()
+
+    def _current(self, name):
+        if name not in self.views:
+            raise KeyError(name)
+        if self.version != self.store.version:
+            self.refresh()
+
+    def results(self, name):
+        self._current(name)
+        return self._results[name]
+
+    def body(self, name):
+        """The view's ``{"view": ..., "results": [...]}`` response, JSON encoded."""
+        self._current(name)
+        return self._bodies[name]
+
+    def describe(self):
+        return [{"name": view.name, "description": view.description, "kind": view.kind}
+                for view in self.views.values()]
@@ -0,0 +1,77 @@
+import sqlite3
+import time
+
+DAY = 24 * 60 * 60
+
+
+class ResolutionCache:
+    """Persistent cache of Wikidata resolutions, keyed on (kind, name, country).
+
+    Stores matches and negative results with the time they were resolved.
+    Matches expire after ``ttl`` seconds, negative results after the shorter
+    ``negative_ttl``, so entities that are added to Wikidata get picked up.
+    """
+
+    def __init__(self, path="wikidata_cache.sqlite", ttl=90 * DAY, negative_ttl=14 * DAY):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS resolutions (
+                kind TEXT NOT NULL,
+                name TEXT NOT NULL,
+                country TEXT NOT NULL,
+                wikidata_id TEXT,
+                resolved_at REAL NOT NULL,
+                PRIMARY KEY (kind, name, country)
+            )
+            """)
+        self._connection.commit()
+
+    def lookup(self, kind, entities, now=None):
+        """Split ``entities`` into fresh cached resolutions and keys to resolve."""
+        now = time.time() if now is None else now
+        rows = self._connection.execute(
+            "SELECT name, country, wikidata_id, resolved_at FROM resolutions WHERE kind = ?", (kind,))
+        cached = {(name, country): (wikidata_id, resolved_at) for name, country, wikidata_id, resolved_at in rows}
+
+        resolved, missing = {}, []
+        for key, (name, country) in entities.items():
+            entry = cached.get((name, country or ""))
+            if entry is not None:
+                wikidata_id, resolved_at = entry
+                if now - resolved_at < (self.ttl if wikidata_id else self.negative_ttl):
+                    resolved[key] = wikidata_id
+                    continue
+            missing.append(key)
+        return resolved, missing
+
+    def store(self, kind, entities, matches, now=None):
+        now = time.time() if now is None else now
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO resolutions VALUES (?, ?, ?, ?, ?)",
+            [(kind, entities[key][0], entities[key][1] or "", wikidata_id, now)
+             for key, wikidata_id in matches.items()])
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+class CachedResolver:
+    """Wraps a resolver so only new or expired entities reach it."""
+
+    def __init__(self, resolver, cache):
+        self.resolver = resolver
+        self.cache = cache
+
+    async def resolve(self, kind, entities):
+        resolved, missing = self.cache.lookup(kind, entities)
+        print(f"Wikidata {kind} links: {len(resolved)} cached, {len(missing)} to resolve")
+        if missing:
+            matches = await self.resolver.resolve(kind, {key: entities[key] for key in missing})
+            # Failed lookups are not in matches, so they are retried next run
+            self.cache.store(kind, entities, matches)
+            resolved.update(matches)
+        return resolved
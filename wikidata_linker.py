@@ -0,0 +1,185 @@
+import asyncio
+
+import httpx
+
+WIKIDATA_API = "https://www.wikidata.org/w/api.php"
+WIKIDATA_SPARQL = "https://query.wikidata.org/sparql"
+USER_AGENT = "football-rdf/1.0 (https://github.com/Irozuku/football-rdf)"
+
+CHECK_QUERIES = {
+    "country": """
+        SELECT ?item WHERE {
+            VALUES ?item { %s }
+            ?item wdt:P31 wd:Q6256 . # country
+        }
+        """,
+    "team": """
+        SELECT ?item WHERE {
+            VALUES ?item { %s }
+            ?item wdt:P31 wd:Q476028 . # team
+        }
+        """,
+    "player": """
+        SELECT ?item ?country WHERE {
+            VALUES ?item { %s }
+            ?item wdt:P106 wd:Q937857 . # football player
+            OPTIONAL { ?item wdt:P19|wdt:P27 ?country . } # country
+        }
+        """,
+}
+
+
+class RateLimiter:
+    """Spaces out request starts to at most ``rate`` per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+def matching_candidate(kind, candidates, checked, country=None):
+    """First search result that passed the check, in search order.
+
+    ``checked`` maps the accepted candidate ids to the set of their P19/P27
+    values (players) or to an empty set (countries and teams). Players with a
+    known nationality must also match that country.
+    """
+    for candidate in candidates:
+        if candidate not in checked:
+            continue
+        if kind == "player" and country is not None and country not in checked[candidate]:
+            continue
+        return candidate
+    return None
+
+
+class _Session:
+    """Pooled client, concurrency limit and rate limiter of one resolve() run."""
+
+    def __init__(self, client, max_concurrency, requests_per_second, retries):
+        self.client = client
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.rate = RateLimiter(requests_per_second)
+        self.retries = retries
+
+    async def request(self, method, url, **kwargs):
+        # The first attempt, then up to ``retries`` more
+        for attempt in range(self.retries + 1):
+            async with self.slots:
+                await self.rate.wait()
+                response = await self.client.request(method, url, **kwargs)
+            # Back off when throttled or when the service is unavailable
+            if response.status_code in (429, 502, 503, 504) and attempt < self.retries:
+                delay = response.headers.get("Retry-After", "")
+                await asyncio.sleep(float(delay) if delay.isdigit() else 2 ** attempt)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+
+class HttpWikidataResolver:
+    """Resolves entity names to Wikidata ids with the live Wikidata services.
+
+    Searches go through ``wbsearchentities`` and every batch of entities has
+    all of its candidates checked with a single SPARQL query. Connections are
+    pooled, at most ``max_concurrency`` requests are in flight and request
+    starts are limited to ``requests_per_second``. Throttled (429) and
+    unavailable (502-504) responses are retried up to ``retries`` times,
+    0 for none. Both endpoints can be pointed at a local stand-in server.
+    """
+
+    def __init__(self, api_url=WIKIDATA_API, sparql_url=WIKIDATA_SPARQL, max_concurrency=8,
+                 requests_per_second=10.0, batch_size=50, timeout=30.0, retries=3):
+        self.api_url = api_url
+        self.sparql_url = sparql_url
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.batch_size = batch_size
+        self.timeout = timeout
+        if retries < 0:
+            raise ValueError("retries can't be negative")
+        self.retries = retries
+
+    async def resolve(self, kind, entities):
+        """Map each key of ``entities`` to its Wikidata id, or to None when no
+        candidate matches. Keys whose lookup failed are left out.
+
+        ``entities`` maps keys to ``(name, country)`` where ``country`` is the
+        Wikidata id the entity's country must match (players only) or None.
+        """
+        limits = httpx.Limits(max_connections=self.max_concurrency,
+                              max_keepalive_connections=self.max_concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=self.timeout,
+                                     headers={"User-Agent": USER_AGENT}) as client:
+            session = _Session(client, self.max_concurrency, self.requests_per_second, self.retries)
+            keys = list(entities)
+            batches = [keys[start:start + self.batch_size] for start in range(0, len(keys), self.batch_size)]
+            results = await asyncio.gather(
+                *(self._resolve_batch(session, kind, batch, entities) for batch in batches))
+        matches = {}
+        for batch_matches in results:
+            matches.update(batch_matches)
+        return matches
+
+    async def _resolve_batch(self, session, kind, keys, entities):
+        candidates = await asyncio.gather(*(self.search(session, entities[key][0]) for key in keys))
+        candidates = dict(zip(keys, candidates))
+        checked = await self.check(session, kind,
+                                   {candidate for ids in candidates.values() if ids for candidate in ids})
+        matches = {}
+        for key in keys:
+            # Only definite answers: no search results, or candidates that were checked
+            if candidates[key] is None or (candidates[key] and checked is None):
+                continue
+            matches[key] = matching_candidate(kind, candidates[key], checked or {}, entities[key][1])
+        return matches
+
+    async def search(self, session, name):
+        """Candidate Wikidata ids for ``name``, in search ranking order, or
+        None if the search failed."""
+        params = {"action": "wbsearchentities", "search": name, "language": "en",
+                  "format": "json", "type": "item"}
+        try:
+            data = await session.request("GET", self.api_url, params=params)
+            return [result["id"] for result in data.get("search", [])]
+        except (httpx.HTTPError, ValueError, KeyError, TypeError, AttributeError) as e:
+            # A failed request or a response body of an unexpected shape
+            print(f"Fail: Couldn't search Wikidata for {name}: {e!r}")
+            return None
+
+    async def check(self, session, kind, candidates):
+        """The candidates of the right kind, each with its P19/P27 countries,
+        or None if the query failed."""
+        if not candidates:
+            return {}
+        values = " ".join(f"wd:{candidate}" for candidate in sorted(candidates))
+        try:
+            data = await session.request("POST", self.sparql_url, data={"query": CHECK_QUERIES[kind] % values},
+                                       headers={"Accept": "application/sparql-results+json"})
+            checked = {}
+            for binding in data["results"]["bindings"]:
+                item = binding["item"]["value"].split("/")[-1]
+                countries = checked.setdefault(item, set())
+                if "country" in binding:
+                    countries.add(binding["country"]["value"].split("/")[-1])
+        except (httpx.HTTPError, ValueError, KeyError, TypeError, AttributeError) as e:
+            # A failed request or a response body of an unexpected shape
+            print(f"Fail: Couldn't execute the query for {len(candidates)} {kind} candidates: {e!r}")
+            return None
+        return checked
+
+
+def resolve(resolver, kind, entities):
+    """Run ``resolver.resolve`` to completion from synchronous code."""
+    if not entities:
+        return {}
+    return asyncio.run(resolver.resolve(kind, entities))
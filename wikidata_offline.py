@@ -0,0 +1,157 @@
+import bz2
+import gzip
+import json
+import re
+import unicodedata
+
+from wikidata_linker import matching_candidate
+
+ENTITY = "http://www.wikidata.org/entity/"
+DIRECT_CLAIM = "http://www.wikidata.org/prop/direct/"
+LABEL_PREDICATES = {
+    "http://www.w3.org/2000/01/rdf-schema#label",
+    "http://www.w3.org/2004/02/skos/core#prefLabel",
+    "http://schema.org/name",
+}
+ALIAS_PREDICATE = "http://www.w3.org/2004/02/skos/core#altLabel"
+
+# Only the statements the link checks look at are kept
+PROPERTIES = ("P31", "P106", "P27", "P19")  # instance of, occupation, citizenship, birthplace
+
+# Wikidata class an entity must be an instance of (P31), per entity kind
+INSTANCE_OF = {
+    "country": "Q6256",   # country
+    "team": "Q476028",    # association football club
+}
+FOOTBALL_PLAYER = "Q937857"
+
+_NTRIPLE = re.compile(r'^<([^>]*)>\s+<([^>]*)>\s+(.*?)\s*\.\s*$')
+_LITERAL = re.compile(r'^"((?:[^"\\]|\\.)*)"(?:@([A-Za-z0-9-]+)|\^\^<[^>]*>)?$')
+# Escapes of N-Triples string literals: \uXXXX, \UXXXXXXXX (UCHAR) and
+# \t \b \n \r \f \" \' \\ (ECHAR)
+_ESCAPE = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+_ECHARS = {"t": "\t", "b": "\b", "n": "\n", "r": "\r", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+
+
+def normalize_label(label):
+    """Case-, accent- and whitespace-insensitive form of a label."""
+    decomposed = unicodedata.normalize("NFKD", label.casefold())
+    return " ".join("".join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+
+def _open(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def _unescape(value):
+    """Decode the escapes of an N-Triples string literal."""
+    def decode(match):
+        short, long, char = match.groups()
+        if char is None:
+            return chr(int(short or long, 16))
+        if char not in _ECHARS:
+            raise ValueError(f"Invalid escape \\{char} in N-Triples literal")
+        return _ECHARS[char]
+    return _ESCAPE.sub(decode, value)
+
+
+class LocalWikidataResolver:
+    """Resolves entity names against an in-memory index of a Wikidata subset.
+
+    Runs the same search-then-check logic as HttpWikidataResolver, with the
+    search answered by a normalized label index and the checks by the P31,
+    P106, P27 and P19 facts of the subset, so linking needs no network.
+    """
+
+    def __init__(self, languages=("en",)):
+        self.languages = set(languages)
+        self.labels = {}
+        self.aliases = {}
+        self.facts = {}
+
+    @classmethod
+    def from_file(cls, path, languages=("en",)):
+        """Load a JSON dump (array or one entity per line) or an N-Triples
+        subset, optionally gzip or bzip2 compressed."""
+        resolver = cls(languages)
+        with _open(path) as file:
+            if re.sub(r"\.(gz|bz2)$", "", path).endswith(".nt"):
+                resolver.load_ntriples(file)
+            else:
+                resolver.load_json(file)
+        return resolver
+
+    def add_label(self, entity_id, label, alias=False):
+        index = self.aliases if alias else self.labels
+        ids = index.setdefault(normalize_label(label), [])
+        if entity_id not in ids:
+            ids.append(entity_id)
+
+    def add_fact(self, entity_id, prop, value):
+        self.facts.setdefault(entity_id, {}).setdefault(prop, set()).add(value)
+
+    def load_json(self, lines):
+        for line in lines:
+            line = line.strip().rstrip(",")
+            if not line or line in ("[", "]"):
+                continue
+            entity = json.loads(line)
+            entity_id = entity["id"]
+            for language, label in entity.get("labels", {}).items():
+                if language in self.languages:
+                    self.add_label(entity_id, label["value"])
+            for language, aliases in entity.get("aliases", {}).items():
+                if language in self.languages:
+                    for alias in aliases:
+                        self.add_label(entity_id, alias["value"], alias=True)
+            claims = entity.get("claims", {})
+            for prop in PROPERTIES:
+                for claim in claims.get(prop, []):
+                    value = claim.get("mainsnak", {}).get("datavalue", {}).get("value")
+                    if isinstance(value, dict) and "id" in value:
+                        self.add_fact(entity_id, prop, value["id"])
+
+    def load_ntriples(self, lines):
+        for line in lines:
+            match = _NTRIPLE.match(line)
+            if not match or not match.group(1).startswith(ENTITY):
+                continue
+            subject, predicate, obj = match.groups()
+            entity_id = subject[len(ENTITY):]
+            if predicate.startswith(DIRECT_CLAIM):
+                prop = predicate[len(DIRECT_CLAIM):]
+                if prop in PROPERTIES and obj.startswith("<" + ENTITY):
+                    self.add_fact(entity_id, prop, obj[len(ENTITY) + 1:-1])
+            elif predicate in LABEL_PREDICATES or predicate == ALIAS_PREDICATE:
+                literal = _LITERAL.match(obj)
+                if literal and (literal.group(2) or "").lower() in self.languages:
+                    self.add_label(entity_id, _unescape(literal.group(1)), alias=predicate == ALIAS_PREDICATE)
+
+    def search(self, name):
+        """Ids whose label matches ``name``, then those with a matching alias."""
+        key = normalize_label(name)
+        ids = list(self.labels.get(key, []))
+        ids.extend(entity_id for entity_id in self.aliases.get(key, []) if entity_id not in ids)
+        return ids
+
+    def check(self, kind, candidates):
+        checked = {}
+        for candidate in candidates:
+            facts = self.facts.get(candidate, {})
+            if kind == "player":
+                if FOOTBALL_PLAYER in facts.get("P106", ()):
+                    checked[candidate] = facts.get("P19", set()) | facts.get("P27", set())
+            elif INSTANCE_OF[kind] in facts.get("P31", ()):
+                checked[candidate] = set()
+        return checked
+
+    async def resolve(self, kind, entities):
+        matches = {}
+        for key, (name, country) in entities.items():
+            candidates = self.search(name)
+            matches[key] = matching_candidate(kind, candidates, self.check(kind, candidates), country)
+        return matches